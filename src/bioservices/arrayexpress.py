@@ -188,7 +188,9 @@ class ArrayExpress:
         :param str accession: Study accession number (e.g., ``"E-MEXP-31"``).
         :param str filename: Name of the file to download (e.g., ``"E-MEXP-31.idf.txt"``).
         :param bool save: If ``True``, write the file to disk in the current
-            working directory (default: ``False``).
+            working directory (default: ``False``). The file is then streamed
+            to disk (not kept in memory) and the transfer resumed if it was
+            interrupted.
         :return: file content (``str`` or ``bytes``), or ``None`` when *save* is ``True``.
 
         Example::
@@ -205,14 +207,10 @@ class ArrayExpress:
             )
 
         url = "files/{}/{}".format(accession, filename)
-        res = self.services.http_get(url, frmt="txt")
-
         if save:
-            mode = "wb" if isinstance(res, bytes) else "w"
-            with open(filename, mode) as fout:
-                fout.write(res)
+            self.services.download(url, filename, force=True)
             return None
-        return res
+        return self.services.http_get(url, frmt="txt")
 
     # ------------------------------------------------------------------
     # Internal helpers
@@ -246,9 +246,12 @@ class BiGG:
         params = {"query": query, "search_type": type_}
         return self._http_get_results("search", params=params)
 
-    def download(self, model_id, format_="json", gzip=True, target=None):
+    def download(self, model_id, format_="json", gzip=True, target=None, progress=False):
         """Download a model file and save it locally.
 
+        The file is streamed to disk and the transfer is resumed if it was
+        interrupted (see :meth:`~bioservices.services.REST.download`).
+
         :param str model_id: BiGG model identifier (e.g., ``"e_coli_core"``).
         :param str format_: file format — one of ``"xml"``, ``"json"``,
             ``"mat"`` (default: ``"json"``).
@@ -256,6 +259,8 @@ class BiGG:
             ``True``).
         :param str target: local file path to write to. Defaults to
             ``"<model_id>.<format_>[.gz]"`` in the current directory.
+        :param bool progress: show a progress bar.
+        :return: the target filename
         :raises TypeError: if *format_* is not one of the accepted values.
 
         Example::
@@ -275,13 +280,7 @@ class BiGG:
             target = path
 
         url = self.services._build_url("%s/static/models/%s" % (BiGG._base_url, path))
-        response = self.services.session.get(url, stream=True)
-        if response.ok:
-            with open(target, "wb") as f:
-                for content in response.iter_content():
-                    f.write(content)
-        else:
-            response.raise_for_status()
+        return self.services.download(url, target, force=True, progress=progress)
 
     # ------------------------------------------------------------------
     # Internal helpers
@@ -273,10 +273,8 @@ class BioMart(REST):
 
         """
         ret = self.http_get("?type=registry", frmt="xml")
-        import xml.etree.ElementTree as ET
-
-        root = ET.fromstring(ret)
-        ret = [x.attrib for x in root]
+        root = self.xml_fromstring(ret)
+        ret = [dict(x.attrib) for x in root]
         return ret
 
     @require_host
@@ -34,6 +34,7 @@
 import os
 
 from bioservices import logger
+from bioservices.download import DownloadError
 from bioservices.services import REST
 
 logger.name = __name__
@@ -157,23 +158,16 @@ class BioModels:
         if filename:
             params["filename"] = filename
 
-        res = self.services.http_get("model/download/{}".format(model_id), params=params)
+        if output_filename is None:
+            output_filename = filename if filename else "{}.zip".format(model_id)
+        self.services.logging.info("Saving {}".format(output_filename))
 
-        if not hasattr(res, "content"):
-            return
-
-        if filename:
-            self.services.logging.info("Saving {}".format(filename))
-            if output_filename is None:
-                output_filename = filename
-            with open(output_filename, "wb") as fout:
-                fout.write(res.content)
-        else:
-            self.services.logging.info("Saving file {}.zip".format(model_id))
-            if output_filename is None:
-                output_filename = "{}.zip".format(model_id)
-            with open(output_filename, "wb") as fout:
-                fout.write(res.content)
+        try:
+            self.services.download(
+                "model/download/{}".format(model_id), output_filename, params=params, force=True
+            )
+        except DownloadError as err:
+            self.services.logging.error(err)
 
     def search(self, query, offset=None, numResults=None, sort=None, frmt="json"):
         """Search models of interest via keywords.
@@ -232,11 +226,6 @@ class BioModels:
         """
         if isinstance(models, list):
             models = ",".join(models)
-        res = self.services.http_get("search/download", params={"models": models})
-
-        if res == 404:
-            self.services.logging.error("One of your model ID was probably incorrect")
-            return
 
         self.services.logging.info(output_filename)
         if os.path.exists(output_filename) and force is False:
@@ -244,8 +233,10 @@ class BioModels:
                 "{} exists already. Set force to True or change the output_filename argument".format(output_filename)
             )
 
-        with open(output_filename, "wb") as fout:
-            fout.write(res.content)
+        try:
+            self.services.download("search/download", output_filename, params={"models": models}, force=True)
+        except DownloadError as err:
+            self.services.logging.error("One of your model ID was probably incorrect ({})".format(err))
 
     def search_parameter(self, query, start=0, size=10, sort=None, frmt="json"):
         """Search for parameters of a model
@@ -0,0 +1,183 @@
+#
+#  This file is part of bioservices software
+#
+#  Distributed under the GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  website: https://github.com/cokelaer/bioservices
+#  documentation: http://bioservices.readthedocs.io
+#
+##############################################################################
+"""Pluggable JSON and XML decoders
+
+Large JSON pages (ChEMBL, UniProt) and XML documents (EUtils, BioMart) are
+decoded with the fastest backend available:
+
+- JSON: `orjson <https://github.com/ijl/orjson>`_ or
+  `msgspec <https://jcristharif.com/msgspec/>`_ if installed, the standard
+  :mod:`json` module otherwise. Data is decoded straight from the bytes
+  received (no intermediate str).
+- XML: :mod:`lxml.etree` if installed, :mod:`xml.etree.ElementTree` otherwise.
+
+The backend can be selected in the configuration file (general.json_backend
+and general.xml_backend) or per service::
+
+    from bioservices import UniProt
+    u = UniProt()
+    u.services.settings.JSON_BACKEND = "json"
+
+"""
+import functools
+import json
+import xml.etree.ElementTree as ET
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+
+__all__ = [
+    "JSON_BACKENDS",
+    "XML_BACKENDS",
+    "get_json_decoder",
+    "get_xml_parser",
+    "get_xml_iterparse",
+    "json_loads",
+    "xml_fromstring",
+]
+
+
+#: JSON backends in order of preference
+JSON_BACKENDS = ("orjson", "msgspec", "json")
+#: XML backends in order of preference
+XML_BACKENDS = ("lxml", "etree")
+
+
+def _orjson():
+    import orjson
+
+    return orjson.loads
+
+
+def _msgspec():
+    import msgspec
+
+    return msgspec.json.Decoder().decode
+
+
+def _json():
+    def loads(data):
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("utf-8")
+        return json.loads(data)
+
+    return loads
+
+
+def _lxml():
+    from lxml import etree
+
+    # behave like ElementTree: no comments nor processing instructions in the tree
+    parser = etree.XMLParser(remove_comments=True, remove_pis=True, resolve_entities=False, huge_tree=True)
+
+    def fromstring(data):
+        if isinstance(data, str):
+            # lxml does not accept str with an encoding declaration
+            data = data.encode("utf-8")
+        return etree.fromstring(data, parser)
+
+    return fromstring
+
+
+def _etree():
+    return ET.fromstring
+
+
+def _lxml_iterparse():
+    from lxml import etree
+
+    def iterparse(source, events=("end",)):
+        return etree.iterparse(
+            source, events=events, remove_comments=True, remove_pis=True, resolve_entities=False, huge_tree=True
+        )
+
+    return iterparse
+
+
+def _etree_iterparse():
+    def iterparse(source, events=("end",)):
+        return ET.iterparse(source, events=events)
+
+    return iterparse
+
+
+_JSON_FACTORIES = {"orjson": _orjson, "msgspec": _msgspec, "json": _json}
+_XML_FACTORIES = {"lxml": _lxml, "etree": _etree}
+_XML_ITERPARSE_FACTORIES = {"lxml": _lxml_iterparse, "etree": _etree_iterparse}
+
+
+def _resolve(backend, factories, order, kind):
+    if backend == "auto":
+        candidates = order
+    elif backend in factories:
+        candidates = [backend]
+    else:
+        raise ValueError("Unknown {} backend {}. Use 'auto' or one of {}".format(kind, backend, list(order)))
+
+    for name in candidates:
+        try:
+            return name, factories[name]()
+        except ImportError:
+            if backend != "auto":
+                logger.warning("{} backend {} is not installed. Falling back to default".format(kind, name))
+    name = order[-1]
+    return name, factories[name]()
+
+
+@functools.lru_cache(maxsize=None)
+def get_json_decoder(backend="auto"):
+    """Returns a function decoding JSON from bytes or str
+
+    :param str backend: one of 'auto', 'orjson', 'msgspec' or 'json'. With
+        'auto', the first installed backend of :data:`JSON_BACKENDS` is used.
+    """
+    name, decoder = _resolve(backend, _JSON_FACTORIES, JSON_BACKENDS, "JSON")
+    logger.debug("Using {} to decode JSON".format(name))
+    return decoder
+
+
+@functools.lru_cache(maxsize=None)
+def get_xml_parser(backend="auto"):
+    """Returns a function parsing an XML document (bytes or str) into an element tree
+
+    :param str backend: one of 'auto', 'lxml' or 'etree'. With 'auto', lxml
+        is used if installed.
+    """
+    name, parser = _resolve(backend, _XML_FACTORIES, XML_BACKENDS, "XML")
+    logger.debug("Using {} to parse XML".format(name))
+    return parser
+
+
+@functools.lru_cache(maxsize=None)
+def get_xml_iterparse(backend="auto"):
+    """Returns an iterparse(source, events) function yielding (event, element)
+
+    Used to parse large XML documents incrementally; elements should be
+    cleared once processed.
+
+    :param str backend: one of 'auto', 'lxml' or 'etree'.
+    """
+    name, iterparse = _resolve(backend, _XML_ITERPARSE_FACTORIES, XML_BACKENDS, "XML")
+    logger.debug("Using {} to parse XML incrementally".format(name))
+    return iterparse
+
+
+def json_loads(data, backend="auto"):
+    """Decode a JSON document (bytes or str)"""
+    return get_json_decoder(backend)(data)
+
+
+def xml_fromstring(data, backend="auto"):
+    """Parse an XML document (bytes or str) and returns the root element"""
+    return get_xml_parser(backend)(data)
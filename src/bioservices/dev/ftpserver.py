@@ -0,0 +1,283 @@
+#
+#  This file is part of bioservices software
+#
+#  Distributed under the GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  website: https://github.com/cokelaer/bioservices
+#  documentation: http://bioservices.readthedocs.io
+#
+##############################################################################
+"""Local stand-in FTP server serving files from memory
+
+This server is meant for tests only. It implements the subset of the FTP
+protocol used by :mod:`ftplib` to browse directories and download files
+(passive mode, NLST, SIZE, REST and RETR) so that bulk downloads from FTP
+sites (e.g. :class:`~bioservices.ensembl.EnsemblFTP`) can be tested without
+network access::
+
+    from bioservices.dev.ftpserver import MockFTPServer
+
+    with MockFTPServer() as server:
+        server.add_file("pub/release-110/fasta/homo_sapiens/dna/README", "...")
+        url = server.url + "/pub/release-110/fasta/homo_sapiens/dna/README"
+
+Transfers can be cut halfway (see :meth:`MockFTPServer.add_file`) to test
+resumed downloads.
+"""
+import collections
+import posixpath
+import socket
+import socketserver
+import threading
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+
+__all__ = ["MockFTPServer"]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.cwd = "/"
+        self.offset = 0
+        self.passive = None
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 bioservices mock FTP server")
+        for line in self.rfile:
+            line = line.decode(errors="replace").rstrip("\r\n")
+            command, _, argument = line.partition(" ")
+            command = command.upper()
+            self.server.mock._log(command, argument)
+            method = getattr(self, "ftp_" + command.lower(), None)
+            if method is None:
+                self.reply("502 Command not implemented")
+                continue
+            method(argument)
+            if command == "QUIT":
+                break
+        if self.passive is not None:
+            self.passive.close()
+
+    def _path(self, argument):
+        return posixpath.normpath(posixpath.join(self.cwd, argument or "."))
+
+    def _data_connection(self):
+        if self.passive is None:
+            self.reply("425 Use PASV or EPSV first")
+            return None
+        self.passive.settimeout(10)
+        try:
+            conn, _ = self.passive.accept()
+        except OSError:
+            self.reply("425 Cannot open data connection")
+            return None
+        finally:
+            self.passive.close()
+            self.passive = None
+        return conn
+
+    def _listen(self):
+        if self.passive is not None:
+            self.passive.close()
+        self.passive = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.passive.bind((self.server.mock.host, 0))
+        self.passive.listen(1)
+        return self.passive.getsockname()[1]
+
+    # commands
+
+    def ftp_user(self, argument):
+        self.reply("331 Password required")
+
+    def ftp_pass(self, argument):
+        self.reply("230 Logged in")
+
+    def ftp_syst(self, argument):
+        self.reply("215 UNIX Type: L8")
+
+    def ftp_type(self, argument):
+        self.reply("200 Type set to {}".format(argument))
+
+    def ftp_noop(self, argument):
+        self.reply("200 OK")
+
+    def ftp_quit(self, argument):
+        self.reply("221 Goodbye")
+
+    def ftp_pwd(self, argument):
+        self.reply('257 "{}" is the current directory'.format(self.cwd))
+
+    def ftp_cwd(self, argument):
+        path = self._path(argument)
+        if not self.server.mock._isdir(path):
+            self.reply("550 {}: No such directory".format(argument))
+        else:
+            self.cwd = path
+            self.reply("250 Directory changed to {}".format(path))
+
+    def ftp_cdup(self, argument):
+        self.ftp_cwd("..")
+
+    def ftp_size(self, argument):
+        item = self.server.mock._files.get(self._path(argument))
+        if item is None:
+            self.reply("550 {}: No such file".format(argument))
+        else:
+            self.reply("213 {}".format(len(item["content"])))
+
+    def ftp_pasv(self, argument):
+        port = self._listen()
+        address = self.server.mock.host.replace(".", ",")
+        self.reply("227 Entering Passive Mode ({},{},{})".format(address, port >> 8, port & 0xFF))
+
+    def ftp_epsv(self, argument):
+        self.reply("229 Entering Extended Passive Mode (|||{}|)".format(self._listen()))
+
+    def ftp_rest(self, argument):
+        self.offset = int(argument)
+        self.reply("350 Restarting at {}".format(self.offset))
+
+    def ftp_nlst(self, argument):
+        path = self._path(argument)
+        if not self.server.mock._isdir(path):
+            self.reply("550 {}: No such directory".format(argument))
+            return
+        conn = self._data_connection()
+        if conn is None:
+            return
+        self.reply("150 Here comes the directory listing")
+        with conn:
+            names = self.server.mock._listdir(path)
+            conn.sendall("".join(name + "\r\n" for name in names).encode())
+        self.reply("226 Directory send OK")
+
+    def ftp_retr(self, argument):
+        mock = self.server.mock
+        path = self._path(argument)
+        offset, self.offset = self.offset, 0
+        if path not in mock._files:
+            self.reply("550 {}: No such file".format(argument))
+            return
+        conn = self._data_connection()
+        if conn is None:
+            return
+        item = mock._files[path]
+        content = item["content"][offset:]
+        with mock._lock:
+            interrupted = item["interrupt"] > 0 and len(content) > 1
+            if interrupted:
+                item["interrupt"] -= 1
+        self.reply("150 Opening BINARY mode data connection for {} ({} bytes)".format(argument, len(content)))
+        with conn:
+            conn.sendall(content[: len(content) // 2] if interrupted else content)
+        if interrupted:
+            # simulate a transfer interrupted by a network failure
+            self.reply("426 Connection closed; transfer aborted")
+        else:
+            self.reply("226 Transfer complete")
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MockFTPServer:
+    """Local FTP server serving files added with :meth:`add_file`
+
+    :param str host: interface to bind (default to localhost)
+    :param int port: port to listen to. Default (0) picks a free port.
+
+    Anonymous logins are accepted. Commands received are counted in
+    :attr:`hits` and logged in :attr:`log`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        #: number of commands received per command name (e.g. RETR)
+        self.hits = collections.Counter()
+        #: list of (command, argument) received
+        self.log = []
+
+        self._files = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Start the server in a background (daemon) thread"""
+        if self._server is not None:
+            return self
+        self._server = _TCPServer((self.host, self.port), _Handler)
+        self._server.mock = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info("Mock FTP server listening on %s" % self.url)
+        return self
+
+    def stop(self):
+        """Stop the server"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _get_url(self):
+        return f"ftp://{self.host}:{self.port}"
+
+    url = property(_get_url, doc="Base URL of the server")
+
+    def add_file(self, path, content, interrupt=0):
+        """Serve a file
+
+        :param str path: path of the file (e.g. pub/fasta/README). Directories
+            are created implicitly.
+        :param content: content of the file (str or bytes)
+        :param int interrupt: number of transfers of this file that are cut
+            halfway (to test resumed downloads)
+        :return: the URL of the file
+        """
+        if isinstance(content, str):
+            content = content.encode()
+        path = posixpath.normpath("/" + path.lstrip("/"))
+        self._files[path] = {"content": content, "interrupt": interrupt}
+        return self.url + path
+
+    def reset(self):
+        """Clear counters and logs"""
+        with self._lock:
+            self.hits.clear()
+            self.log.clear()
+
+    def _log(self, command, argument):
+        with self._lock:
+            self.hits[command] += 1
+            self.log.append((command, argument))
+
+    def _isdir(self, path):
+        prefix = path.rstrip("/") + "/"
+        return path == "/" or any(name.startswith(prefix) for name in self._files)
+
+    def _listdir(self, path):
+        prefix = path.rstrip("/") + "/"
+        names = (name[len(prefix) :].split("/")[0] for name in self._files if name.startswith(prefix))
+        return sorted(set(names))
@@ -0,0 +1,1147 @@
+#
+#  This file is part of bioservices software
+#
+#  Distributed under the GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  website: https://github.com/cokelaer/bioservices
+#  documentation: http://bioservices.readthedocs.io
+#
+##############################################################################
+"""Local stand-in HTTP server that mimics some of the major REST services
+
+This server is meant for tests and load testing only. It replies with
+generated (deterministic) or canned data for a subset of the KEGG, UniProt,
+ChEMBL and EUtils REST APIs so that pagination, retries and concurrency can be
+exercised end to end without network access.
+
+Each service is served under its own prefix (``/kegg``, ``/uniprot``,
+``/chembl``, ``/eutils``). Static files added with :meth:`MockServer.add_file`
+are served under ``/files`` (with support for Range requests)::
+
+    from bioservices import KEGG
+    from bioservices.dev.mockserver import MockServer
+
+    with MockServer(requests_per_sec=20) as server:
+        k = server.bind(KEGG())
+        k.list("pathway", organism="hsa")
+
+Rate limits (HTTP 429 with a Retry-After header), random server errors and
+latency can be configured at construction time or changed while the server
+is running (e.g. ``server.down = True`` to simulate an outage).
+
+The server can also be started from the command line::
+
+    python -m bioservices.dev.mockserver --port 8080 --requests-per-sec 10
+
+"""
+import base64
+import collections
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+
+__all__ = ["MockServer"]
+
+
+_AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+_NUCLEOTIDES = "ACGT"
+
+
+class _MockResponse:
+    """Simple container for the status, headers and body of a reply"""
+
+    def __init__(self, body=b"", status=200, content_type="text/plain", headers=None):
+        if isinstance(body, str):
+            body = body.encode()
+        self.body = body
+        self.status = status
+        self.headers = {"Content-Type": content_type}
+        if headers:
+            self.headers.update(headers)
+        #: if set, only the first *truncate* bytes are sent before closing the connection
+        self.truncate = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        if length:
+            return self.rfile.read(length)
+        return b""
+
+    def _dispatch(self, method):
+        data = self._read_body() if method == "POST" else b""
+        response = self.server.mock.handle(method, self.path, data, self.headers)
+        self.send_response(response.status)
+        for key, value in response.headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(response.body)))
+        self.end_headers()
+        if method != "HEAD":
+            if response.truncate is not None:
+                # simulate a transfer interrupted by a network failure
+                self.wfile.write(response.body[: response.truncate])
+                self.close_connection = True
+            else:
+                self.wfile.write(response.body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_HEAD(self):
+        self._dispatch("HEAD")
+
+
+class MockServer:
+    """Local HTTP server mimicking KEGG, UniProt, ChEMBL, EUtils and Ensembl
+
+    :param str host: interface to bind (default to localhost)
+    :param int port: port to listen to. Default (0) picks a free port.
+    :param requests_per_sec: maximum number of requests per second accepted
+        before replying with HTTP 429 (None means no limit).
+    :param float error_rate: probability (between 0 and 1) to reply with a
+        HTTP 503 to any request.
+    :param float latency: number of seconds to wait before each reply.
+    :param float job_delay: time (in seconds) for a UniProt mapping job to complete.
+    :param int seed: seed used to generate data and random errors.
+    :param int n_genes: number of genes per KEGG organism.
+    :param int n_proteins: number of UniProt entries.
+    :param int n_molecules: number of entries per ChEMBL resource.
+    :param int n_records: number of records in each EUtils database.
+
+    Requests are counted per service in :attr:`hits` and logged in :attr:`log`;
+    the highest number of concurrent requests is kept in :attr:`max_in_flight`.
+    Canned replies can be registered with :meth:`register`; they take
+    precedence over generated data.
+    """
+
+    organisms = {
+        "hsa": ("T01001", "Homo sapiens (human)", "Eukaryotes;Animals;Vertebrates;Mammals"),
+        "mmu": ("T01002", "Mus musculus (house mouse)", "Eukaryotes;Animals;Vertebrates;Mammals"),
+        "eco": ("T00007", "Escherichia coli K-12 MG1655", "Prokaryotes;Bacteria;Gammaproteobacteria"),
+    }
+
+    pathways = {
+        "00010": "Glycolysis / Gluconeogenesis",
+        "00020": "Citrate cycle (TCA cycle)",
+        "00030": "Pentose phosphate pathway",
+        "04010": "MAPK signaling pathway",
+        "04064": "NF-kappa B signaling pathway",
+        "04660": "T cell receptor signaling pathway",
+    }
+
+    eutils_databases = ["gene", "nuccore", "protein", "pubmed", "snp", "taxonomy"]
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        requests_per_sec=None,
+        error_rate=0,
+        latency=0,
+        job_delay=0,
+        seed=0,
+        n_genes=100,
+        n_proteins=100,
+        n_molecules=100,
+        n_records=100,
+    ):
+        self.host = host
+        self.port = port
+        self.requests_per_sec = requests_per_sec
+        self.error_rate = error_rate
+        self.latency = latency
+        self.job_delay = job_delay
+        self.seed = seed
+        self.n_genes = n_genes
+        self.n_proteins = n_proteins
+        self.n_molecules = n_molecules
+        self.n_records = n_records
+
+        #: set to True to reply with HTTP 503 to all requests
+        self.down = False
+        #: KEGG release reported by kegg/info
+        self.kegg_release = "108.0+/10-19"
+        #: if set, UniProt stream requests with more results are refused (HTTP 400)
+        self.uniprot_stream_limit = None
+        #: maximum number of items accepted by the Ensembl POST endpoints
+        self.ensembl_post_limits = {"archive": 1000, "lookup": 1000, "sequence": 50, "vep": 200}
+        #: maximum length of the regions accepted by the Ensembl overlap and sequence endpoints
+        self.ensembl_region_limits = {"overlap": 5000000, "sequence": 10000000}
+        #: length of the Ensembl sequence regions (chromosomes)
+        self.ensembl_region_length = 100000
+        #: number of requests received per service (prefix)
+        self.hits = collections.Counter()
+        #: list of (method, path, status) for each request received
+        self.log = []
+        #: maximum number of requests handled at the same time
+        self.max_in_flight = 0
+
+        self._canned = {}
+        self._files = {}
+        self._jobs = {}
+        self._history = {}
+        self._calls = collections.deque()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._httpd = None
+        self._thread = None
+
+        self._routes = [
+            ("kegg", self._kegg),
+            ("uniprot", self._uniprot),
+            ("chembl", self._chembl),
+            ("eutils", self._eutils),
+            ("ensembl", self._ensembl),
+        ]
+
+    # ------------------------------------------------------------------ #
+    # Server life cycle                                                   #
+    # ------------------------------------------------------------------ #
+
+    def start(self):
+        """Start the server in a background (daemon) thread"""
+        if self._httpd is not None:
+            return self
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info("Mock server listening on %s" % self.url)
+        return self
+
+    def stop(self):
+        """Stop the server"""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _get_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    url = property(_get_url, doc="Base URL of the server")
+
+    def url_for(self, service):
+        """Returns the base URL of a service (e.g. kegg, uniprot, chembl, eutils, ensembl)"""
+        return f"{self.url}/{service.lower()}"
+
+    def bind(self, service):
+        """Redirect a bioservices instance (e.g. KEGG()) to this server
+
+        The REST attribute (:attr:`services`) URL is replaced by the
+        corresponding mock URL. The service instance is returned.
+        """
+        rest = getattr(service, "services", service)
+        rest.url = self.url_for(rest.name)
+        return service
+
+    def register(self, path, body, status=200, content_type="text/plain", headers=None, method="GET"):
+        """Register a canned reply for a given path (without query string)
+
+        ::
+
+            server.register("/kegg/info/kegg", "kegg  Release 108.0")
+        """
+        self._canned[(method, path)] = _MockResponse(body, status, content_type, headers)
+
+    def add_file(self, name, content, interrupt=0, ranges=True, digest=False):
+        """Serve a file under ``/files/<name>``
+
+        :param str name: name of the file (may contain slashes)
+        :param content: content of the file (str or bytes)
+        :param int interrupt: number of transfers of this file that are cut
+            halfway (to test resumed downloads)
+        :param bool ranges: support Range requests
+        :param bool digest: send the MD5 checksum in a Digest header
+        """
+        if isinstance(content, str):
+            content = content.encode()
+        self._files[name] = {"content": content, "interrupt": interrupt, "ranges": ranges, "digest": digest}
+        return f"{self.url}/files/{name}"
+
+    def reset(self):
+        """Clear counters, logs, jobs and rate-limit state"""
+        with self._lock:
+            self.hits.clear()
+            self.log.clear()
+            self.max_in_flight = 0
+            self._calls.clear()
+            self._jobs.clear()
+            self._history.clear()
+
+    # ------------------------------------------------------------------ #
+    # Dispatching                                                         #
+    # ------------------------------------------------------------------ #
+
+    def _rate_limited(self):
+        if not self.requests_per_sec:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._calls and now - self._calls[0] > 1:
+                self._calls.popleft()
+            if len(self._calls) >= self.requests_per_sec:
+                return True
+            self._calls.append(now)
+        return False
+
+    def handle(self, method, path, data=b"", headers=None):
+        """Returns the reply to a request. Used by the HTTP handler."""
+        with self._lock:
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            return self._handle(method, path, data, headers)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _handle(self, method, path, data, headers):
+        parsed = urlparse(path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query, keep_blank_values=True).items()}
+        if method == "POST" and data[:1] == b"{":
+            # JSON body (e.g. Ensembl POST endpoints)
+            params["_json"] = json.loads(data)
+        elif method == "POST" and data:
+            form = parse_qs(data.decode(errors="replace"), keep_blank_values=True)
+            params.update({k: v[-1] for k, v in form.items()})
+        base = f"http://{headers['Host']}" if headers and headers.get("Host") else self.url
+        prefix, _, rest = parsed.path.lstrip("/").partition("/")
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.down:
+            response = _MockResponse("Service unavailable", 503)
+        elif self._rate_limited():
+            response = _MockResponse("Too many requests", 429, headers={"Retry-After": "1"})
+        elif self.error_rate and self._random.random() < self.error_rate:
+            response = _MockResponse("Internal server error", 503)
+        elif (method, parsed.path) in self._canned:
+            response = self._canned[(method, parsed.path)]
+        elif prefix == "files":
+            response = self._serve_file(method, rest, headers or {})
+        else:
+            response = _MockResponse("Not found", 404)
+            for name, func in self._routes:
+                if prefix == name:
+                    try:
+                        response = func(method, rest, params, base)
+                    except Exception as err:  # pragma: no cover
+                        logger.error(err)
+                        response = _MockResponse(str(err), 500)
+                    break
+
+        with self._lock:
+            self.hits[prefix] += 1
+            self.log.append((method, path, response.status))
+        return response
+
+    def _serve_file(self, method, name, headers):
+        if name not in self._files:
+            return _MockResponse("Not found", 404)
+        item = self._files[name]
+        content = item["content"]
+        extra = {"Accept-Ranges": "bytes" if item["ranges"] else "none"}
+        if item["digest"]:
+            extra["Digest"] = "md5=" + base64.b64encode(hashlib.md5(content).digest()).decode()
+
+        status = 200
+        match = re.match(r"bytes=(\d+)-(\d*)$", headers.get("Range", "")) if item["ranges"] else None
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(content) - 1
+            if start >= len(content):
+                extra["Content-Range"] = f"bytes */{len(content)}"
+                return _MockResponse(b"", 416, headers=extra)
+            end = min(end, len(content) - 1)
+            extra["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+            content = content[start : end + 1]
+            status = 206
+
+        response = _MockResponse(content, status, content_type="application/octet-stream", headers=extra)
+        if method == "GET" and item["interrupt"] > 0 and len(content) > 1:
+            with self._lock:
+                item["interrupt"] -= 1
+            response.truncate = len(content) // 2
+        return response
+
+    # ------------------------------------------------------------------ #
+    # Generated data                                                      #
+    # ------------------------------------------------------------------ #
+
+    def _sequence(self, key, length, alphabet=_AMINO_ACIDS):
+        rand = random.Random(f"{self.seed}:{key}")
+        return "".join(rand.choice(alphabet) for _ in range(length))
+
+    def _gene_ids(self, org):
+        return [f"{org}:{i}" for i in range(1, self.n_genes + 1)]
+
+    def _gene_pathways(self, gene):
+        # each gene belongs to one or two pathways
+        number = int(gene.split(":")[1])
+        keys = sorted(self.pathways)
+        return sorted({keys[number % len(keys)], keys[(number * 7) % len(keys)]})
+
+    def accession(self, i):
+        """Returns the UniProt accession of the i-th generated protein"""
+        return f"P{i:05d}"
+
+    # ------------------------------------------------------------------ #
+    # KEGG                                                                #
+    # ------------------------------------------------------------------ #
+
+    def _kegg_text(self, lines):
+        if not lines:
+            return _MockResponse("", 404)
+        return _MockResponse("\n".join(lines) + "\n")
+
+    def _kegg_list(self, args):
+        db = args[0] if args else ""
+        org = args[1] if len(args) > 1 else None
+        if db == "organism":
+            return [f"{v[0]}\t{k}\t{v[1]}\t{v[2]}" for k, v in self.organisms.items()]
+        elif db == "pathway":
+            prefix = org or "map"
+            return [f"{prefix}{k}\t{v}" for k, v in self.pathways.items()]
+        elif db in ("compound", "reaction", "enzyme", "ko", "drug", "glycan"):
+            letter = {"compound": "C", "reaction": "R", "ko": "K", "drug": "D", "glycan": "G"}.get(db)
+            if db == "enzyme":
+                return [f"ec:1.1.1.{i}\tenzyme {i}" for i in range(1, self.n_molecules + 1)]
+            return [f"{letter}{i:05d}\t{db} {i}" for i in range(1, self.n_molecules + 1)]
+        elif db in self.organisms or db in [v[0] for v in self.organisms.values()]:
+            org = self._kegg_org(db)
+            return [f"{x}\tCDS\t1:{i * 1000}..{i * 1000 + 500}\tGENE{i}; protein {i}" for i, x in enumerate(self._gene_ids(org), 1)]
+        elif db:
+            # a dbentries
+            return [f"{x}\t{x} definition" for x in db.split("+") if self._kegg_entry_exists(x)]
+        return []
+
+    def _kegg_org(self, code):
+        for k, v in self.organisms.items():
+            if code == v[0]:
+                return k
+        return code
+
+    def _kegg_entry_exists(self, entry):
+        if ":" in entry:
+            org, number = entry.split(":", 1)
+            if org in self.organisms:
+                return number.isdigit() and 1 <= int(number) <= self.n_genes
+        return re.match(r"^(path:)?[a-z]{2,4}\d{5}$", entry) is not None or re.match(r"^(cpd:)?C\d{5}$", entry)
+
+    def _kegg_gene_entry(self, gene):
+        org, number = gene.split(":", 1)
+        i = int(number)
+        tnumber, name, _ = self.organisms[org]
+        aaseq = self._sequence(gene, 30)
+        ntseq = self._sequence(gene, 90, _NUCLEOTIDES)
+        lines = [
+            f"ENTRY       {number:<18}CDS       {tnumber}",
+            f"SYMBOL      GENE{i}",
+            f"NAME        (RefSeq) protein {i}",
+            f"ORTHOLOGY   K{i:05d}  orthology {i}",
+            f"ORGANISM    {org}  {name}",
+        ]
+        for j, pid in enumerate(self._gene_pathways(gene)):
+            header = "PATHWAY     " if j == 0 else "            "
+            lines.append(f"{header}{org}{pid}  {self.pathways[pid]}")
+        lines += [
+            f"POSITION    1:{i * 1000}..{i * 1000 + 500}",
+            f"DBLINKS     NCBI-GeneID: {i}",
+            f"            UniProt: {self.accession(i)}",
+            f"AASEQ       {len(aaseq)}",
+            f"            {aaseq}",
+            f"NTSEQ       {len(ntseq)}",
+            f"            {ntseq}",
+            "///",
+        ]
+        return "\n".join(lines)
+
+    def _kegg_pathway_entry(self, entry):
+        entry = entry.replace("path:", "")
+        org, pid = entry[:-5], entry[-5:]
+        lines = [
+            f"ENTRY       {entry:<22}Pathway",
+            f"NAME        {self.pathways.get(pid, 'pathway ' + pid)}",
+            "CLASS       Metabolism; Carbohydrate metabolism",
+        ]
+        genes = [g for g in self._gene_ids(org) if pid in self._gene_pathways(g)] if org in self.organisms else []
+        for j, gene in enumerate(genes):
+            header = "GENE        " if j == 0 else "            "
+            number = gene.split(":")[1]
+            lines.append(f"{header}{number}  GENE{number}; protein {number}")
+        lines.append("///")
+        return "\n".join(lines)
+
+    def _kegg_kgml(self, entry):
+        entry = entry.replace("path:", "")
+        org, pid = entry[:-5], entry[-5:]
+        genes = [g for g in self._gene_ids(org) if pid in self._gene_pathways(g)] if org in self.organisms else []
+        rand = random.Random(f"{self.seed}:{entry}")
+        lines = [
+            '<?xml version="1.0"?>',
+            '<!DOCTYPE pathway SYSTEM "https://www.kegg.jp/kegg/xml/KGML_v0.7.2_.dtd">',
+            f'<pathway name="path:{entry}" org="{org}" number="{pid}" title="{self.pathways.get(pid, "")}">',
+        ]
+        for i, gene in enumerate(genes, 1):
+            lines.append(f'    <entry id="{i}" name="{gene}" type="gene" link="https://www.kegg.jp/entry/{gene}">')
+            lines.append(f'        <graphics name="GENE{gene.split(":")[1]}" type="rectangle" x="{i * 10}" y="{i * 5}"/>')
+            lines.append("    </entry>")
+        lines.append(f'    <entry id="{len(genes) + 1}" name="path:{org}04010" type="map">')
+        lines.append('        <graphics name="MAPK signaling pathway" type="roundrectangle"/>')
+        lines.append("    </entry>")
+        for i in range(1, len(genes)):
+            name = rand.choice(["activation", "inhibition", "phosphorylation", "binding/association"])
+            value = {"activation": "--&gt;", "inhibition": "--|", "phosphorylation": "+p"}.get(name, "---")
+            lines.append(f'    <relation entry1="{i}" entry2="{i + 1}" type="PPrel">')
+            lines.append(f'        <subtype name="{name}" value="{value}"/>')
+            lines.append("    </relation>")
+        lines.append("</pathway>")
+        return "\n".join(lines) + "\n"
+
+    def _kegg_get(self, args):
+        entries = args[0].split("+") if args else []
+        option = args[1] if len(args) > 1 else None
+        if len(entries) > 10:
+            return _MockResponse("Bad request: more than 10 entries", 400)
+        if option == "kgml":
+            return _MockResponse(self._kegg_kgml(entries[0]), content_type="application/xml")
+        if option == "image":
+            return _MockResponse(b"\x89PNG\r\n\x1a\n" + entries[0].encode(), content_type="image/png")
+
+        records = []
+        for entry in entries:
+            if not self._kegg_entry_exists(entry):
+                continue
+            if ":" in entry and entry.split(":")[0] in self.organisms:
+                record = self._kegg_gene_entry(entry)
+                if option == "aaseq":
+                    record = f">{entry} protein\n{self._sequence(entry, 30)}"
+                elif option == "ntseq":
+                    record = f">{entry} protein\n{self._sequence(entry, 90, _NUCLEOTIDES)}"
+            elif re.match(r"^(path:)?[a-z]{2,4}\d{5}$", entry):
+                record = self._kegg_pathway_entry(entry)
+            else:
+                cid = entry.replace("cpd:", "")
+                record = f"ENTRY       {cid:<18}Compound\nNAME        compound {cid}\nFORMULA     H2O\n///"
+            records.append(record)
+        if not records:
+            return _MockResponse("", 404)
+        return _MockResponse("\n".join(records) + "\n")
+
+    def _kegg_conv(self, args):
+        target, source = args[0], args[1]
+        outside = {"uniprot": "up", "ncbi-geneid": "ncbi-geneid", "ncbi-proteinid": "ncbi-proteinid"}
+        genes = []
+        reverse = False
+        if target in outside and (source in self.organisms or ":" in source):
+            genes = self._gene_ids(source) if source in self.organisms else source.split("+")
+            prefix = outside[target]
+        elif source in outside and target in self.organisms:
+            genes = self._gene_ids(target)
+            prefix = outside[source]
+            reverse = True
+        else:
+            return _MockResponse("", 400)
+
+        lines = []
+        for gene in genes:
+            if not self._kegg_entry_exists(gene):
+                continue
+            i = int(gene.split(":")[1])
+            other = f"up:{self.accession(i)}" if prefix == "up" else f"{prefix}:{i}"
+            lines.append(f"{other}\t{gene}" if reverse else f"{gene}\t{other}")
+        return self._kegg_text(lines)
+
+    def _kegg_link(self, args):
+        target, source = args[0], args[1]
+        lines = []
+        if target == "pathway" and (source in self.organisms or ":" in source):
+            genes = self._gene_ids(source) if source in self.organisms else source.split("+")
+            for gene in genes:
+                if self._kegg_entry_exists(gene):
+                    org = gene.split(":")[0]
+                    lines += [f"{gene}\tpath:{org}{pid}" for pid in self._gene_pathways(gene)]
+        elif source == "pathway" and target in self.organisms:
+            for gene in self._gene_ids(target):
+                lines += [f"path:{target}{pid}\t{gene}" for pid in self._gene_pathways(gene)]
+        else:
+            return _MockResponse("", 400)
+        return self._kegg_text(lines)
+
+    def _kegg_find(self, args):
+        db, query = args[0], args[1].lower()
+        return self._kegg_text([x for x in self._kegg_list([db]) if query in x.lower()])
+
+    def _kegg_info(self, args):
+        db = args[0] if args else "kegg"
+        text = (
+            f"{db:<17}Kyoto Encyclopedia of Genes and Genomes\n"
+            f"{db:<17}Release {self.kegg_release}, Oct 26\n"
+            "                 Kanehisa Laboratories\n"
+            f"                 pathway      {len(self.pathways):>10} entries\n"
+        )
+        return _MockResponse(text)
+
+    def _kegg(self, method, path, params, base):
+        action, _, rest = path.partition("/")
+        args = [x for x in rest.split("/") if x]
+        if action == "list":
+            return self._kegg_text(self._kegg_list(args))
+        elif action == "get":
+            return self._kegg_get(args)
+        elif action == "conv" and len(args) == 2:
+            return self._kegg_conv(args)
+        elif action == "link" and len(args) == 2:
+            return self._kegg_link(args)
+        elif action == "find" and len(args) >= 2:
+            return self._kegg_find(args)
+        elif action == "info":
+            return self._kegg_info(args)
+        return _MockResponse("", 400)
+
+    # ------------------------------------------------------------------ #
+    # UniProt                                                             #
+    # ------------------------------------------------------------------ #
+
+    _uniprot_labels = {
+        "accession": "Entry",
+        "id": "Entry Name",
+        "reviewed": "Reviewed",
+        "protein_name": "Protein names",
+        "gene_names": "Gene Names",
+        "gene_primary": "Gene Names (primary)",
+        "organism_name": "Organism",
+        "organism_id": "Organism (ID)",
+        "length": "Length",
+        "mass": "Mass",
+        "sequence": "Sequence",
+    }
+
+    _uniprot_release = {"X-UniProt-Release": "2024_01"}
+
+    def _uniprot_entry(self, i):
+        sequence = self._sequence(self.accession(i), 20 + i % 50)
+        return {
+            "accession": self.accession(i),
+            "id": f"PROT{i}_HUMAN",
+            "reviewed": "reviewed",
+            "protein_name": f"Protein {i}",
+            "gene_names": f"GENE{i}",
+            "gene_primary": f"GENE{i}",
+            "organism_name": "Homo sapiens (Human)",
+            "organism_id": "9606",
+            "length": str(len(sequence)),
+            "mass": str(len(sequence) * 110),
+            "sequence": sequence,
+        }
+
+    def _uniprot_match(self, query):
+        terms = [t.strip() for t in re.split(r"\s+OR\s+", query.strip()) if t.strip()]
+        terms = [t.split(" AND ")[0].strip().strip("()").replace("accession:", "") for t in terms]
+        indices = []
+        for i in range(1, self.n_proteins + 1):
+            entry = self._uniprot_entry(i)
+            if not terms or "*" in terms:
+                indices.append(i)
+            elif any(t in (entry["accession"], entry["id"], entry["gene_primary"]) for t in terms):
+                indices.append(i)
+        return indices
+
+    def _uniprot_format(self, indices, frmt, fields, header=True):
+        entries = [self._uniprot_entry(i) for i in indices]
+        if frmt == "json":
+            results = [
+                {
+                    "primaryAccession": e["accession"],
+                    "uniProtkbId": e["id"],
+                    "genes": [{"geneName": {"value": e["gene_primary"]}}],
+                    "organism": {"scientificName": "Homo sapiens", "taxonId": 9606},
+                    "sequence": {"value": e["sequence"], "length": int(e["length"])},
+                }
+                for e in entries
+            ]
+            return json.dumps({"results": results}), "application/json"
+        elif frmt == "fasta":
+            text = ""
+            for e in entries:
+                seq = e["sequence"]
+                wrapped = "\n".join(seq[i : i + 60] for i in range(0, len(seq), 60))
+                text += (
+                    f">sp|{e['accession']}|{e['id']} {e['protein_name']} OS=Homo sapiens OX=9606 "
+                    f"GN={e['gene_primary']}\n{wrapped}\n"
+                )
+            return text, "text/plain"
+        else:
+            fields = fields or ["accession", "id", "reviewed", "protein_name", "gene_names", "organism_name", "length"]
+            lines = []
+            if header:
+                lines.append("\t".join(self._uniprot_labels.get(f, f) for f in fields))
+            for e in entries:
+                lines.append("\t".join(e.get(f, "") for f in fields))
+            return "\n".join(lines) + "\n", "text/plain"
+
+    def _paginate(self, items, params, base, path, default_size=25):
+        size = int(params.get("size", default_size) or default_size)
+        start = int(params.get("cursor", 0) or 0)
+        page = items[start : start + size]
+        headers = {"X-Total-Results": str(len(items))}
+        if start + size < len(items):
+            next_params = dict(params)
+            next_params["cursor"] = str(start + size)
+            next_params["size"] = str(size)
+            headers["Link"] = f'<{base}/{path}?{urlencode(next_params)}>; rel="next"'
+        return page, headers
+
+    def _uniprot_search(self, path, params, base):
+        indices = self._uniprot_match(params.get("query", "*"))
+        frmt = params.get("format", "json")
+        fields = [x.strip() for x in params["fields"].split(",")] if params.get("fields") else None
+        page, headers = self._paginate(indices, params, base, "uniprot/" + path)
+        body, content_type = self._uniprot_format(page, frmt, fields)
+        return _MockResponse(body, content_type=content_type, headers=headers)
+
+    def _uniprot_stream(self, path, params):
+        indices = self._uniprot_match(params.get("query", "*"))
+        if self.uniprot_stream_limit is not None and len(indices) > self.uniprot_stream_limit:
+            message = {"messages": ["Too many results to retrieve. Please refine your query or use pagination"]}
+            return _MockResponse(json.dumps(message), 400, "application/json")
+        frmt = params.get("format", "json")
+        fields = [x.strip() for x in params["fields"].split(",")] if params.get("fields") else None
+        body, content_type = self._uniprot_format(indices, frmt, fields)
+        if params.get("compressed") == "true":
+            return _MockResponse(gzip.compress(body.encode()), content_type="application/x-gzip")
+        return _MockResponse(body, content_type=content_type)
+
+    def _uniprot_run(self, params):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "from": params.get("from"),
+                "to": params.get("to"),
+                "ids": [x for x in params.get("ids", "").split(",") if x],
+                "created": time.monotonic(),
+            }
+        return _MockResponse(json.dumps({"jobId": job_id}), content_type="application/json")
+
+    def _uniprot_job_results(self, job_id, params, base, path, stream=False):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return _MockResponse(json.dumps({"messages": ["Resource not found"]}), 404, "application/json")
+        if time.monotonic() - job["created"] < self.job_delay:
+            return _MockResponse(json.dumps({"jobStatus": "RUNNING"}), content_type="application/json")
+
+        known = {}
+        for i in range(1, self.n_proteins + 1):
+            known[self.accession(i)] = i
+            known[f"GENE{i}"] = i
+            known[f"PROT{i}_HUMAN"] = i
+        results = []
+        failed = []
+        for identifier in job["ids"]:
+            if identifier in known:
+                i = known[identifier]
+                to = f"hsa:{i}" if job["to"] == "KEGG" else f"{self.accession(i)}"
+                results.append({"from": identifier, "to": to})
+            else:
+                failed.append(identifier)
+        if stream:
+            if self.uniprot_stream_limit is not None and len(results) > self.uniprot_stream_limit:
+                message = {"messages": ["Too many results to retrieve. Please use pagination"]}
+                return _MockResponse(json.dumps(message), 400, "application/json")
+            data = {"results": results, "failedIds": failed} if failed else {"results": results}
+            return _MockResponse(json.dumps(data), content_type="application/json")
+        page, headers = self._paginate(results, params, base, path)
+        data = {"results": page}
+        if failed and not params.get("cursor"):
+            data["failedIds"] = failed
+        return _MockResponse(json.dumps(data), content_type="application/json", headers=headers)
+
+    def _uniprot_fields(self):
+        data = {
+            "groups": [
+                {
+                    "groupName": "UniProt",
+                    "items": [
+                        {"name": "UniProtKB_AC-ID", "from": True, "to": False, "ruleId": 1},
+                        {"name": "UniProtKB", "from": False, "to": True, "ruleId": None},
+                        {"name": "Gene_Name", "from": True, "to": False, "ruleId": 2},
+                    ],
+                },
+                {
+                    "groupName": "Genome annotation databases",
+                    "items": [{"name": "KEGG", "from": True, "to": True, "ruleId": 2}],
+                },
+            ],
+            "rules": [
+                {"ruleId": 1, "tos": ["UniProtKB", "KEGG"], "defaultTo": "UniProtKB"},
+                {"ruleId": 2, "tos": ["UniProtKB"], "defaultTo": "UniProtKB"},
+            ],
+        }
+        return _MockResponse(json.dumps(data), content_type="application/json", headers=self._uniprot_release)
+
+    def _uniprot_result_fields(self):
+        from bioservices.uniprot import UniProt
+
+        names = dict.fromkeys(list(self._uniprot_labels) + UniProt._valid_columns)
+        fields = [{"name": x, "label": self._uniprot_labels.get(x, x)} for x in names]
+        data = [{"groupName": "Names & Taxonomy", "fields": fields}]
+        return _MockResponse(json.dumps(data), content_type="application/json", headers=self._uniprot_release)
+
+    def _uniprot_databases(self):
+        data = [
+            {"name": "PDB", "displayName": "PDB", "category": "3DS"},
+            {"name": "KEGG", "displayName": "KEGG", "category": "GMA"},
+        ]
+        return _MockResponse(json.dumps(data), content_type="application/json", headers=self._uniprot_release)
+
+    def _uniprot(self, method, path, params, base):
+        if path.endswith("/search"):
+            return self._uniprot_search(path, params, base)
+        elif path.endswith("/stream"):
+            return self._uniprot_stream(path, params)
+        elif path == "idmapping/run" and method == "POST":
+            return self._uniprot_run(params)
+        elif path.startswith("idmapping/results/stream/"):
+            job_id = path.rsplit("/", 1)[1]
+            return self._uniprot_job_results(job_id, params, base, path, stream=True)
+        elif path.startswith("idmapping/status/") or path.startswith("idmapping/results/"):
+            job_id = path.rsplit("/", 1)[1]
+            return self._uniprot_job_results(job_id, params, base, f"uniprot/idmapping/results/{job_id}")
+        elif path == "configure/idmapping/fields":
+            return self._uniprot_fields()
+        elif path == "configure/uniprotkb/result-fields":
+            return self._uniprot_result_fields()
+        elif path == "configure/uniprotkb/allDatabases":
+            return self._uniprot_databases()
+        # entries (uniprot/ is redirected to uniprotkb/ by UniProt)
+        match = re.match(r"^uniprot(?:kb)?/(\w+)\.(fasta|json|tsv|txt)$", path)
+        if match:
+            indices = self._uniprot_match(match.group(1))
+            if not indices:
+                return _MockResponse("", 404)
+            body, content_type = self._uniprot_format(indices, match.group(2), None)
+            return _MockResponse(body, content_type=content_type)
+        return _MockResponse("", 404)
+
+    # ------------------------------------------------------------------ #
+    # ChEMBL                                                              #
+    # ------------------------------------------------------------------ #
+
+    def _chembl(self, method, path, params, base):
+        resource = path.replace("api/data/", "").split(".")[0].strip("/")
+        if not resource or "/" in resource:
+            return _MockResponse("", 404)
+        limit = min(int(params.get("limit", 20)), 1000)
+        offset = int(params.get("offset", 0))
+        total = self.n_molecules
+        items = [
+            {f"{resource}_chembl_id": f"CHEMBL{i}", "pref_name": f"{resource.upper()} {i}"}
+            for i in range(offset + 1, min(offset + limit, total) + 1)
+        ]
+
+        def link(start):
+            return f"/chembl/api/data/{resource}.json?limit={limit}&offset={start}"
+
+        page_meta = {
+            "limit": limit,
+            "offset": offset,
+            "total_count": total,
+            "next": link(offset + limit) if offset + limit < total else None,
+            "previous": link(max(offset - limit, 0)) if offset else None,
+        }
+        data = {"page_meta": page_meta, f"{resource}s": items}
+        return _MockResponse(json.dumps(data), content_type="application/json")
+
+    # ------------------------------------------------------------------ #
+    # EUtils                                                              #
+    # ------------------------------------------------------------------ #
+
+    def _eutils_uids(self):
+        return [str(100000 + i) for i in range(1, self.n_records + 1)]
+
+    def _eutils_ids(self, params):
+        if params.get("id"):
+            return [x.strip() for x in params["id"].split(",") if x.strip()]
+        key = (params.get("WebEnv"), params.get("query_key"))
+        if key in self._history:
+            uids = self._history[key]
+            start = int(params.get("retstart", 0) or 0)
+            retmax = int(params.get("retmax", 10000) or 10000)
+            return uids[start : start + retmax]
+        return None
+
+    def _eutils_store(self, uids, webenv=None):
+        webenv = webenv or "MCID_" + uuid.uuid4().hex
+        with self._lock:
+            query_key = str(1 + sum(1 for k in self._history if k[0] == webenv))
+            self._history[(webenv, query_key)] = uids
+        return webenv, query_key
+
+    def _eutils(self, method, path, params, base):
+        name = path.rstrip("/")
+        if name == "einfo.fcgi":
+            data = {"einforesult": {"dblist": self.eutils_databases}}
+            return _MockResponse(json.dumps(data), content_type="application/json")
+        elif name == "esearch.fcgi":
+            uids = self._eutils_uids() if params.get("term") != "none" else []
+            start = int(params.get("retstart", 0) or 0)
+            retmax = int(params.get("retmax", 20) or 20)
+            result = {
+                "count": str(len(uids)),
+                "retmax": str(len(uids[start : start + retmax])),
+                "retstart": str(start),
+                "idlist": uids[start : start + retmax],
+            }
+            if params.get("usehistory") == "y":
+                result["webenv"], result["querykey"] = self._eutils_store(uids, params.get("WebEnv"))
+            return _MockResponse(json.dumps({"esearchresult": result}), content_type="application/json")
+        elif name == "epost.fcgi":
+            uids = [x.strip() for x in params.get("id", "").split(",") if x.strip()]
+            webenv, query_key = self._eutils_store(uids, params.get("WebEnv"))
+            xml = (
+                '<?xml version="1.0" encoding="UTF-8" ?>\n'
+                f"<ePostResult><QueryKey>{query_key}</QueryKey><WebEnv>{webenv}</WebEnv></ePostResult>\n"
+            )
+            return _MockResponse(xml, content_type="text/xml")
+        elif name == "efetch.fcgi":
+            uids = self._eutils_ids(params)
+            if uids is None:
+                return _MockResponse("<ERROR>Empty id list - nothing todo</ERROR>", 400, "text/xml")
+            if params.get("retmode") == "xml":
+                articles = "".join(
+                    f"<PubmedArticle><PMID>{uid}</PMID><ArticleTitle>Title {uid}</ArticleTitle></PubmedArticle>"
+                    for uid in uids
+                )
+                return _MockResponse(f"<PubmedArticleSet>{articles}</PubmedArticleSet>\n", content_type="text/xml")
+            elif params.get("rettype") == "fasta":
+                text = "".join(f">{uid} record {uid}\n{self._sequence(uid, 60)}\n\n" for uid in uids)
+            else:
+                text = "".join(f"PMID- {uid}\nTI  - Title {uid}\n\n" for uid in uids)
+            return _MockResponse(text)
+        elif name == "esummary.fcgi":
+            uids = self._eutils_ids(params)
+            if uids is None:
+                return _MockResponse(json.dumps({"error": "Empty id list - nothing todo"}), 400, "application/json")
+            result = {"uids": uids}
+            for uid in uids:
+                result[uid] = {"uid": uid, "title": f"Title {uid}"}
+            data = {"header": {"type": "esummary", "version": "0.3"}, "result": result}
+            return _MockResponse(json.dumps(data), content_type="application/json")
+        elif name == "elink.fcgi":
+            uids = self._eutils_ids(params) or []
+            links = "".join(f"<Link><Id>{int(uid) + 1}</Id></Link>" for uid in uids)
+            ids = "".join(f"<Id>{uid}</Id>" for uid in uids)
+            xml = (
+                f"<eLinkResult><LinkSet><DbFrom>{params.get('dbfrom', '')}</DbFrom><IdList>{ids}</IdList>"
+                f"<LinkSetDb><DbTo>{params.get('db', '')}</DbTo>{links}</LinkSetDb></LinkSet></eLinkResult>\n"
+            )
+            return _MockResponse(xml, content_type="text/xml")
+        return _MockResponse("", 404)
+
+    # ------------------------------------------------------------------ #
+    # Ensembl                                                             #
+    # ------------------------------------------------------------------ #
+
+    def ensembl_id(self, i):
+        """Returns the Ensembl identifier of the i-th generated gene"""
+        return f"ENSG{i:011d}"
+
+    def _ensembl_index(self, identifier):
+        # index of a generated gene from its identifier or symbol (None if unknown)
+        match = re.match(r"^(?:ENSG0*|GENE)(\d+)$", identifier)
+        if match and 1 <= int(match.group(1)) <= self.n_genes:
+            return int(match.group(1))
+
+    def _ensembl_gene(self, i):
+        return {
+            "id": self.ensembl_id(i),
+            "display_name": f"GENE{i}",
+            "species": "homo_sapiens",
+            "object_type": "Gene",
+            "biotype": "protein_coding",
+            "seq_region_name": str(1 + i % 22),
+            "start": 1000 * i,
+            "end": 1000 * i + 500,
+            "strand": 1 if i % 2 else -1,
+        }
+
+    def _ensembl_consequence(self, variant, i):
+        consequences = ["missense_variant", "synonymous_variant", "intron_variant", "stop_gained"]
+        return {
+            "input": variant,
+            "id": variant.split()[2] if " " in variant else variant,
+            "most_severe_consequence": consequences[i % len(consequences)],
+            "transcript_consequences": [{"gene_id": self.ensembl_id(1 + i % self.n_genes), "impact": "MODERATE"}],
+        }
+
+    def ensembl_genome(self, start, end):
+        """Returns the generated genomic sequence between start and end (1-based, inclusive)"""
+        return "".join(_NUCLEOTIDES[(p * 2654435761 >> 7) % 4] for p in range(start, end + 1))
+
+    def ensembl_features(self, start, end):
+        """Returns the generated genes overlapping start..end
+
+        The i-th gene spans 1000 * i to 1000 * i + 2500 so that genes overlap
+        each other.
+        """
+        first, last = max(1, (start - 2500) // 1000), min(end, self.ensembl_region_length) // 1000
+        return [
+            {
+                "id": self.ensembl_id(i),
+                "feature_type": "gene",
+                "biotype": "protein_coding",
+                "start": 1000 * i,
+                "end": 1000 * i + 2500,
+                "strand": 1 if i % 2 else -1,
+            }
+            for i in range(first, last + 1)
+            if 1000 * i <= end and 1000 * i + 2500 >= start
+        ]
+
+    def _ensembl_region(self, kind, species, region, params):
+        json_type = "application/json"
+        match = re.match(r"^(\w+):(\d+)(?:\.\.|-)(\d+)(?::(-?1))?$", region)
+        if match is None:
+            return _MockResponse(json.dumps({"error": f"Cannot parse region {region}"}), 400, json_type)
+        name, start, end, strand = match.group(1), int(match.group(2)), int(match.group(3)), match.group(4)
+        if end - start + 1 > self.ensembl_region_limits[kind]:
+            message = f"{region} is greater than the maximum allowed length of {self.ensembl_region_limits[kind]}"
+            return _MockResponse(json.dumps({"error": message}), 400, json_type)
+
+        if kind == "overlap":
+            data = self.ensembl_features(start, end)
+            for item in data:
+                item["seq_region_name"] = name
+            if params.get("trim_upstream") in ("1", "True"):
+                data = [x for x in data if x["start"] >= start]
+            if params.get("trim_downstream") in ("1", "True"):
+                data = [x for x in data if x["end"] <= end]
+        else:
+            seq = self.ensembl_genome(start, min(end, self.ensembl_region_length))
+            if strand == "-1":
+                seq = seq[::-1].translate(str.maketrans("ACGT", "TGCA"))
+            identifier = f"chromosome:GRCh38:{name}:{start}:{end}:{strand or 1}"
+            data = {"id": identifier, "query": region, "molecule": "dna", "seq": seq}
+        return _MockResponse(json.dumps(data), content_type=json_type)
+
+    def _ensembl(self, method, path, params, base):
+        json_type = "application/json"
+        if method == "POST":
+            parts = path.strip("/").split("/")
+            body = params.get("_json", {})
+            key = {"archive": "id", "lookup": "ids", "sequence": "ids", "vep": "ids"}.get(parts[0])
+            if parts[:2] == ["lookup", "symbol"]:
+                key = "symbols"
+            elif parts[0] == "sequence" and parts[1] == "region":
+                key = "regions"
+            elif parts[0] == "vep" and parts[-1] == "region":
+                key = "variants"
+            items = body.get(key)
+            if not isinstance(items, list):
+                return _MockResponse(json.dumps({"error": f"{key} not provided"}), 400, json_type)
+            if len(items) > self.ensembl_post_limits[parts[0]]:
+                message = {"error": f"POST message too large. You have submitted {len(items)} identifiers"}
+                return _MockResponse(json.dumps(message), 400, json_type)
+
+            if parts[0] == "lookup":
+                data = {}
+                for item in items:
+                    i = self._ensembl_index(item)
+                    data[item] = self._ensembl_gene(i) if i else None
+            elif parts[0] == "archive":
+                data = [
+                    {"id": x, "version": 1, "release": "110", "is_current": "1", "type": "Gene"}
+                    for x in items
+                    if self._ensembl_index(x)
+                ]
+            elif parts[0] == "sequence":
+                data = [{"id": x, "seq": self._sequence(x, 60, _NUCLEOTIDES), "molecule": "dna"} for x in items]
+            else:
+                data = [self._ensembl_consequence(x, i) for i, x in enumerate(items)]
+            return _MockResponse(json.dumps(data), content_type=json_type)
+
+        match = re.match(r"^(overlap|sequence)/region/(\w+)/([^/]+)$", path)
+        if match:
+            return self._ensembl_region(match.group(1), match.group(2), match.group(3), params)
+        match = re.match(r"^info/assembly/(\w+)/(\w+)$", path)
+        if match:
+            data = {"length": self.ensembl_region_length, "coordinate_system": "chromosome", "assembly_name": "GRCh38"}
+            return _MockResponse(json.dumps(data), content_type=json_type)
+        match = re.match(r"^xrefs/id/(\w+)$", path)
+        if match:
+            i = self._ensembl_index(match.group(1))
+            if not i:
+                return _MockResponse(json.dumps({"error": "ID not found"}), 400, json_type)
+            data = [
+                {"dbname": "HGNC", "primary_id": f"HGNC:{i}", "display_id": f"GENE{i}"},
+                {"dbname": "Uniprot_gn", "primary_id": self.accession(i), "display_id": f"PROT{i}_HUMAN"},
+            ]
+            return _MockResponse(json.dumps(data), content_type=json_type)
+        return _MockResponse(json.dumps({"error": "page not found"}), 404, json_type)
+
+
+def main(args=None):
+    """Run the mock server from the command line"""
+    import rich_click as click
+
+    @click.command()
+    @click.option("--host", default="127.0.0.1", show_default=True)
+    @click.option("--port", default=8080, type=int, show_default=True)
+    @click.option("--requests-per-sec", default=None, type=int, help="Reply with HTTP 429 above this rate")
+    @click.option("--error-rate", default=0.0, type=float, help="Probability to reply with HTTP 503")
+    @click.option("--latency", default=0.0, type=float, help="Delay (seconds) before each reply")
+    @click.option("--n-genes", default=100, type=int, show_default=True)
+    @click.option("--n-proteins", default=100, type=int, show_default=True)
+    @click.option("--n-molecules", default=100, type=int, show_default=True)
+    @click.option("--n-records", default=100, type=int, show_default=True)
+    def run(**kwargs):
+        """Start a local stand-in server for KEGG, UniProt, ChEMBL and EUtils"""
+        server = MockServer(**kwargs).start()
+        click.echo(f"Serving on {server.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+
+    run(args)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,457 @@
+#
+#  This file is part of bioservices software
+#
+#  Distributed under the GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  website: https://github.com/cokelaer/bioservices
+#  documentation: http://bioservices.readthedocs.io
+#
+##############################################################################
+"""Resumable downloads of large files to disk
+
+Several services (BiGG, ArrayExpress, BioModels, Ensembl FTP, UniProt flat
+files) provide large files for download. The :class:`DownloadManager` streams
+them to disk (never in memory), resumes interrupted transfers using HTTP
+Range requests (or the FTP REST command), verifies checksums when they are
+available and can split large files into several segments downloaded in
+parallel::
+
+    from bioservices.download import DownloadManager
+    dm = DownloadManager(segments=4, progress=True)
+    dm.download("https://example.org/big_file.gz", "big_file.gz", checksum="md5:...")
+
+Data is written into a *<target>.part* file that is renamed once the transfer
+is complete and verified. If the transfer is interrupted, calling
+:meth:`DownloadManager.download` again resumes from where it stopped.
+"""
+import base64
+import ftplib
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+import colorlog
+import requests
+from tqdm import tqdm
+
+from bioservices.services import BioServicesError
+
+logger = colorlog.getLogger(__name__)
+
+
+__all__ = ["DownloadManager", "DownloadError", "file_checksum"]
+
+
+class DownloadError(BioServicesError):
+    """Raised when a file could not be downloaded or verified"""
+
+
+def _bsd_sum(filename, blocksize):
+    # the Unix sum command (BSD algorithm) is much faster than the Python loop
+    if shutil.which("sum"):
+        try:
+            res = subprocess.run(["sum", "-r", filename], capture_output=True, check=True, text=True)
+            return "{:05d}".format(int(res.stdout.split()[0]))
+        except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+            pass
+    checksum = 0
+    with open(filename, "rb") as fin:
+        for block in iter(lambda: fin.read(blocksize), b""):
+            for byte in block:
+                checksum = ((checksum >> 1) + ((checksum & 1) << 15) + byte) & 0xFFFF
+    return "{:05d}".format(checksum)
+
+
+def file_checksum(filename, algorithm="md5", blocksize=1 << 20):
+    """Returns the hexadecimal digest of a file
+
+    :param str filename: the file to read
+    :param str algorithm: any algorithm known by :mod:`hashlib` (md5, sha1, sha256, ...)
+        or 'sum' for the 16-bit BSD checksum of the Unix sum command (used in
+        the CHECKSUMS files of the Ensembl FTP site), returned as 5 digits.
+    """
+    if algorithm == "sum":
+        return _bsd_sum(filename, blocksize)
+    digest = hashlib.new(algorithm)
+    with open(filename, "rb") as fin:
+        for block in iter(lambda: fin.read(blocksize), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DownloadManager:
+    """Stream files to disk with resume, checksums and parallel segments
+
+    :param session: a :class:`requests.Session` used for HTTP(S) transfers.
+        A new (uncached) session is created if not provided. Do not use a
+        cached session: partial (Range) replies must not be cached.
+    :param send: a function called as ``send(method, url, **kwargs)`` to send
+        the HTTP requests instead of the session methods (e.g.
+        :meth:`REST._send <bioservices.services.REST._send>` to go through
+        the circuit breaker of the host).
+    :param int chunk_size: size of the chunks written to disk (bytes)
+    :param int segments: number of parallel ranged requests used for large
+        files (1 means a single stream). Segments are used only if the server
+        supports Range requests and the file is larger than *min_segment_size*
+        times the number of segments.
+    :param int min_segment_size: minimum size of a segment (bytes)
+    :param int max_retries: number of times a transfer is resumed after a
+        network failure before giving up
+    :param float retry_delay: seconds to wait before the first retry (doubled
+        at each new attempt)
+    :param timeout: timeout of each request (seconds)
+    :param bool progress: show a progress bar
+
+    HTTP transfers support checksums given explicitly (see :meth:`download`)
+    or provided by the server in a *Digest* (RFC 3230) or *Content-MD5* header.
+    """
+
+    _digest_names = {"md5": "md5", "sha": "sha1", "sha-1": "sha1", "sha-256": "sha256", "sha-512": "sha512"}
+
+    def __init__(
+        self,
+        session=None,
+        send=None,
+        chunk_size=1 << 16,
+        segments=1,
+        min_segment_size=8 << 20,
+        max_retries=3,
+        retry_delay=1,
+        timeout=30,
+        progress=False,
+    ):
+        self.session = session if session is not None else requests.Session()
+        self.send = send
+        self.chunk_size = chunk_size
+        self.segments = segments
+        self.min_segment_size = min_segment_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.progress = progress
+
+    # ------------------------------------------------------------------ #
+    # Public API                                                          #
+    # ------------------------------------------------------------------ #
+
+    def download(self, url, target, checksum=None, segments=None, force=False, headers=None, params=None):
+        """Download a file and save it into *target*
+
+        :param str url: HTTP(S) or FTP URL of the file
+        :param str target: local filename
+        :param str checksum: expected checksum of the file given as
+            "algorithm:hexdigest" (e.g. "md5:d41d8cd98f00b204e9800998ecf8427e").
+            A plain hexadecimal digest is assumed to be a MD5.
+        :param int segments: overwrite the default number of segments
+        :param bool force: download the file even if *target* exists
+        :param dict headers: extra HTTP headers
+        :param dict params: query parameters (HTTP only)
+        :return: the target filename
+        :raises DownloadError: if the transfer fails after all retries or if
+            the checksum does not match.
+
+        If *target* exists already (and *force* is False), nothing is
+        downloaded; the checksum (if provided) is verified though.
+        """
+        target = str(target)
+        if os.path.exists(target) and not force:
+            logger.info("{} exists already. Use force=True to download it again".format(target))
+            if checksum:
+                self._verify(target, checksum)
+            return target
+
+        dirname = os.path.dirname(os.path.abspath(target))
+        os.makedirs(dirname, exist_ok=True)
+        # a partial file left by an interrupted transfer is resumed (even if force is True)
+        part = target + ".part"
+
+        scheme = urlparse(url).scheme
+        if scheme == "ftp":
+            server_checksum = self._download_ftp(url, part)
+        elif scheme in ("http", "https"):
+            server_checksum = self._download_http(url, part, segments or self.segments, headers or {}, params)
+        else:
+            raise DownloadError("Unsupported URL scheme: {}".format(url))
+
+        try:
+            self._verify(part, checksum or server_checksum)
+        except DownloadError:
+            self._cleanup(part)
+            raise
+        os.replace(part, target)
+        return target
+
+    # ------------------------------------------------------------------ #
+    # Checksums                                                           #
+    # ------------------------------------------------------------------ #
+
+    def _verify(self, filename, checksum):
+        if not checksum:
+            return
+        algorithm, _, expected = checksum.rpartition(":")
+        algorithm = algorithm or "md5"
+        found = file_checksum(filename, algorithm)
+        if found.lower() != expected.lower():
+            raise DownloadError(
+                "Checksum mismatch for {}: expected {} {}, found {}".format(filename, algorithm, expected, found)
+            )
+        logger.debug("{} checksum verified ({})".format(filename, algorithm))
+
+    def _server_checksum(self, headers):
+        # RFC 3230 Digest header, e.g. "sha-256=X48E9qOokqqrvdts8nOJRJN3OWDUoyWxBf7kbu9DBPE="
+        for item in headers.get("Digest", "").split(","):
+            name, _, value = item.strip().partition("=")
+            algorithm = self._digest_names.get(name.lower())
+            if algorithm and value:
+                return "{}:{}".format(algorithm, base64.b64decode(value).hex())
+        if headers.get("Content-MD5"):
+            return "md5:{}".format(base64.b64decode(headers["Content-MD5"]).hex())
+        return None
+
+    # ------------------------------------------------------------------ #
+    # HTTP                                                                #
+    # ------------------------------------------------------------------ #
+
+    def _request(self, method, url, **kwargs):
+        if self.send is not None:
+            return self.send(method, url, **kwargs)
+        return getattr(self.session, method)(url, **kwargs)
+
+    def _cleanup(self, part):
+        for filename in (part, part + ".json"):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _probe(self, url, headers, params):
+        """Returns size, support of Range requests and checksum using HEAD"""
+        try:
+            res = self._request("head", url, headers=headers, params=params, timeout=self.timeout, allow_redirects=True)
+        except requests.exceptions.RequestException as err:
+            logger.debug("HEAD request failed ({})".format(err))
+            return None, False, None
+        if not res.ok:
+            return None, False, None
+        size = res.headers.get("Content-Length")
+        # a compressed transfer does not give the size of the file
+        if size is not None and res.headers.get("Content-Encoding", "identity") == "identity":
+            size = int(size)
+        else:
+            size = None
+        accept_ranges = res.headers.get("Accept-Ranges", "none").lower() == "bytes"
+        return size, accept_ranges, self._server_checksum(res.headers)
+
+    def _download_http(self, url, part, segments, headers, params):
+        size, accept_ranges, checksum = self._probe(url, headers, params)
+        headers = dict(headers, **{"Accept-Encoding": "identity"})
+
+        with tqdm(
+            total=size, unit="B", unit_scale=True, desc=os.path.basename(part[:-5]), disable=not self.progress
+        ) as pbar:
+            state = part + ".json"
+            if accept_ranges and size and os.path.exists(state):
+                # a segmented transfer was interrupted: its .part file is
+                # preallocated, so it can only be resumed segment by segment
+                self._download_segments(url, part, size, segments, headers, params, pbar)
+            elif segments > 1 and accept_ranges and size and size >= segments * self.min_segment_size:
+                self._download_segments(url, part, size, segments, headers, params, pbar)
+            else:
+                self._download_stream(url, part, size, accept_ranges, headers, params, pbar)
+        return checksum
+
+    def _retry(self, attempt, err, url):
+        if attempt >= self.max_retries:
+            raise DownloadError("Could not download {} after {} attempts ({})".format(url, attempt + 1, err))
+        delay = self.retry_delay * 2**attempt
+        logger.warning("Transfer of {} interrupted ({}). Resuming in {}s".format(url, err, delay))
+        time.sleep(delay)
+
+    def _download_stream(self, url, part, size, accept_ranges, headers, params, pbar):
+        if os.path.exists(part + ".json"):
+            # left by a segmented transfer that cannot be resumed here: the
+            # .part file is preallocated and its size says nothing
+            logger.warning("Discarding {} (interrupted segmented transfer)".format(part))
+            self._cleanup(part)
+        elif size is not None and os.path.exists(part) and os.path.getsize(part) >= size:
+            # a complete .part file would have been renamed: do not trust it
+            logger.warning("Discarding {} (no transfer state)".format(part))
+            self._cleanup(part)
+        attempt = 0
+        while True:
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            if size is not None and offset == size:
+                return
+            if size is not None and offset > size:
+                offset = 0
+            request_headers = dict(headers)
+            if offset and (accept_ranges or size is None):
+                request_headers["Range"] = "bytes={}-".format(offset)
+            try:
+                with self._request(
+                    "get", url, headers=request_headers, params=params, stream=True, timeout=self.timeout
+                ) as res:
+                    if res.status_code == 416:
+                        # nothing left to download
+                        return
+                    if res.status_code >= 500:
+                        raise requests.exceptions.HTTPError("HTTP {}".format(res.status_code))
+                    if not res.ok:
+                        raise DownloadError("Could not download {} (HTTP {})".format(url, res.status_code))
+                    if res.status_code != 206:
+                        # the server sends the whole file
+                        offset = 0
+                    pbar.reset(total=size)
+                    pbar.update(offset)
+                    with open(part, "ab" if offset else "wb") as fout:
+                        for chunk in res.iter_content(chunk_size=self.chunk_size):
+                            fout.write(chunk)
+                            pbar.update(len(chunk))
+                if size is None or os.path.getsize(part) == size:
+                    return
+                raise requests.exceptions.ChunkedEncodingError("incomplete transfer")
+            except requests.exceptions.RequestException as err:
+                self._retry(attempt, err, url)
+                attempt += 1
+
+    #: seconds between two saves of the state of a segmented transfer
+    state_interval = 1
+
+    @staticmethod
+    def _save_state(part, size, positions):
+        # data written so far must be on disk before the state refers to it
+        with open(part, "r+b") as fout:
+            os.fsync(fout.fileno())
+        state = part + ".json"
+        with open(state + ".tmp", "w") as fout:
+            json.dump({"size": size, "segments": positions}, fout)
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(state + ".tmp", state)
+
+    def _download_segments(self, url, part, size, segments, headers, params, pbar):
+        state = part + ".json"
+        positions = None
+        if os.path.exists(state) and os.path.exists(part):
+            try:
+                with open(state) as fin:
+                    saved = json.load(fin)
+            except ValueError:
+                saved = {}
+            if saved.get("size") == size and os.path.getsize(part) == size:
+                positions = [tuple(x) for x in saved["segments"]]
+        if positions is None:
+            step = -(-size // segments)
+            # (start of the segment, next byte to download, end of the segment)
+            positions = [(start, start, min(start + step, size) - 1) for start in range(0, size, step)]
+            with open(part, "wb") as fout:
+                fout.truncate(size)
+            # the state is saved before the first byte: a preallocated .part
+            # file is never mistaken for a complete one
+            self._save_state(part, size, positions)
+
+        positions = [list(x) for x in positions]
+        pbar.update(sum(pos - start for start, pos, _ in positions))
+        lock = threading.Lock()
+        state_lock = threading.Lock()
+        saved = {"time": time.monotonic()}
+
+        def checkpoint(force=False):
+            # positions only count bytes flushed to the file (see fetch)
+            if not force and time.monotonic() - saved["time"] < self.state_interval:
+                return
+            with state_lock:
+                with lock:
+                    saved["time"] = time.monotonic()
+                    snapshot = [list(x) for x in positions]
+                self._save_state(part, size, snapshot)
+
+        def fetch(segment):
+            attempt = 0
+            while segment[1] <= segment[2]:
+                request_headers = dict(headers, Range="bytes={}-{}".format(segment[1], segment[2]))
+                try:
+                    with self._request(
+                        "get", url, headers=request_headers, params=params, stream=True, timeout=self.timeout
+                    ) as res:
+                        if res.status_code != 206:
+                            raise requests.exceptions.HTTPError("HTTP {} to a Range request".format(res.status_code))
+                        with open(part, "r+b") as fout:
+                            fout.seek(segment[1])
+                            for chunk in res.iter_content(chunk_size=self.chunk_size):
+                                chunk = chunk[: segment[2] + 1 - segment[1]]
+                                fout.write(chunk)
+                                fout.flush()
+                                with lock:
+                                    segment[1] += len(chunk)
+                                    pbar.update(len(chunk))
+                                checkpoint()
+                    if segment[1] <= segment[2]:
+                        raise requests.exceptions.ChunkedEncodingError("incomplete segment")
+                except requests.exceptions.RequestException as err:
+                    self._retry(attempt, err, url)
+                    attempt += 1
+            checkpoint(force=True)
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(positions)) as executor:
+                for future in [executor.submit(fetch, segment) for segment in positions]:
+                    future.result()
+        except BaseException:
+            # save the state so that the next call resumes each segment
+            checkpoint(force=True)
+            raise
+        if os.path.exists(state):
+            os.remove(state)
+
+    # ------------------------------------------------------------------ #
+    # FTP                                                                 #
+    # ------------------------------------------------------------------ #
+
+    def _download_ftp(self, url, part):
+        parsed = urlparse(url)
+        path = unquote(parsed.path)
+        attempt = 0
+        while True:
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            try:
+                with ftplib.FTP(timeout=self.timeout) as ftp:
+                    ftp.connect(parsed.hostname, parsed.port or 21)
+                    ftp.login(unquote(parsed.username or "anonymous"), unquote(parsed.password or "anonymous@"))
+                    ftp.voidcmd("TYPE I")
+                    try:
+                        size = ftp.size(path)
+                    except ftplib.all_errors:
+                        size = None
+                    if size is not None and offset == size:
+                        return None
+                    if size is not None and offset > size:
+                        offset = 0
+                    with open(part, "ab" if offset else "wb") as fout, tqdm(
+                        total=size,
+                        initial=offset,
+                        unit="B",
+                        unit_scale=True,
+                        desc=os.path.basename(part[:-5]),
+                        disable=not self.progress,
+                    ) as pbar:
+
+                        def write(block):
+                            fout.write(block)
+                            pbar.update(len(block))
+
+                        ftp.retrbinary("RETR {}".format(path), write, blocksize=self.chunk_size, rest=offset or None)
+                if size is None or os.path.getsize(part) == size:
+                    return None
+                raise EOFError("incomplete transfer")
+            except ftplib.error_perm as err:
+                raise DownloadError("Could not download {} ({})".format(url, err))
+            except ftplib.all_errors as err:
+                self._retry(attempt, err, url)
+                attempt += 1
@@ -32,13 +32,19 @@
 
 
 """
+import json
+import re
+import time
+
+import pandas as pd
+
 from bioservices import logger
-from bioservices.services import REST
+from bioservices.services import REST, BioServicesError
 
 logger.name = __name__
 
 
-__all__ = ["Ensembl"]
+__all__ = ["Ensembl", "EnsemblFTP"]
 
 
 class Ensembl:
@@ -52,25 +58,177 @@ class Ensembl:
     `notebook <http://nbviewer.ipython.org/github/bioservices/notebooks/blob/master/ensembl/Ensembl.ipynb>`_
 
 
-    .. todo:: There are 3 methods out of 50 that are not implemented so far.
+    .. todo:: get_homology_by_symbol is not implemented so far.
     .. todo:: some methods have a parameter called *feature*. The official
        Ensembl API allows one to provide several features at the same time.
        This is not yet implemented. Only one at a time is accepted.
 
+    Batch (POST) methods such as :meth:`post_lookup_by_id` accept any number
+    of identifiers: they are sent by chunks that fit the Ensembl limits,
+    concurrently, and the results are merged (a dictionary, a list or a
+    dataframe with frmt='dataframe').
+
+    Regions larger than the Ensembl limits (5Mb for overlaps, 10Mb for
+    sequences) can be queried with :meth:`get_overlap_by_region_tiled` and
+    :meth:`get_sequence_by_region_tiled`: the region is split into tiles
+    fetched concurrently and the results are stitched together::
+
+        features = e.get_overlap_by_region_tiled("X", "human", feature="gene")
+        for piece in e.get_sequence_by_region_tiled("X:1..50000000", "human", stream=True):
+            ...
+
     .. note:: Some function uses SQL wildcards. See e.g. http://www.w3schools.com/sql/sql_wildcards.asp
         In brief, "_" can be use to substitute a single character and '%' a set of characters.
     """
 
     _url = "http://rest.ensembl.org"
 
+    #: maximum number of items per POST request accepted by Ensembl
+    _post_limits = {"archive": 1000, "lookup": 1000, "sequence": 50, "vep": 200}
+    #: maximum length (bp) of a region accepted by Ensembl
+    _region_limits = {"overlap": 5000000, "sequence": 10000000}
+
     def __init__(self, verbose=False, cache=False):
         """**Constructor**
 
         :param verbose: set to False to prevent informative messages
         """
-        self.services = REST(name="Ensembl", url=Ensembl._url, verbose=verbose, cache=cache)
+        # Ensembl allows 15 requests per second (55,000 per hour)
+        self.services = REST(name="Ensembl", url=Ensembl._url, verbose=verbose, cache=cache, requests_per_sec=15)
         self.callback = None  # use in all methods
 
+    def _post_one(self, query, body, params, retries=3):
+        # one POST request; waits and retries if Ensembl is busy (HTTP 429/503)
+        headers = self.services.get_headers(content="json")
+        data = self.services.devtools.to_json(body)
+        for attempt in range(retries + 1):
+            res = self.services.http_post(query, frmt="json", headers=headers, data=data, params=params)
+            if not isinstance(res, int) or res not in (429, 503) or attempt == retries:
+                return res
+            delay = self.services.last_response.headers.get("Retry-After", 1)
+            logger.warning("Ensembl is busy (status {}). Retrying in {} seconds".format(res, delay))
+            time.sleep(float(delay))
+
+    def _post_batches(self, query, key, items, limit, params=None, extra=None, max_workers=None, progress=False):
+        """POST items by chunks of at most *limit* items and merge the results
+
+        Chunks are sent concurrently (see :meth:`REST.map_concurrent`) within
+        the rate limit of the service. Results are merged into a single
+        dictionary (lookup endpoints) or list (other endpoints). If a chunk
+        fails, a :class:`BioServicesError` naming the failed items is raised
+        (a partial result is never returned).
+        """
+        items = list(dict.fromkeys(self.services.devtools.to_list(items)))
+        chunks = [items[i : i + limit] for i in range(0, len(items), limit)]
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+
+        def post(chunk):
+            body = dict(extra or {})
+            body[key] = chunk
+            return self._post_one(query, body, params)
+
+        results = self.services.map_concurrent(post, chunks, max_workers=max_workers, progress=progress)
+        failed = [(chunk, res) for chunk, res in zip(chunks, results) if not isinstance(res, (dict, list))]
+        if failed:
+            items = [x for chunk, _ in failed for x in chunk]
+            shown = ", ".join(str(x) for x in items[:10]) + (", ..." if len(items) > 10 else "")
+            raise BioServicesError(
+                "{} failed for {} items in {} of {} chunks (status {}): {}".format(
+                    query, len(items), len(failed), len(chunks), failed[0][1], shown
+                )
+            )
+        merged = None
+        for res in results:
+            if merged is None:
+                merged = res
+            elif isinstance(res, dict):
+                merged.update(res)
+            else:
+                merged.extend(res)
+        return merged
+
+    @staticmethod
+    def _batch_output(res, frmt):
+        # frmt is 'json' (merged dictionary or list) or 'dataframe'
+        if frmt != "dataframe" or not isinstance(res, (dict, list)):
+            return res
+        if isinstance(res, dict):
+            # one row per identifier; identifiers not found (None) are dropped
+            return pd.DataFrame.from_dict({k: v for k, v in res.items() if v}, orient="index")
+        return pd.DataFrame(res)
+
+    def _check_batch_frmt(self, frmt):
+        self.services.devtools.check_param_in_list(frmt, ["json", "dataframe"])
+
+    def _parse_region(self, region, species):
+        """Returns (name, start, end, strand) of a region e.g. X:1..1000:1 or X:1-1000
+
+        If only the name of the sequence region is provided (e.g. X), the
+        whole sequence region is used; its length is fetched from Ensembl.
+        """
+        match = re.match(r"^([^:]+)(?::(\d+)(?:\.\.|-)(\d+))?(?::(-?1))?$", str(region).strip())
+        if match is None:
+            raise ValueError("Invalid region {}. Expected e.g. X:1..1000:1, X:1-1000 or X".format(region))
+        name, start, end, strand = match.groups()
+        if start is None:
+            info = self.get_info_assembly_by_region(species, name)
+            if not isinstance(info, dict) or "length" not in info:
+                raise ValueError("Could not find the length of {} (status {})".format(name, info))
+            start, end = 1, info["length"]
+        start, end = int(start), int(end)
+        if start > end:
+            raise ValueError("Invalid region {}: start is after end".format(region))
+        return name, start, end, int(strand or 1)
+
+    @staticmethod
+    def _tile_region(name, start, end, strand, size):
+        # list of (region, start, end) covering start..end with tiles of at most size bp
+        return [
+            ("{}:{}..{}:{}".format(name, x, min(x + size - 1, end), strand), x, min(x + size - 1, end))
+            for x in range(start, end + 1, size)
+        ]
+
+    def _iter_tiles(self, func, tiles, max_workers=None, progress=False):
+        """Yields (tile, func(tile)) in the order of the tiles
+
+        Tiles are fetched concurrently (see :meth:`REST.map_concurrent`) by
+        windows of *max_workers* tiles so that only a few tiles are held in
+        memory at any time.
+        """
+        from tqdm import tqdm
+
+        max_workers = max_workers or self.services.settings.MAX_WORKERS
+        with tqdm(total=len(tiles), disable=not progress) as bar:
+            for i in range(0, len(tiles), max_workers):
+                window = tiles[i : i + max_workers]
+                for tile, res in zip(window, self.services.map_concurrent(func, window, max_workers=max_workers)):
+                    bar.update()
+                    yield tile, res
+
+    @staticmethod
+    def _unique_features(pages):
+        """Yields the features of consecutive tiles, once each
+
+        A feature overlapping the edge of two tiles is returned in both;
+        only the features crossing the end of the previous tile are kept
+        to detect those duplicates.
+        """
+        previous = set()
+        for (_, tile_start, tile_end), features in pages:
+            current = set()
+            for item in features:
+                start, end = item.get("start"), item.get("end")
+                before = start is not None and start < tile_start
+                after = end is not None and end > tile_end
+                if before or after:
+                    key = json.dumps(item, sort_keys=True)
+                    if after:
+                        current.add(key)
+                    if before and key in previous:
+                        continue
+                yield item
+            previous = current
+
     def _check_frmt(self, frmt, values=[]):
         self.services.devtools.check_param_in_list(frmt, ["json", "jsonp"] + values)
 
@@ -132,24 +290,32 @@ class Ensembl:
             res = self.easyXML(res)
         return res
 
-    def post_archive(self, identifiers, frmt="json"):
+    def post_archive(self, identifiers, frmt="json", max_workers=None, progress=False):
         """Retrieve the archived sequence for a set of identifiers
 
-        returned by the requested JSONP response. Required ONLY when using
-        JSONP as the serialisation method. Please see the user guide.
+        :param list identifiers: Ensembl stable IDs. Any number of identifiers
+            can be provided; they are sent by chunks of 1000 (the Ensembl
+            limit), concurrently.
+        :param str frmt: json (a list of dictionaries) or dataframe
+        :param int max_workers: number of concurrent requests
+        :param bool progress: show a progress bar (one step per chunk)
+
+        ::
+
+            >>> s.post_archive(["ENSG00000157764", "ENSG00000248378"])
 
         """
-        self._check_frmt(frmt, ["xml"])
-        res = self.services.http_post(
-            "archive/id/",
-            frmt=frmt,
-            headers=self.services.get_headers(content=frmt),
-            data=self.services.devtools.to_json({"id": identifiers}),
+        self._check_batch_frmt(frmt)
+        res = self._post_batches(
+            "archive/id",
+            "id",
+            identifiers,
+            self._post_limits["archive"],
             params={"callback": self.callback},
+            max_workers=max_workers,
+            progress=progress,
         )
-        if frmt == "xml":
-            res = self.easyXML(res)
-        return res
+        return self._batch_output(res, frmt)
 
     # COMPARATIVE GENOMICS
     # ------------------------------------------------------------------
@@ -439,6 +605,60 @@ class Ensembl:
         )
         return res
 
+    def post_xrefs_by_id(
+        self,
+        identifiers,
+        frmt="json",
+        all_levels=False,
+        db_type="core",
+        external_db=None,
+        object_type=None,
+        species=None,
+        max_workers=None,
+        progress=False,
+    ):
+        """External references of a set of Ensembl identifiers
+
+        Ensembl has no POST endpoint for cross references: one request per
+        identifier is sent (see :meth:`get_xrefs_by_id`), concurrently. If a
+        request fails, a :class:`BioServicesError` naming the failed
+        identifiers is raised (a partial result is never returned).
+
+        :param list identifiers: Ensembl Stable IDs (ENSG00000157764)
+        :param str frmt: json (a dictionary keyed by identifier) or dataframe
+            (one row per cross reference with an additional *id* column)
+        :param int max_workers: number of concurrent requests
+        :param bool progress: show a progress bar
+
+        Other parameters are described in :meth:`get_xrefs_by_id`.
+        """
+        self._check_batch_frmt(frmt)
+        identifiers = list(dict.fromkeys(self.services.devtools.to_list(identifiers)))
+
+        def get(identifier):
+            return self.get_xrefs_by_id(
+                identifier,
+                all_levels=all_levels,
+                db_type=db_type,
+                external_db=external_db,
+                object_type=object_type,
+                species=species,
+            )
+
+        results = self.services.map_concurrent(get, identifiers, max_workers=max_workers, progress=progress)
+        failed = [(identifier, xrefs) for identifier, xrefs in zip(identifiers, results) if not isinstance(xrefs, list)]
+        if failed:
+            shown = ", ".join(x for x, _ in failed[:10]) + (", ..." if len(failed) > 10 else "")
+            raise BioServicesError(
+                "xrefs/id failed for {} of {} identifiers (status {}): {}".format(
+                    len(failed), len(identifiers), failed[0][1], shown
+                )
+            )
+        res = dict(zip(identifiers, results))
+        if frmt == "dataframe":
+            return pd.DataFrame([dict(x, id=identifier) for identifier, xrefs in res.items() for x in xrefs])
+        return res
+
     def get_xrefs_by_name(self, name, species, frmt="json", db_type="core", external_db=None):
         """Performs a lookup based upon the primary accession or display label
         of an external reference and returning the information we hold about the
@@ -780,11 +1000,16 @@ class Ensembl:
         format="full",
         object_type=None,
         species=None,
+        max_workers=None,
+        progress=False,
     ):
-        """Find the species and database for a single identifier
+        """Find the species and database for a set of identifiers
 
-        :param str identifier: An ontology term identifier (e.g., GO:0005667)
-        :param str frmt: response formats in json, xml, jsonp
+        :param list identifiers: Ensembl stable IDs. Any number of identifiers
+            can be provided; they are sent by chunks of 1000 (the Ensembl
+            limit), concurrently.
+        :param str frmt: json (a dictionary keyed by identifier) or dataframe
+            (one row per identifier found)
         :param str db_type: Restrict the search to a database other than the
             default. Useful if you need to use a DB other than core. Defaults
             to core
@@ -794,30 +1019,32 @@ class Ensembl:
         :param str format: Specify the formats to emit from this endpoint
         :param str object_type: Filter by feature type (e.g., gene, transcript)
         :param str species: Species name/alias (e.g., human)
+        :param int max_workers: number of concurrent requests
+        :param bool progress: show a progress bar (one step per chunk)
 
         ::
 
             post_lookup_by_id(["ENSG00000157764", "ENSG00000248378" ])
 
-        .. todo: frmt can only be json or jsonp
         """
-        self._check_frmt(frmt)
-        identifiers = self.services.devtools.to_list(identifiers)
-        expand = int(expand)
-        res = self.services.http_post(
-            "lookup/id/",
-            frmt=frmt,
-            headers=self.services.get_headers(content=frmt),
-            data=self.services.devtools.to_json({"ids": identifiers}),
+        self._check_batch_frmt(frmt)
+        res = self._post_batches(
+            "lookup/id",
+            "ids",
+            identifiers,
+            self._post_limits["lookup"],
             params={
                 "db_type": db_type,
-                "expand": expand,
+                "expand": int(expand),
                 "format": format,
                 "callback": self.callback,
+                "object_type": object_type,
                 "species": species,
             },
+            max_workers=max_workers,
+            progress=progress,
         )
-        return res
+        return self._batch_output(res, frmt)
 
     def get_lookup_by_symbol(
         self,
@@ -860,34 +1087,39 @@ class Ensembl:
         frmt="json",
         expand=False,
         format="full",
+        max_workers=None,
+        progress=False,
     ):
         """Find the species and database for a set of symbols
 
         :param str species: Species name/alias (e.g., human)
         :param list symbols: A list of names or symbols from an annotation source has been
-            linked to a genetic feature. e.g., BRCA2
-        :param str frmt: response formats in json, xml, jsonp
+            linked to a genetic feature. e.g., BRCA2. They are sent by chunks
+            of 1000 (the Ensembl limit), concurrently.
+        :param str frmt: json (a dictionary keyed by symbol) or dataframe
         :param str expand: Expands the search to include any connected features.
             e.g. If the object is a gene, its transcripts, translations and exons
             will be returned as well.
         :param str format: Specify the formats to emit from this endpoint
+        :param int max_workers: number of concurrent requests
+        :param bool progress: show a progress bar (one step per chunk)
 
         ::
 
             post_lookup_by_symbol('homo_sapiens', ['BRCA2', 'BRAF'], expand=True)
 
         """
-        self._check_frmt(frmt, ["xml"])
-        symbols = self.services.devtools.to_list(symbols)
-        expand = int(expand)
-        res = self.services.http_post(
+        self._check_batch_frmt(frmt)
+        res = self._post_batches(
             "lookup/symbol/{0}".format(species),
-            frmt=frmt,
-            headers=self.services.get_headers(content=frmt),
-            data=self.services.devtools.to_json({"symbols": symbols}),
-            params={"format": format, "callback": self.callback, "expand": expand},
+            "symbols",
+            symbols,
+            self._post_limits["lookup"],
+            params={"format": format, "callback": self.callback, "expand": int(expand)},
+            max_workers=max_workers,
+            progress=progress,
         )
-        return res
+        return self._batch_output(res, frmt)
 
     # MAPPING
     # --------------------------------------------------------------------
@@ -1334,6 +1566,79 @@ class Ensembl:
         )
         return res
 
+    def get_overlap_by_region_tiled(
+        self,
+        region,
+        species,
+        feature=None,
+        frmt="json",
+        tile_size=None,
+        max_workers=None,
+        progress=False,
+        stream=False,
+        trim_downstream=False,
+        trim_upstream=False,
+        **kwargs,
+    ):
+        """Retrieves the features overlapping a region of any size
+
+        Same as :meth:`get_overlap_by_region` for regions larger than the
+        5Mb accepted by Ensembl (e.g. a whole chromosome). The region is split
+        into tiles fetched concurrently; features overlapping several tiles
+        are reported once.
+
+        ::
+
+            df = e.get_overlap_by_region_tiled("X", "human", feature="gene", frmt="dataframe")
+
+        :param str region: Query region e.g. X:1..20000000, X:1-20000000:1 or
+            X for the whole sequence region.
+        :param str species: Species name/alias.
+        :param str feature: The type of feature to retrieve (see
+            :meth:`get_overlap_by_region`).
+        :param str frmt: json (list of features) or dataframe.
+        :param int tile_size: length of the tiles (default to the 5Mb limit).
+        :param int max_workers: number of tiles fetched concurrently.
+        :param bool progress: show a progress bar.
+        :param bool stream: returns a generator of features (in the order of
+            the region) instead of a list. frmt is ignored.
+        :param bool trim_downstream: Do not return features which overlap
+            the downstream end of the region.
+        :param bool trim_upstream: Do not return features which overlap
+            upstream end of the region.
+        :param kwargs: other parameters of :meth:`get_overlap_by_region`
+            (e.g. biotype, so_term).
+        :raises ValueError: if a tile cannot be fetched.
+        """
+        self._check_batch_frmt(frmt)
+        name, start, end, strand = self._parse_region(region, species)
+        tiles = self._tile_region(name, start, end, strand, tile_size or self._region_limits["overlap"])
+
+        def fetch(tile):
+            # trimming only applies to the ends of the whole region
+            return self.get_overlap_by_region(
+                tile[0],
+                species,
+                feature=feature,
+                trim_upstream=trim_upstream and tile == tiles[0],
+                trim_downstream=trim_downstream and tile == tiles[-1],
+                **kwargs,
+            )
+
+        def pages():
+            for tile, res in self._iter_tiles(fetch, tiles, max_workers=max_workers, progress=progress):
+                if not isinstance(res, list):
+                    raise ValueError("Could not fetch the features of {} (status {})".format(tile[0], res))
+                yield tile, res
+
+        features = self._unique_features(pages())
+        if stream:
+            return features
+        features = list(features)
+        if frmt == "dataframe":
+            return pd.DataFrame(features)
+        return features
+
     def get_overlap_by_translation(
         self,
         identifier,
@@ -1492,6 +1797,58 @@ class Ensembl:
         )
         return res
 
+    def post_sequence_by_id(
+        self,
+        identifiers,
+        frmt="json",
+        db_type=None,
+        expand_3prime=None,
+        expand_5prime=None,
+        mask=None,
+        mask_feature=False,
+        multiple_sequences=False,
+        object_type=None,
+        species=None,
+        type="genomic",
+        max_workers=None,
+        progress=False,
+    ):
+        """Request multiple types of sequence for a set of stable identifiers
+
+        :param list identifiers: stable Ensembl IDs. They are sent by chunks of
+            50 (the Ensembl limit), concurrently.
+        :param str frmt: json (a list of dictionaries with the id, seq and
+            molecule keys) or dataframe
+
+        Other parameters are described in :meth:`get_sequence_by_id`.
+
+        ::
+
+            >>> res = e.post_sequence_by_id(["ENSG00000157764", "ENSG00000248378"], type="cds")
+
+        """
+        self._check_batch_frmt(frmt)
+        res = self._post_batches(
+            "sequence/id",
+            "ids",
+            identifiers,
+            self._post_limits["sequence"],
+            params={
+                "db_type": db_type,
+                "object_type": object_type,
+                "species": species,
+                "expand_3prime": expand_3prime,
+                "expand_5prime": expand_5prime,
+                "mask": mask,
+                "mask_feature": int(mask_feature),
+                "multiple_sequences": int(multiple_sequences),
+                "type": type,
+            },
+            max_workers=max_workers,
+            progress=progress,
+        )
+        return self._batch_output(res, frmt)
+
     def get_sequence_by_region(
         self,
         region,
@@ -1548,6 +1905,126 @@ class Ensembl:
         )
         return res
 
+    def get_sequence_by_region_tiled(
+        self,
+        region,
+        species,
+        frmt="json",
+        tile_size=None,
+        max_workers=None,
+        progress=False,
+        stream=False,
+        expand_3prime=None,
+        expand_5prime=None,
+        **kwargs,
+    ):
+        """Returns the genomic sequence of a region of any size
+
+        Same as :meth:`get_sequence_by_region` for regions larger than the
+        10Mb accepted by Ensembl. The region is split into tiles fetched
+        concurrently and their sequences are joined (in reverse order for the
+        reverse strand).
+
+        ::
+
+            seq = e.get_sequence_by_region_tiled("X:1..50000000:1", "human", frmt="text")
+            with open("X.txt", "w") as fout:
+                for piece in e.get_sequence_by_region_tiled("X", "human", stream=True):
+                    fout.write(piece)
+
+        :param str region: Query region e.g. X:1..20000000:1, X:1-20000000 or
+            X for the whole sequence region.
+        :param str species: Species name/alias
+        :param str frmt: json (dictionary with the id, query and seq), text
+            or fasta.
+        :param int tile_size: length of the tiles (default to the 10Mb limit).
+        :param int max_workers: number of tiles fetched concurrently.
+        :param bool progress: show a progress bar.
+        :param bool stream: returns a generator of sequences (one per tile)
+            to be concatenated instead of the whole sequence. frmt is ignored.
+        :param int expand_3prime: Expand the sequence downstream of the
+            region by this many basepairs.
+        :param int expand_5prime: Expand the sequence upstream of the
+            region by this many basepairs.
+        :param kwargs: other parameters of :meth:`get_sequence_by_region`
+            (e.g. mask, coord_system).
+        :raises ValueError: if a tile cannot be fetched.
+        """
+        self.services.devtools.check_param_in_list(frmt, ["json", "text", "fasta"])
+        name, start, end, strand = self._parse_region(region, species)
+        # expansions apply to the whole region, not to each tile
+        upstream, downstream = expand_5prime or 0, expand_3prime or 0
+        if strand == -1:
+            upstream, downstream = downstream, upstream
+        start, end = max(1, start - upstream), end + downstream
+
+        tiles = self._tile_region(name, start, end, strand, tile_size or self._region_limits["sequence"])
+        if strand == -1:
+            # the reverse complement of the region starts with the last tile
+            tiles = tiles[::-1]
+
+        def fetch(tile):
+            return self.get_sequence_by_region(tile[0], species, **kwargs)
+
+        def pieces():
+            for tile, res in self._iter_tiles(fetch, tiles, max_workers=max_workers, progress=progress):
+                if not isinstance(res, dict) or "seq" not in res:
+                    raise ValueError("Could not fetch the sequence of {} (status {})".format(tile[0], res))
+                yield res["seq"]
+
+        if stream:
+            return pieces()
+        seq = "".join(pieces())
+        identifier = "{}:{}..{}:{}".format(name, start, end, strand)
+        if frmt == "text":
+            return seq
+        elif frmt == "fasta":
+            lines = [seq[i : i + 60] for i in range(0, len(seq), 60)]
+            return ">{}\n{}\n".format(identifier, "\n".join(lines))
+        return {"id": identifier, "query": region, "molecule": "dna", "seq": seq}
+
+    def post_sequence_by_region(
+        self,
+        regions,
+        species,
+        frmt="json",
+        coord_system=None,
+        coord_system_version=None,
+        expand_3prime=None,
+        expand_5prime=None,
+        mask=None,
+        mask_feature=False,
+        max_workers=None,
+        progress=False,
+    ):
+        """Returns the genomic sequence of a set of regions of the given species
+
+        :param list regions: Query regions (e.g., X:1000000..1000100:1). They
+            are sent by chunks of 50 (the Ensembl limit), concurrently.
+        :param str species: Species name/alias
+        :param str frmt: json (a list of dictionaries) or dataframe
+
+        Other parameters are described in :meth:`get_sequence_by_region`.
+        """
+        self._check_batch_frmt(frmt)
+        res = self._post_batches(
+            "sequence/region/{0}".format(species),
+            "regions",
+            regions,
+            self._post_limits["sequence"],
+            params={
+                "coord_system": coord_system,
+                "coord_system_version": coord_system_version,
+                "expand_3prime": expand_3prime,
+                "expand_5prime": expand_5prime,
+                "mask": mask,
+                "mask_feature": int(mask_feature),
+            },
+            max_workers=max_workers,
+            progress=progress,
+        )
+        return self._batch_output(res, frmt)
+
     # VARIATION
     # -----------------------------------------------------
     def get_variation_by_id(
@@ -1630,8 +2107,61 @@ class Ensembl:
         )
         return res
 
-    def post_vep_by_id(self, species, identifiers):
-        raise NotImplementedError
+    def post_vep_by_id(
+        self,
+        species,
+        identifiers,
+        frmt="json",
+        canonical=False,
+        ccds=False,
+        domains=False,
+        hgvs=False,
+        numbers=False,
+        protein=False,
+        xref_refseq=False,
+        max_workers=None,
+        progress=False,
+    ):
+        """Fetch variant consequences for a set of variation identifiers
+
+        :param str species: Species name/alias
+        :param list identifiers: variation identifiers (e.g., rs116035550,
+            COSM476). They are sent by chunks of 200 (the Ensembl limit),
+            concurrently.
+        :param str frmt: json (a list of dictionaries, one per variant) or dataframe
+
+        Other parameters are described in :meth:`get_vep_by_id`.
+
+        ::
+
+            >>> res = e.post_vep_by_id("human", ["rs56116432", "COSM476"])
+
+        """
+        self._check_batch_frmt(frmt)
+        res = self._post_batches(
+            "vep/{0}/id".format(species),
+            "ids",
+            identifiers,
+            self._post_limits["vep"],
+            params=self._vep_params(canonical, ccds, domains, hgvs, numbers, protein, xref_refseq),
+            max_workers=max_workers,
+            progress=progress,
+        )
+        return self._batch_output(res, frmt)
+
+    def _vep_params(self, canonical, ccds, domains, hgvs, numbers, protein, xref_refseq):
+        options = {
+            "canonical": canonical,
+            "ccds": ccds,
+            "domains": domains,
+            "hgvs": hgvs,
+            "numbers": numbers,
+            "protein": protein,
+            "xref_refseq": xref_refseq,
+        }
+        params = {key: int(value) for key, value in options.items()}
+        params["callback"] = self.callback
+        return params
 
     def get_vep_by_region(
         self,
@@ -1682,51 +2212,267 @@ class Ensembl:
         )
         return res
 
-    def post_vep_by_region(self, species, region):
-        # POST vep/:species/region/   Fetch variant consequences for multiple regions
-        raise NotImplementedError
+    def post_vep_by_region(
+        self,
+        species,
+        region,
+        frmt="json",
+        canonical=False,
+        ccds=False,
+        domains=False,
+        hgvs=False,
+        numbers=False,
+        protein=False,
+        xref_refseq=False,
+        max_workers=None,
+        progress=False,
+    ):
+        """Fetch variant consequences for multiple regions
+
+        :param str species: Species name/alias
+        :param list region: variants in VCF-like format (e.g., "21 26960070
+            rs116645811 G A . . ."). They are sent by chunks of 200 (the
+            Ensembl limit), concurrently.
+        :param str frmt: json (a list of dictionaries, one per variant) or dataframe
 
+        Other parameters are described in :meth:`get_vep_by_region`.
 
-class EnsemblFTP(object):
-    """Draft to be completed."""
+        ::
+
+            >>> variants = ["21 26960070 rs116645811 G A . . .", "21 26965148 rs1135638 G A . . ."]
+            >>> res = e.post_vep_by_region("human", variants)
+
+        """
+        self._check_batch_frmt(frmt)
+        res = self._post_batches(
+            "vep/{0}/region".format(species),
+            "variants",
+            region,
+            self._post_limits["vep"],
+            params=self._vep_params(canonical, ccds, domains, hgvs, numbers, protein, xref_refseq),
+            max_workers=max_workers,
+            progress=progress,
+        )
+        return self._batch_output(res, frmt)
 
-    def __init__(self):
-        pass
 
-    def download(self, db="fungi", release="current"):
+class EnsemblFTP(object):
+    """Bulk downloads from the Ensembl and Ensembl Genomes FTP sites
+
+    Genomes, transcripts, proteins and annotations of a set of species are
+    downloaded in parallel into *directory/species/*::
+
+        from bioservices import EnsemblFTP
+        ftp = EnsemblFTP(division="fungi", release=57)
+        ftp.get_species()
+        ftp.download(["saccharomyces_cerevisiae", "aspergillus_*"], file_type="dna", directory="genomes")
+
+    Interrupted transfers are resumed (calling :meth:`download` again resumes
+    the partial files) and each file is verified against the CHECKSUMS file
+    published in its directory. Species of collections (e.g. the bacteria
+    collections of Ensembl Genomes) are listed like the others.
+
+    :param str division: one of :attr:`divisions`
+    :param release: a release number or 'current'
+    :param str host: FTP server (default to the server of the division)
+    :param int port: FTP port
+    :param int max_workers: number of files downloaded in parallel
+    :param int max_retries: number of times an interrupted transfer is resumed
+    :param timeout: timeout of the FTP connections (seconds)
+    """
 
+    divisions = ["vertebrates", "bacteria", "fungi", "metazoa", "plants", "protists"]
+
+    #: file types: (directory, sub-directory of the species, regular expression of the file names)
+    file_types = {
+        "dna": ("fasta", "dna", r"\.dna\.toplevel\.fa\.gz$"),
+        "dna_sm": ("fasta", "dna", r"\.dna_sm\.toplevel\.fa\.gz$"),
+        "dna_rm": ("fasta", "dna", r"\.dna_rm\.toplevel\.fa\.gz$"),
+        "cdna": ("fasta", "cdna", r"\.cdna\.all\.fa\.gz$"),
+        "cds": ("fasta", "cds", r"\.cds\.all\.fa\.gz$"),
+        "ncrna": ("fasta", "ncrna", r"\.ncrna\.fa\.gz$"),
+        "pep": ("fasta", "pep", r"\.pep\.all\.fa\.gz$"),
+        "gtf": ("gtf", "", r"\.\d+\.gtf\.gz$"),
+        "gff3": ("gff3", "", r"\.\d+\.gff3\.gz$"),
+    }
+
+    def __init__(
+        self, division="vertebrates", release="current", host=None, port=21, max_workers=4, max_retries=3, timeout=60
+    ):
+        if division not in self.divisions:
+            raise ValueError("division must be one of {}".format(self.divisions))
+        self.division = division
+        self.release = release
+        if host is None:
+            host = "ftp.ensembl.org" if division == "vertebrates" else "ftp.ensemblgenomes.ebi.ac.uk"
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+    def _connect(self):
         import ftplib
 
-        f = ftplib.FTP("ftp.ensemblgenomes.org")
-        f.login("anonymous", "anonymous")
-        f.cwd("pub/%s/%s" % (db, release))
-        f.cwd("fasta")
-        species = f.nlst()
-
-        print(species)
-
-        for this in species:
-            print(this)
-            if this.endswith("collection"):
-                f.cwd(this)
-                subdirs = f.nlst()
-                for thisdir in subdirs:
-                    print(thisdir)
-                    f.cwd(thisdir)
-                    f.cwd("dna")
-                    files = f.nlst()
-                    todownload = [x for x in files if x.endswith("dna.genome.fa.gz")]
-                    for filename in todownload:
-                        f.retrbinary("RETR %s" % filename, open(filename, "wb").write)
-                    f.cwd("../../")
-                f.cwd("..")
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(self.host, self.port)
+        ftp.login("anonymous", "anonymous@")
+        return ftp
+
+    def _root(self, directory):
+        # e.g. /pub/release-110/fasta, /pub/current_fasta or /pub/fungi/current/fasta
+        if self.division == "vertebrates":
+            if self.release == "current":
+                return "/pub/current_{}".format(directory)
+            return "/pub/release-{}/{}".format(self.release, directory)
+        release = "current" if self.release == "current" else "release-{}".format(self.release)
+        return "/pub/{}/{}/{}".format(self.division, release, directory)
+
+    @staticmethod
+    def _nlst(ftp, path):
+        import ftplib
 
+        try:
+            # some servers return the full path of each entry
+            return [x.rsplit("/", 1)[-1] for x in ftp.nlst(path)]
+        except ftplib.error_perm:
+            return []
+
+    def _species_paths(self, ftp, directory):
+        # species name -> directory; species of collections are found in sub-directories
+        root = self._root(directory)
+        paths = {}
+        for name in self._nlst(ftp, root):
+            if name.endswith("_collection"):
+                for species in self._nlst(ftp, "{}/{}".format(root, name)):
+                    paths[species] = "{}/{}/{}".format(root, name, species)
             else:
-                continue
-                f.cwd(this)
-                f.cwd("dna")
-                files = f.nlst()
-                todownload = [x for x in files if x.endswith("dna.genome.fa.gz")]
-                for filename in todownload:
-                    f.retrbinary("RETR %s" % filename, open(filename, "wb").write)
-                f.cwd("../../")
+                paths[name] = "{}/{}".format(root, name)
+        return paths
+
+    def _check_file_type(self, file_type):
+        if file_type not in self.file_types:
+            raise ValueError("file_type must be one of {}".format(sorted(self.file_types)))
+
+    def get_species(self, file_type="dna"):
+        """Returns the sorted list of species available for a file type"""
+        self._check_file_type(file_type)
+        with self._connect() as ftp:
+            return sorted(self._species_paths(ftp, self.file_types[file_type][0]))
+
+    @staticmethod
+    def _parse_checksums(text):
+        # lines of the Unix sum command: checksum, number of blocks and filename
+        checksums = {}
+        for line in text.splitlines():
+            fields = line.split()
+            if len(fields) == 3 and fields[0].isdigit():
+                checksums[fields[2]] = "sum:{:05d}".format(int(fields[0]))
+        return checksums
+
+    def _read_checksums(self, ftp, path):
+        import io
+
+        buffer = io.BytesIO()
+        ftp.retrbinary("RETR {}/CHECKSUMS".format(path), buffer.write)
+        return self._parse_checksums(buffer.getvalue().decode(errors="replace"))
+
+    def get_files(self, species=None, file_type="dna", pattern=None):
+        """Returns the files to download for a set of species
+
+        :param species: a species name (e.g. homo_sapiens), a shell-style
+            pattern (e.g. saccharomyces_*) or a list of them. All species if
+            not provided.
+        :param str file_type: one of :attr:`file_types` (dna, cdna, pep, gtf, ...)
+        :param str pattern: regular expression of the file names (overwrite
+            the default pattern of the file type)
+        :return: list of dictionaries with the species, filename, url and
+            checksum (None if no CHECKSUMS file is available) of each file
+        """
+        import fnmatch
+
+        self._check_file_type(file_type)
+        directory, subdirectory, default = self.file_types[file_type]
+        regex = re.compile(pattern or default)
+        if isinstance(species, str):
+            species = [species]
+
+        files = []
+        with self._connect() as ftp:
+            paths = self._species_paths(ftp, directory)
+            if species is not None:
+                paths = {k: v for k, v in paths.items() if any(fnmatch.fnmatch(k, x) for x in species)}
+                if not paths:
+                    logger.warning("No species matching {} in {}".format(species, self._root(directory)))
+            for name, path in sorted(paths.items()):
+                path = "{}/{}".format(path, subdirectory) if subdirectory else path
+                filenames = self._nlst(ftp, path)
+                checksums = self._read_checksums(ftp, path) if "CHECKSUMS" in filenames else {}
+                for filename in filenames:
+                    if regex.search(filename):
+                        files.append(
+                            {
+                                "species": name,
+                                "filename": filename,
+                                "url": "ftp://{}:{}{}/{}".format(self.host, self.port, path, filename),
+                                "checksum": checksums.get(filename),
+                            }
+                        )
+        return files
+
+    def download(
+        self, species=None, file_type="dna", directory=".", pattern=None, max_workers=None, force=False, progress=True
+    ):
+        """Download the files of a set of species in parallel
+
+        Files are saved in *directory/species/*. Files downloaded already are
+        skipped (unless *force* is True) and partial files left by an
+        interrupted transfer are resumed. Each file is verified against the
+        CHECKSUMS file of its directory.
+
+        :param species: a species name, a shell-style pattern or a list of
+            them (see :meth:`get_files`). All species if not provided.
+        :param str file_type: one of :attr:`file_types`
+        :param str directory: where to save the files
+        :param str pattern: regular expression of the file names
+        :param int max_workers: number of files downloaded in parallel
+            (default to :attr:`max_workers`)
+        :param bool force: download files that exist already
+        :param bool progress: show a progress bar
+        :return: list of the files downloaded (or found)
+        :raises DownloadError: if some files could not be downloaded or
+            verified (the others are kept; call :meth:`download` again to
+            resume).
+        """
+        import os
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        from tqdm import tqdm
+
+        from bioservices.download import DownloadError, DownloadManager
+
+        files = self.get_files(species, file_type=file_type, pattern=pattern)
+        manager = DownloadManager(max_retries=self.max_retries, timeout=self.timeout)
+
+        def fetch(item):
+            target = os.path.join(directory, item["species"], item["filename"])
+            return manager.download(item["url"], target, checksum=item["checksum"], force=force)
+
+        done, failed = [], []
+        max_workers = min(max_workers or self.max_workers, len(files)) or 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, tqdm(
+            total=len(files), unit="file", disable=not progress
+        ) as pbar:
+            futures = {executor.submit(fetch, item): item for item in files}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    done.append(future.result())
+                except DownloadError as err:
+                    logger.error(err)
+                    failed.append(item["filename"])
+                pbar.set_postfix_str(item["filename"])
+                pbar.update()
+        if failed:
+            raise DownloadError("Could not download {} file(s): {}".format(len(failed), ", ".join(sorted(failed))))
+        return sorted(done)
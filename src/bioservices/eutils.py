@@ -29,7 +29,11 @@
        -- from http://www.ncbi.nlm.nih.gov/books/NBK25497/, March 2013
 
 """
-from bioservices import REST, logger, version
+import json
+import re
+import time
+
+from bioservices import REST, BioServicesError, logger, version
 
 logger.name = __name__
 
@@ -74,6 +78,10 @@ class EUtils:
     A few functions takes Identifier(s) as input. It could be a list of
     strings, list of numbers, or a string where identifiers are separated
     either by comma or spaces.
+    :meth:`ESummary`, :meth:`EFetch` and :meth:`ELink` accept any number
+    of identifiers: beyond 200, they are sent by chunks (POST requests)
+    fetched concurrently and the replies are merged (or streamed with
+    stream=True).
 
     A few functions take an argument called **term**. You can use the **AND**
     keyword with spaces or + signs as separators::
@@ -92,10 +100,32 @@ class EUtils:
 
     http://www.ncbi.nlm.nih.gov/books/NBK25499/table/chapter4.T._valid_values_of__retmode_and/?report=objectonly
 
+    Large sets of records (e.g. 100,000 PubMed abstracts) are retrieved with
+    the History server: identifiers (or the result of a search) are stored
+    with :meth:`store_history` and the records are streamed by batches with
+    :meth:`iter_efetch` or :meth:`iter_esummary`::
+
+        history = e.store_history("pubmed", id=pmids)
+        for xml in e.iter_efetch(history, retmode="xml", retmax=500):
+            ...
+
+    Batches are fetched concurrently within the NCBI rate limit (3 requests
+    per second, 10 with an API key). If a batch cannot be fetched, calling
+    :meth:`iter_efetch` again with the same history resumes from the last
+    batch returned.
 
     """
 
-    def __init__(self, verbose=False, email="unknown", cache=False, xmlparser="EUtilsParser"):
+    #: maximum number of records per EFetch/ESummary request using the History server
+    _history_retmax = 10000
+    #: maximum number of identifiers sent in one EPost request
+    _epost_limit = 10000
+    #: maximum number of identifiers sent in the URL of a GET request
+    _get_limit = 200
+    #: number of identifiers per request when a longer list is split (sent with POST)
+    _chunk_size = 500
+
+    def __init__(self, verbose=False, email="unknown", cache=False, xmlparser="EUtilsParser", api_key=None):
 
         self.services = REST(
             name="EUtils",
@@ -150,6 +180,23 @@ class EUtils:
             else:
                 self.services.logging.warning(warning)
 
+        #: NCBI API key (see :attr:`api_key`)
+        self.api_key = api_key or self.services.settings.params["user.ncbi_api_key"][0]
+
+    def _get_api_key(self):
+        return self._api_key
+
+    def _set_api_key(self, api_key):
+        self._api_key = api_key
+        # NCBI accepts 10 requests per second with an API key, 3 otherwise
+        self.services.requests_per_sec = 10 if api_key else 3
+
+    api_key = property(
+        _get_api_key,
+        _set_api_key,
+        doc="NCBI API key sent with each request. Raises the rate limit to 10 requests per second",
+    )
+
     def help(self):
         """Open EUtils help page"""
         self.on_web("http://www.ncbi.nlm.nih.gov/books/NBK25497")
@@ -179,6 +226,8 @@ class EUtils:
     def _get_params(self, keys=[], **kargs):
         # could use a defaultdict from collections.
         params = {"tool": self.tool, "email": self.email}
+        if self.api_key:
+            params["api_key"] = self.api_key
         # fill the structure with None
         for this in keys:
             params[this] = None
@@ -268,7 +317,7 @@ class EUtils:
         params = self._get_params(["WebEnv"], **kargs)
         return params
 
-    def _check_ids(self, sid):
+    def _check_ids(self, sid, limit=200):
         if sid is None:
             return sid
         elif isinstance(sid, int):
@@ -279,10 +328,97 @@ class EUtils:
         # If there are commas, let us split, strip spaces and join back the ids
         sid = ",".join([x.strip() for x in sid.split(",") if x.strip() != ""])
 
-        if len(sid.split(",")) > 200:
-            raise ValueError("Number of comma separated IDs must be less than 200")
+        if limit and len(sid.split(",")) > limit:
+            raise ValueError("Number of comma separated IDs must be less than %s" % limit)
         return sid
 
+    def _with_retries(self, query, send):
+        # calls send() again if NCBI is busy (HTTP 429) or fails temporarily
+        retries = self.services.settings.MAX_RETRIES
+        for attempt in range(retries + 1):
+            res = send()
+            if not isinstance(res, int) or res not in (429, 500, 502, 503, 504) or attempt == retries:
+                return res
+            headers = getattr(self.services.last_response, "headers", {})
+            delay = float(headers.get("Retry-After", 2**attempt))
+            logger.warning("{} failed (status {}). Retrying in {} seconds".format(query, res, delay))
+            time.sleep(delay)
+
+    def _iter_concurrent(self, func, items, max_workers=None):
+        """Yields (item, func(item)) in the order of the items
+
+        Items are processed concurrently (see :meth:`REST.map_concurrent`,
+        within the rate limit of the service) by windows of *max_workers*
+        items so that only a few replies are held in memory at any time.
+        """
+        max_workers = max_workers or self.services.settings.MAX_WORKERS
+        for i in range(0, len(items), max_workers):
+            window = items[i : i + max_workers]
+            yield from zip(window, self.services.map_concurrent(func, window, max_workers=max_workers))
+
+    def _chunked(self, query, db, ids, params, frmt, merge, max_workers=None, stream=False, parse=None):
+        """Sends a list of identifiers by chunks and merges (or streams) the replies
+
+        Each chunk of :attr:`_chunk_size` identifiers is sent in the body
+        of a POST request. Replies are converted by *parse* if provided
+        (None means an invalid reply). If a chunk still fails after the
+        retries, a :class:`BioServicesError` naming its identifiers is
+        raised (a partial merged reply is never returned).
+        """
+        if not ids:
+            raise ValueError("Identifiers must be provided. Use iter_efetch or iter_esummary with a History")
+        chunks = [ids[i : i + self._chunk_size] for i in range(0, len(ids), self._chunk_size)]
+
+        def fetch(chunk):
+            data = dict(params, db=db, id=",".join(chunk))
+            res = self._with_retries(query, lambda: self.services.http_post(query, data=data, frmt=frmt))
+            if parse is not None and res is not None and not isinstance(res, int):
+                res = parse(res)
+            return res
+
+        def replies():
+            for chunk, res in self._iter_concurrent(fetch, chunks, max_workers):
+                if res is None or isinstance(res, int):
+                    shown = ",".join(chunk[:10]) + (",..." if len(chunk) > 10 else "")
+                    raise BioServicesError(
+                        "{} failed for {} identifiers (status {}): {}".format(query, len(chunk), res, shown)
+                    )
+                yield res
+
+        if stream:
+            return replies()
+        return merge(list(replies()))
+
+    @staticmethod
+    def _merge_xml(documents):
+        """Merges XML documents with the same root element (e.g. PubmedArticleSet)
+
+        The children of the root elements are concatenated into the first
+        document. Documents are merged as text (no parsing).
+        """
+        parts = []
+        for doc in documents:
+            match = re.search(r"<([A-Za-z_][\w.:-]*)[^>]*?(/?)>", doc)
+            if match is None:
+                parts.append((doc, "", ""))
+            elif match.group(2):
+                # empty root element e.g. <eSummaryResult/>
+                head = doc[: match.start()] + match.group(0)[:-2].rstrip() + ">"
+                parts.append((head, "", "</{}>".format(match.group(1)) + doc[match.end() :]))
+            else:
+                end = doc.rfind("</" + match.group(1))
+                end = len(doc) if end < match.end() else end
+                parts.append((doc[: match.end()], doc[match.end() : end], doc[end:]))
+        return parts[0][0] + "".join(x[1] for x in parts) + parts[0][2]
+
+    @staticmethod
+    def _merge_esummary(results):
+        merged = {"uids": []}
+        for res in results:
+            merged["uids"] += res.get("uids", [])
+            merged.update((k, v) for k, v in res.items() if k != "uids")
+        return merged
+
     def taxonomy_summary(self, id):
         """Alias to EFetch for the taxonomy database
 
@@ -297,7 +433,7 @@ class EUtils:
             9604
 
         """
-        sid = self._check_ids(id)
+        sid = self._check_ids(id, limit=None)
         ret = self.ESummary("taxonomy", sid)
         return ret
 
@@ -316,13 +452,17 @@ class EUtils:
         ret = self.ESummary("snp", id)
         return ret
 
-    def EFetch(self, db, id, retmode="text", **kargs):
+    def EFetch(self, db, id, retmode="text", max_workers=None, stream=False, **kargs):
         """Access to the EFetch E-Utilities
 
         :param str db: database from which to retrieve UIDs.
-        :param str id: list of identifiers.
+        :param str id: list of identifiers (any number, see below).
         :param retmode: default to text (could be xml but not recommended).
         :param rettype: could be fasta, summary, docsum
+        :param int max_workers: number of requests sent concurrently when the
+            identifiers are sent by chunks.
+        :param bool stream: returns a generator of the replies (one per
+            chunk of identifiers) instead of the merged reply.
         :return: depends on retmode parameter.
 
         .. note:: addition to NCBI: settings rettype to "dict" returns a dictionary
@@ -374,10 +514,20 @@ class EUtils:
 
             e.EFetch(db="nuccore",id="AP013055", rettype="seqid", retmode="text")
 
+        More than 200 identifiers are sent by chunks of 500 identifiers
+        (with POST requests) fetched concurrently; the replies are merged
+        (text is concatenated, XML documents are merged into one)::
+
+            >>> e.EFetch("pubmed", pmids, retmode="xml")  # e.g. 5000 PMIDs
+            >>> for fasta in e.EFetch("protein", gis, rettype="fasta", stream=True):
+            ...     fout.write(fasta.decode())
+
         .. versionchanged:: 1.5.0
             instead of "xml", retmode can now be set to dict, in which case an
             XML is retrieved and converted to a dictionary if possible.
 
+        .. versionchanged:: 1.16.0
+            any number of identifiers is accepted.
         """
         _retmode = retmode[:]
 
@@ -386,7 +536,7 @@ class EUtils:
 
         self._check_db(db)
         # self._check_retmode(retmode, valids=['text', 'xml'])
-        sid = self._check_ids(id)
+        sid = self._check_ids(id, limit=None)
 
         params = self._get_efetch_params(**kargs)
 
@@ -395,6 +545,21 @@ class EUtils:
         if "complexity" in params.keys() and params["complexity"] is not None:
             self.devtools.check_param_in_list(params["complexity"], [0, 1, 2, 3, 4])
 
+        ids = sid.split(",") if sid else []
+        if stream or len(ids) > self._get_limit:
+            params["retmode"] = retmode
+            merge_text = self._merge_xml if retmode == "xml" else "".join
+
+            def convert(text):
+                # same type as the reply to a single request (bytes or dictionary)
+                return self.parse_xml(text, "dict") if _retmode == "dict" else text.encode()
+
+            def merge(docs):
+                return convert(merge_text(docs))
+
+            parse = convert if stream else None
+            return self._chunked("efetch.fcgi", db, ids, params, "txt", merge, max_workers, stream, parse)
+
         query = "efetch.fcgi?db=%s&id=%s&retmode=%s" % (db, sid, retmode)
 
         ret = self.services.http_get(query, params=params)
@@ -472,9 +637,7 @@ class EUtils:
             method = self._xmlparser
 
         if method == "EUtilsParser":
-            import xml.etree.ElementTree as ET
-
-            root = ET.fromstring(ret)
+            root = self.services.xml_fromstring(ret)
             res = AttrDict()
             res[root.tag] = EUtilsParser(root)
             return res
@@ -485,14 +648,18 @@ class EUtils:
 
             return xmltodict.parse(ret)
 
-    def ESummary(self, db, id=None, **kargs):
+    def ESummary(self, db, id=None, max_workers=None, stream=False, **kargs):
         """Returns document summaries for a list of input UIDs
 
 
         :param db: a valid database
         :param str id: list of identifiers (or string comma separated).
-            all of the UIDs must be from the database specified by db. Limited
-            to 200 identifiers
+            all of the UIDs must be from the database specified by db. More
+            than 200 identifiers are sent by chunks (POST requests) fetched
+            concurrently and the results are merged.
+        :param int max_workers: number of requests sent concurrently
+        :param bool stream: returns a generator of results (one per chunk
+            of identifiers) instead of the merged result.
 
         ::
 
@@ -510,13 +677,23 @@ class EUtils:
             >>> ret['result']['449301857']['extra']
             'gi|449301857|gb|EMC97866.1||gnl|WGS:AEIF|BAUCODRAFT_31870'
 
-
+        .. versionchanged:: 1.16.0
+            any number of identifiers is accepted.
         """
-        sid = self._check_ids(id)
+        sid = self._check_ids(id, limit=None)
         self._check_db(db)
         kargs["retmode"] = "json"
 
         params = self._get_esummary_params(**kargs)
+        ids = sid.split(",") if sid else []
+        if stream or len(ids) > self._get_limit:
+
+            def parse(res):
+                return res.get("result") if isinstance(res, dict) else None
+
+            return self._chunked(
+                "esummary.fcgi", db, ids, params, "json", self._merge_esummary, max_workers, stream, parse
+            )
         # the real call using GET method
         query = "esummary.fcgi?db=%s&id=%s" % (db, sid)
         ret = self.services.http_get(query, frmt="json", params=params)
@@ -687,7 +864,7 @@ class EUtils:
 
         return ret
 
-    def ELink(self, db=None, dbfrom=None, id=None, **kargs):
+    def ELink(self, db=None, dbfrom=None, id=None, max_workers=None, stream=False, **kargs):
         """The Entrez links utility
 
         Responds to a list of UIDs in a given database with either a list of
@@ -703,8 +880,10 @@ class EUtils:
             that database. Computational neighbors have linknames that begin
             with dbname_dbname (examples: protein_protein,
             pcassay_pcassay_activityneighbor).
-        :param str id: UID list. Either a single UID or a comma-delimited list
-            Limited  to 200 Ids
+        :param str id: UID list. Either a single UID or a comma-delimited list.
+            More than 200 identifiers are sent by chunks (POST requests)
+            fetched concurrently; the LinkSet elements of the replies are
+            merged into one eLinkResult document.
         :param str cmd: ELink command mode. The command mode specified which
             function ELink will perform. Some optional parameters only
             function for certain values of cmd (see
@@ -732,11 +911,15 @@ class EUtils:
 
             >>> s.ELink(dbfrom='nuccore', db="taxonomy", id='21614549,219152114')
 
+        :param int max_workers: number of requests sent concurrently
+        :param bool stream: returns a generator of replies (one per chunk of
+            identifiers) instead of the merged reply.
 
-
+        .. versionchanged:: 1.16.0
+            any number of identifiers is accepted.
         """
         # unlike other EUtils, db and dbfrom are here optional
-        sid = self._check_ids(id)
+        sid = self._check_ids(id, limit=None)
         if db is not None:
             self._check_db(db)
         if dbfrom is not None:
@@ -777,6 +960,21 @@ class EUtils:
 
         params = self._get_elink_params(**kargs)
 
+        ids = sid.split(",") if sid else []
+        if stream or len(ids) > self._get_limit:
+            params["dbfrom"] = dbfrom
+            if kargs.get("retmode") == "json":
+
+                def merge(docs):
+                    merged = self.services.json_loads(docs[0])
+                    for doc in docs[1:]:
+                        merged.setdefault("linksets", []).extend(self.services.json_loads(doc).get("linksets", []))
+                    return json.dumps(merged)
+
+            else:
+                merge = self._merge_xml
+            return self._chunked("elink.fcgi", db, ids, params, "txt", merge, max_workers, stream)
+
         ret = self.services.http_get(query, frmt="txt", params=params)
         # try: ret = ret.content
         # except: pass
@@ -791,25 +989,26 @@ class EUtils:
 
         :param str db: a valid database
         :param id: list of strings of strings
+        :param WebEnv: add the identifiers to an existing Web Environment
 
         :return: a dictionary with a Web Environment string
             and a QueryKey to be re-used in another EUtils.
+
+        .. versionchanged:: 1.16.0
+            identifiers are sent in the body of a POST request so that
+            thousands of identifiers can be posted at once.
         """
         self._check_db(db)
-        sid = self._check_ids(id)
+        sid = self._check_ids(id, limit=None)
 
         params = self._get_epost_params(**kargs)
+        params.update({"db": db, "id": sid})
 
-        query = "epost.fcgi/?db=%s&id=%s" % (db, sid)
-
-        ret = self.services.http_get(query, "xml", params=params)
-        try:
-            ret = ret.content
-        except Exception:
-            pass
-        import xml.etree.ElementTree as ET
-
-        root = ET.fromstring(ret)
+        ret = self.services.http_post("epost.fcgi", data=params, frmt="xml")
+        if not isinstance(ret, (str, bytes)):
+            return ret
+        root = self.services.xml_fromstring(ret)
+        webenv, query_key = None, None
         for item in root:
             if item.tag == "QueryKey":
                 query_key = item.text
@@ -817,6 +1016,136 @@ class EUtils:
                 webenv = item.text
         return {"WebEnv": webenv, "QueryKey": query_key}
 
+    def store_history(self, db, term=None, id=None, **kargs):
+        """Stores a search or a list of identifiers on the History server
+
+        :param str db: a valid database
+        :param str term: an Entrez text query (see :meth:`ESearch`)
+        :param id: identifiers (any number). They are posted with
+            :meth:`EPost` by chunks of 10,000 identifiers.
+        :return: a dictionary with the database, the WebEnv, the query keys
+            with their number of records, the total number of records (count)
+            and the position of the next record to fetch (retstart). To be
+            used with :meth:`iter_efetch` and :meth:`iter_esummary`.
+
+        ::
+
+            >>> history = e.store_history("pubmed", term="asthma[mh] AND 2020[dp]")
+            >>> history["count"]
+            6213
+        """
+        if (term is None) == (id is None):
+            raise ValueError("Provide one of term or id")
+        if term is not None:
+            ret = self.ESearch(db, term, usehistory="y", retmax=0, **kargs)
+            if not isinstance(ret, dict) or "webenv" not in ret:
+                raise BioServicesError("Could not store the search {} on the History server ({})".format(term, ret))
+            keys = [(ret["querykey"], int(ret["count"]))]
+            webenv = ret["webenv"]
+        else:
+            ids = list(dict.fromkeys(self._check_ids(id, limit=None).split(",")))
+            keys, webenv = [], None
+            for i in range(0, len(ids), self._epost_limit):
+                chunk = ids[i : i + self._epost_limit]
+                ret = self.EPost(db, chunk, WebEnv=webenv)
+                if not isinstance(ret, dict) or not ret["WebEnv"]:
+                    raise BioServicesError("Could not post identifiers on the History server ({})".format(ret))
+                webenv = ret["WebEnv"]
+                keys.append((ret["QueryKey"], len(chunk)))
+        return {"db": db, "WebEnv": webenv, "keys": keys, "count": sum(x[1] for x in keys), "retstart": 0}
+
+    def _iter_history(self, query, history, params, frmt, retmax, retstart, max_workers, progress, parse=None):
+        """Yields the replies to *query* for each batch of records of a history
+
+        Batches are fetched concurrently (see :meth:`_iter_concurrent`) and
+        converted by *parse* if provided (None means an invalid reply).
+        history["retstart"] is updated as batches are returned so that the
+        iteration can be resumed.
+        """
+        from tqdm import tqdm
+
+        retmax = min(retmax, self._history_retmax)
+        retstart = history.get("retstart", 0) if retstart is None else retstart
+        # (query_key, retstart within the key, position in the history, number of records)
+        batches, offset = [], 0
+        for query_key, count in history["keys"]:
+            for start in range(max(0, retstart - offset), count, retmax):
+                batches.append((query_key, start, offset + start, min(retmax, count - start)))
+            offset += count
+
+        params = dict(params, db=history["db"], WebEnv=history["WebEnv"], retmax=retmax)
+
+        def fetch(batch):
+            batch_params = dict(params, query_key=batch[0], retstart=batch[1])
+            return self._with_retries(query, lambda: self.services.http_get(query, frmt=frmt, params=batch_params))
+
+        with tqdm(total=history["count"], initial=retstart, unit="record", disable=not progress) as pbar:
+            for batch, res in self._iter_concurrent(fetch, batches, max_workers):
+                if parse is not None and res is not None and not isinstance(res, int):
+                    res = parse(res)
+                if res is None or isinstance(res, int):
+                    raise BioServicesError(
+                        "{} failed at retstart={} (status {}). Iterate again over the same history "
+                        "to resume".format(query, batch[2], res)
+                    )
+                history["retstart"] = batch[2] + batch[3]
+                pbar.update(batch[3])
+                yield res
+
+    def iter_efetch(
+        self, history, retmode="xml", rettype=None, retmax=500, retstart=None, max_workers=None, progress=False, **kargs
+    ):
+        """Yields the records of a history by batches (EFetch)
+
+        :param dict history: returned by :meth:`store_history`
+        :param str retmode: xml or text
+        :param str rettype: e.g. abstract, medline, fasta, gb
+        :param int retmax: number of records per batch (at most 10,000)
+        :param int retstart: position of the first record. Defaults to the
+            position reached by the last iteration over this history (0 for
+            a new history).
+        :param int max_workers: number of batches fetched concurrently
+        :param bool progress: show a progress bar
+        :param kargs: other EFetch parameters (e.g. strand, complexity)
+        :return: a generator of the EFetch replies (str), one per batch
+        :raises BioServicesError: if a batch cannot be fetched after all
+            retries. history["retstart"] points to the first record not
+            fetched yet so that the iteration can be resumed.
+
+        ::
+
+            history = e.store_history("protein", id=identifiers)
+            with open("proteins.fasta", "w") as fout:
+                for fasta in e.iter_efetch(history, retmode="text", rettype="fasta"):
+                    fout.write(fasta)
+        """
+        self._check_db(history["db"])
+        params = self._get_efetch_params(retmode=retmode, rettype=rettype, **kargs)
+        return self._iter_history("efetch.fcgi", history, params, "txt", retmax, retstart, max_workers, progress)
+
+    def iter_esummary(self, history, retmax=500, retstart=None, max_workers=None, progress=False, **kargs):
+        """Yields the document summaries of a history by batches (ESummary)
+
+        Same as :meth:`iter_efetch`. Each batch is the *result* dictionary
+        returned by :meth:`ESummary` (with the list of *uids*).
+
+        ::
+
+            history = e.store_history("pubmed", term="bioservices")
+            titles = {}
+            for result in e.iter_esummary(history):
+                titles.update({uid: result[uid]["title"] for uid in result["uids"]})
+        """
+        self._check_db(history["db"])
+        params = self._get_esummary_params(retmode="json", **kargs)
+
+        def parse(res):
+            return res.get("result") if isinstance(res, dict) else None
+
+        return self._iter_history(
+            "esummary.fcgi", history, params, "json", retmax, retstart, max_workers, progress, parse=parse
+        )
+
 
 class XMLObjectify(object):
     def __init__(self, obj):
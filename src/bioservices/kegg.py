@@ -149,7 +149,13 @@ usually locus_tag or ncbi GeneID, or the primary gene name.
 
 """
 import copy
+import io
+import json
+import os
+import re
+import threading
 import webbrowser
+from urllib.parse import urlparse
 
 from bioservices import logger
 from bioservices.services import REST, BioServicesError
@@ -243,19 +249,34 @@ class KEGG:
 
     _docIds = "\n\n.. seealso:: :meth:`list`\n"
 
-    def __init__(self, verbose=False, cache=False):
+    #: KEGG web site used to render pathway maps
+    www = "https://www.kegg.jp"
+
+    # listings (e.g. list("organism")) and releases shared by all instances,
+    # keyed by (url, database) and url
+    _listings = {}
+    _releases = {}
+    _listings_lock = threading.Lock()
+
+    def __init__(self, verbose=False, cache=False, mirror=None):
         """.. rubric:: Constructor
 
         :param bool verbose: prints informative messages
         :param bool cache: set to True to enable HTTP caching
+        :param mirror: a :class:`~bioservices.keggmirror.KEGGMirror` or the
+            filename of its SQLite database. If set, :meth:`list`,
+            :meth:`conv`, :meth:`link` and :meth:`find` (by identifier) are
+            answered from the local mirror whenever possible.
 
         """
         self.services = REST(name="KEGG", url="http://rest.kegg.jp", verbose=verbose, cache=cache)
         pass
         self._organism = None
+        self.mirror = None
+        if mirror is not None:
+            self.use_mirror(mirror)
 
-        self._organisms = None
-        self._organisms_tnumbers = None
+        self._organism_index = None
         self._pathway = None
         self._glycan = None
         self._compound = None
@@ -272,16 +293,36 @@ class KEGG:
         """for x in s._valid_databases_list: print len(getattr(s, x))"""
         if req.endswith("Ids"):
             db = req[0:-3]
-            res = self.list(db)
+            res = self._listing(db)
             if db in ["", ""]:
                 Ids = [x.split()[1] for x in res.split("\n") if len(x)]
             else:
                 Ids = [x.split()[0] for x in res.split("\n") if len(x)]
             return Ids
         elif req in self.databases:
-            res = self.list(req)
+            res = self._listing(req)
             return res
 
+    def use_mirror(self, mirror):
+        """Answer list/conv/link/find queries from a local mirror
+
+        :param mirror: a :class:`~bioservices.keggmirror.KEGGMirror` or the
+            filename of its SQLite database (created if needed). Use None to
+            stop using the mirror.
+
+        ::
+
+            k = KEGG()
+            k.use_mirror("kegg.sqlite")
+            k.mirror.snapshot(organisms=["hsa"])
+        """
+        from bioservices.keggmirror import KEGGMirror
+
+        if mirror is not None and not isinstance(mirror, KEGGMirror):
+            mirror = KEGGMirror(mirror, kegg=self)
+        self.mirror = mirror
+        return mirror
+
     def code2Tnumber(self, code):
         """Converts organism code to its T number
 
@@ -292,8 +333,7 @@ class KEGG:
             >>> s.code2Tnumber("hsa")
             'T01001'
         """
-        index = self.organismIds.index(code)
-        return self.organismTnumbers[index]
+        return self._get_organism_index()["code2T"][code]
 
     def Tnumber2code(self, Tnumber):
         """Converts organism T number to its code
@@ -305,8 +345,7 @@ class KEGG:
             >>> s.Tnumber2code("T01001")
             'hsa'
         """
-        index = self.organismTnumbers.index(Tnumber)
-        return self.organismIds[index]
+        return self._get_organism_index()["T2code"][Tnumber]
 
     def isOrganism(self, org):
         """Checks if org is a KEGG organism
@@ -322,12 +361,8 @@ class KEGG:
             True
 
         """
-        if org in self.organismIds:
-            return True
-        if org in self.organismTnumbers:
-            return True
-        else:
-            return False
+        index = self._get_organism_index()
+        return org in index["code2T"] or org in index["T2code"]
 
     def _checkDB(self, database=None, mode=None):
         self.services.logging.info("checking database %s (mode=%s)" % (database, mode))
@@ -376,7 +411,7 @@ class KEGG:
         res = self.services.http_get("info/" + database, frmt="txt")
         return res
 
-    def list(self, query, organism=None):
+    def list(self, query, organism=None, frmt=None):
         """Returns a list of entry identifiers and associated definition for a given database or a given set of database entries
 
         :param str query: can be one of pathway, brite, module,
@@ -388,6 +423,7 @@ class KEGG:
         :param str organism: a valid organism identifier that can be
             provided. If so, database can be only "pathway" or "module". If
             not provided, the default value is chosen (:attr:`organism`)
+        :param str frmt: set to "dataframe" to get a dataframe (see below)
         :return: A string with a structure that depends on the query
 
 
@@ -421,6 +457,13 @@ class KEGG:
             s.list("hsa:10458+ece:Z5100") # returns the list of a human gene and an E.coli O157 gene
             s.list("cpd:C01290+gl:G00092")# returns the list of a compound entry and a glycan entry
             s.list("C01290+G00092")       # same as above
+
+        With frmt="dataframe", the output is parsed into a dataframe whose
+        columns are id and definition (id, type, position and definition for
+        the genes of an organism; tnumber, code, name and lineage for the
+        organisms)::
+
+            df = s.list("hsa", frmt="dataframe")
         """
         url = "list"
         if query:
@@ -429,7 +472,7 @@ class KEGG:
             url += "/" + query
 
         if organism:
-            if organism not in self.organismIds:
+            if organism not in self._get_organism_index()["code2T"]:
                 self.services.logging.error(
                     """Invalid organism provided (%s). See the organismIds attribute""" % organism
                 )
@@ -444,10 +487,15 @@ class KEGG:
                 raise
             url += "/" + organism
 
+        if self.mirror is not None:
+            res = self.mirror.list(query, organism)
+            if res is not None:
+                return self._format_table(res, frmt, frmt and self._list_columns(query))
+
         res = self.services.http_get(url, "txt")
-        return res
+        return self._format_table(res, frmt, frmt and self._list_columns(query))
 
-    def find(self, database, query, option=None):
+    def find(self, database, query, option=None, frmt=None):
         """finds entries with matching query keywords or other query data in a given database
 
         :param str database: can be one of pathway, module, disease, drug,
@@ -457,6 +505,8 @@ class KEGG:
         :param str query: See examples
         :param str option: If option provided, database can be only 'compound'
             or 'drug'. Option can be 'formula', 'exact_mass' or 'mol_weight'
+        :param str frmt: set to "dataframe" to get a dataframe with the columns
+            id and definition (or the option)
 
 
         .. note:: Keyword search against brite is not supported. Use /list/brite to
@@ -494,9 +544,13 @@ class KEGG:
             if option not in _valid_options:
                 raise ValueError("invalid option. Must be in %s " % _valid_options)
             url += "/" + option
+        elif self.mirror is not None:
+            res = self.mirror.find(database, query)
+            if res is not None:
+                return self._format_table(res, frmt, ["id", "definition"])
 
         res = self.services.http_get(url, frmt="txt")
-        return res
+        return self._format_table(res, frmt, ["id", option or "definition"])
 
     def show_entry(self, entry):
         """Opens URL corresponding to a valid entry
@@ -506,11 +560,11 @@ class KEGG:
             s.www_bget("path:hsa05416")
 
         """
-        url = "http://www.kegg.jp/dbget-bin/www_bget?" + entry
+        url = self.www + "/dbget-bin/www_bget?" + entry
         self.services.logging.info(url)
         webbrowser.open(url)
 
-    def get(self, dbentries, option=None, parse=False):
+    def get(self, dbentries, option=None, parse=False, progress=False):
         """Retrieves given database entries
 
           :param str dbentries: KEGG database entries involving the following
@@ -518,7 +572,10 @@ class KEGG:
               compound, glycan,  reaction, rpair, rclass, enzyme **or** any organism
               using the KEGG organism code (see :attr:`organismIds`
               attributes) or T number (see :attr:`organismTnumbers` attribute).
+              May also be a list of entries of any length (see below).
           :param str option: one of: aaseq, ntseq, mol, kcf, image, kgml
+          :param bool parse: parse the entries (see :meth:`parse`)
+          :param bool progress: show a progress bar (list of entries only)
 
         .. note:: you can add the option at the end of dbentries in which case
               the parameter option must not be used (see example)
@@ -554,15 +611,29 @@ class KEGG:
               f.close()
 
           .. note::  The input is limited up to 10 entries (KEGG restriction).
+
+          If **dbentries** is a list, it can be of any length. The entries are
+          fetched by groups of 10 (joined with +); the requests are sent
+          concurrently within the rate limit of the service. The returned
+          value is then a dictionary keyed by the requested entries. Entries
+          not found in KEGG are not included::
+
+              res = s.get(["hsa:10458", "hsa:1525", "cpd:C00001"], parse=True)
+              res["hsa:1525"]["NAME"]
         """
         _valid_options = ["aaseq", "ntseq", "mol", "kcf", "image", "kgml"]
 
+        if option:
+            if option not in _valid_options:
+                raise ValueError("invalid option. Must be in %s " % _valid_options)
+
+        if isinstance(dbentries, (list, tuple, set)):
+            return self._get_many(list(dbentries), option=option, parse=parse, progress=progress)
+
         # self._checkDB(database, mode="find")
         url = "get/" + dbentries
 
         if option:
-            if option not in _valid_options:
-                raise ValueError("invalid option. Must be in %s " % _valid_options)
             url += "/" + option
 
         res = self.services.http_get(url, frmt="txt")
@@ -572,7 +643,87 @@ class KEGG:
 
         return res
 
-    def conv(self, target, source):
+    def _get_many(self, dbentries, option=None, parse=False, progress=False, failed=None):
+        # images, KGML and MOL files cannot be split back into entries.
+        # Entries of requests that failed (e.g. 5xx, timeout) are appended to
+        # *failed* (if a list is provided) to tell them from entries not found.
+        size = 1 if option in ("image", "kgml", "mol") else 10
+        dbentries = list(dict.fromkeys(dbentries))
+        chunks = [dbentries[i : i + size] for i in range(0, len(dbentries), size)]
+
+        def fetch(chunk):
+            url = "get/" + "+".join(chunk)
+            if option:
+                url += "/" + option
+            return self.services.http_get(url, frmt="txt")
+
+        results = {}
+        skipped = set()
+        for chunk, res in zip(chunks, self.services.map_concurrent(fetch, chunks, progress=progress)):
+            if not isinstance(res, (str, bytes)):
+                # KEGG replies 404 when none of the entries exist; other
+                # errors (None on timeout, 429, 5xx or open circuit) are transient
+                if res is None or res == 429 or res >= 500:
+                    self.services.logging.warning("Could not retrieve entries {}".format("+".join(chunk)))
+                    skipped.update(chunk)
+                    if failed is not None:
+                        failed.extend(chunk)
+                continue
+            if size == 1:
+                results[chunk[0]] = res
+            elif option in ("aaseq", "ntseq"):
+                records = [">" + x.strip("\n") + "\n" for x in ("\n" + res).split("\n>") if x.strip()]
+                results.update(self._match_entries(chunk, records, self._fasta_entry_ids))
+            else:
+                records = [x.strip("\n") + "\n///\n" for x in res.split("///") if x.strip()]
+                results.update(self._match_entries(chunk, records, self._flat_entry_ids))
+
+        missing = [x for x in dbentries if x not in results and x not in skipped]
+        if missing:
+            self.services.logging.warning("{} entries not found: {}".format(len(missing), ", ".join(missing[:10])))
+
+        if parse is True and option in (None, "kcf"):
+            results = {key: self.parse(value) for key, value in results.items()}
+        return results
+
+    @staticmethod
+    def _flat_entry_ids(record):
+        # ENTRY       10458             CDS       T01001
+        # ENTRY       EC 1.1.1.1                  Enzyme
+        fields = record.split("\n", 1)[0].split()[1:3]
+        return [x.lower() for x in fields]
+
+    @staticmethod
+    def _fasta_entry_ids(record):
+        # >hsa:10458 K05627 BAI1-associated protein 2
+        name = record[1:].split(None, 1)[0].lower()
+        return [name, name.split(":")[-1]]
+
+    def _match_entries(self, chunk, records, get_ids):
+        """Key the records returned by KEGG by the requested entries
+
+        KEGG returns entries in the requested order but skips those not found.
+        """
+        results = {}
+        position = 0
+        for record in records:
+            ids = get_ids(record)
+            found = None
+            for i in range(position, len(chunk)):
+                requested = chunk[i].lower()
+                if requested in ids or requested.split(":")[-1] in ids:
+                    found = i
+                    break
+            if found is None:
+                # unexpected identifier (e.g. alias); assume the requested order
+                found = position
+            if found >= len(chunk):
+                break
+            results[chunk[found]] = record
+            position = found + 1
+        return results
+
+    def conv(self, target, source, frmt=None):
         """convert KEGG identifiers to/from outside identifiers
 
         :param str target: the target database (e.g., a KEGG organism).
@@ -675,8 +826,21 @@ class KEGG:
         else:
             self.logging.info("arguments not checked")
         """
+        if self.mirror is not None:
+            if frmt is not None:
+                # all rows, including one-to-many conversions
+                res = self.mirror.conv_text(target, source)
+                if res is not None:
+                    return self._format_table(res, frmt, ["source", "target"], prefixes=True)
+            else:
+                res = self.mirror.conv(target, source)
+                if res is not None:
+                    return res
+
         url = "conv/" + target + "/" + source
         res = self.services.http_get(url, frmt="txt")
+        if frmt is not None:
+            return self._format_table(res, frmt, ["source", "target"], prefixes=True)
 
         try:
             t = [x.split("\t")[0] for x in res.strip().split("\n")]
@@ -685,7 +849,7 @@ class KEGG:
         except Exception:
             return res
 
-    def link(self, target, source):
+    def link(self, target, source, frmt=None):
         """Find related entries by using database cross-references
 
         :param str target: the target KEGG database or organism (see below for the list).
@@ -704,12 +868,63 @@ class KEGG:
             s.link("hsa", "pathway")
             # KEGG pathways linked from a human gene and an E. coli O157 gene.
             s.link("pathway", "hsa:10458+ece:Z5100")
+
+        With frmt="dataframe", the output is a dataframe with source and
+        target columns (the identifiers as returned by KEGG, source side
+        first) and their database prefixes as categorical columns
+        (source_db and target_db)::
+
+            df = s.link("pathway", "hsa", frmt="dataframe")
+            df.groupby("target").size()
         """
         self._checkDB(target, mode="link")
 
+        if self.mirror is not None:
+            res = self.mirror.link(target, source)
+            if res is not None:
+                return self._format_table(res, frmt, ["source", "target"], prefixes=True)
+
         url = "link/" + target + "/" + source
         res = self.services.http_get(url, frmt="txt")
-        return res
+        return self._format_table(res, frmt, ["source", "target"], prefixes=True)
+
+    def _list_columns(self, query):
+        if query == "organism":
+            return ["tnumber", "code", "name", "lineage"]
+        elif self.isOrganism(query):
+            return ["id", "type", "position", "definition"]
+        return ["id", "definition"]
+
+    def _format_table(self, res, frmt, columns, prefixes=False):
+        """Returns the TSV output of list/conv/link/find in the requested format
+
+        With frmt="dataframe", the output is parsed with a single call to
+        read_csv. Columns with repeated values (e.g. pathways in a link
+        table) are categorical. If *prefixes* is True, the database
+        prefixes of the first two columns (e.g. hsa, path) are added as
+        categorical columns (e.g. source_db and target_db).
+        """
+        if frmt is None or not isinstance(res, str):
+            return res
+        if frmt != "dataframe":
+            raise ValueError("frmt must be None or 'dataframe'")
+        import csv
+
+        import pandas as pd
+
+        if res.strip():
+            df = pd.read_csv(
+                io.StringIO(res), sep="\t", header=None, dtype=str, quoting=csv.QUOTE_NONE, na_filter=False
+            )
+        else:
+            df = pd.DataFrame(columns=range(len(columns)), dtype=str)
+        df.columns = columns[: df.shape[1]] + ["col%s" % i for i in range(len(columns), df.shape[1])]
+
+        if prefixes:
+            for column in columns[:2]:
+                df[column + "_db"] = df[column].str.split(":", n=1).str[0].astype("category")
+            return self._categorise(df, columns=columns)
+        return self._categorise(df, columns=columns[1:])
 
     def entry(self, dbentries):
         """Retrieve entry
@@ -753,10 +968,10 @@ class KEGG:
 
         if scale:
             scale = int(scale / 100.0 * 100) / 100.0  # just need 2 digits and a value in [0,1]
-            url = "http://www.kegg.jp/kegg-bin/show_pathway?scale=" + str(scale)
+            url = self.www + "/kegg-bin/show_pathway?scale=" + str(scale)
             url += "&query=&map=" + pathId
         else:
-            url = "http://www.kegg.jp/kegg-bin/show_pathway?" + pathId
+            url = self.www + "/kegg-bin/show_pathway?" + pathId
             if dcolor:
                 url += "/default%%3d%s/" % dcolor
             if isinstance(keggid, dict):
@@ -783,24 +998,96 @@ class KEGG:
         :param float scale: optional scale factor for the pathway image
         :param dict keggid: mapping of KEGG IDs to highlight on the pathway
         :param dict params: additional POST parameters passed to the KEGG pathway viewer
-        """
-
-        import requests
 
+        .. seealso:: :meth:`save_pathways` to save many pathways concurrently
+        """
+        if filename is None:
+            filename = f"{pathId}.png"
         url = self.show_pathway(pathId, scale, keggid=keggid, show=False)
-        html_page = requests.post(url, data=params)
-
+        self._render_pathway(url, filename, params)
+
+    def _render_pathway(self, url, filename, params):
+        # the viewer returns an HTML page with a link to the coloured image,
+        # which is streamed to disk
+        self.services._calls()
+        html_page = self.services._send("post", url, data=params, timeout=self.services.TIMEOUT)
+        html_page.raise_for_status()
         html_page = html_page.content.decode()
 
         links_to_png = [x for x in html_page.split() if "png" in x and x.startswith("src")]
+        if not links_to_png:
+            raise BioServicesError("No image found in the KEGG pathway viewer page {}".format(url))
         link_to_png = links_to_png[0].replace("src=", "").replace('"', "")
-        r = requests.get("https://www.kegg.jp/{}".format(link_to_png))
 
-        if filename is None:
-            filename = f"{pathId}.png"
+        self.services._calls()
+        return self.services.download("{}/{}".format(self.www, link_to_png.lstrip("/")), filename, force=True)
+
+    def save_pathways(self, pathways, outdir, scale=None, params={}, force=False, progress=False):
+        """Save many coloured KEGG pathways in PNG format, concurrently
+
+        :param pathways: dictionary with pathway identifiers (e.g.
+            ``"hsa00010"``) as keys and the KEGG Ids to highlight as values
+            (see *keggid* in :meth:`show_pathway`), or a list of pathways.
+        :param str outdir: output directory; images are saved as
+            ``"{pathId}.png"``
+        :param float scale: optional scale factor for the pathway images
+        :param dict params: additional POST parameters passed to the KEGG pathway viewer
+        :param bool force: save all images even if they did not change
+        :param bool progress: show a progress bar
+        :return: dictionary with pathway identifiers as keys and filenames as
+            values. Pathways that could not be saved are not included.
+
+        Images are fetched concurrently (see the MAX_WORKERS option) within the
+        rate limit of the service and streamed to disk. The colours and KEGG
+        release of each image are recorded in *outdir*; an image is not
+        requested again if neither changed::
 
-        with open(filename, "wb") as fout:
-            fout.write(r.content)
+            k = KEGG()
+            colors = {"hsa04010": {"1432": "red", "5594": "blue"},
+                      "hsa04150": {"2475": "yellow,red"}}
+            k.save_pathways(colors, "maps")
+
+        """
+        import hashlib
+
+        if not isinstance(pathways, dict):
+            pathways = {x: {} for x in pathways}
+        os.makedirs(outdir, exist_ok=True)
+        manifest_file = os.path.join(outdir, ".kegg_pathways.json")
+        manifest = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as fin:
+                manifest = json.load(fin)
+
+        jobs = {}
+        for pathId, keggid in pathways.items():
+            name = pathId.split(":")[-1]
+            url = self.show_pathway(pathId, scale, keggid=keggid or {}, show=False)
+            key = json.dumps([url, params, self.release], sort_keys=True)
+            key = hashlib.sha1(key.encode()).hexdigest()
+            filename = os.path.join(outdir, name + ".png")
+            if force or manifest.get(name) != key or not os.path.exists(filename):
+                jobs[name] = (url, filename, key)
+        self.services.logging.info("Saving {} pathways ({} unchanged)".format(len(jobs), len(pathways) - len(jobs)))
+
+        def render(name):
+            url, filename, key = jobs[name]
+            try:
+                self._render_pathway(url, filename, params)
+                return key
+            except Exception as err:
+                self.services.logging.warning("Could not save pathway {}: {}".format(name, err))
+
+        keys = self.services.map_concurrent(render, list(jobs), progress=progress, desc="pathways")
+        for name, key in zip(jobs, keys):
+            if key is not None:
+                manifest[name] = key
+            else:
+                manifest.pop(name, None)
+        with open(manifest_file, "w") as fout:
+            json.dump(manifest, fout, indent=1)
+
+        return {x: os.path.join(outdir, x.split(":")[-1] + ".png") for x in pathways if x.split(":")[-1] in manifest}
 
     def show_module(self, modId):
         """Show a given module inside a web browser
@@ -812,7 +1099,7 @@ class KEGG:
         """
         if modId.startswith("md:"):
             modId = modId.split(":")[1]
-        url = "http://www.kegg.jp/module/" + modId
+        url = self.www + "/module/" + modId
         self.services.logging.info(url)
         res = webbrowser.open(url)
         return res
@@ -825,15 +1112,98 @@ class KEGG:
     databases = property(_get_db, doc="Returns list of valid KEGG databases.")
 
     def _get_database(self, dbname, mode=0):
-        res = self.list(dbname)
+        res = self._listing(dbname)
         if mode not in [0, 1]:
             raise ValueError("mode must be 0 or 1")
         return [x.split()[mode] for x in res.split("\n") if len(x)]
 
+    def _fetch_release(self):
+        # not dbinfo() that checks the organism list, which needs the release
+        res = self.services.http_get("info/kegg", frmt="txt")
+        match = re.search(r"Release\s+(\S+)", res if isinstance(res, str) else "")
+        return match.group(1).rstrip(",") if match else None
+
+    def _get_release(self):
+        url = self.services.url
+        if url not in KEGG._releases:
+            KEGG._releases[url] = self._fetch_release()
+        return KEGG._releases[url]
+
+    release = property(_get_release, doc="current KEGG release (fetched once per session)")
+
+    def _listing_filename(self, dbname):
+        host = urlparse(self.services.url).netloc.replace(":", "_")
+        return os.path.join(self.services.settings.user_cache_dir, "kegg", host, "list_%s.txt" % dbname)
+
+    def _listing(self, dbname):
+        """Returns the output of :meth:`list` for a database, memoised
+
+        Listings are shared by all instances and, unless the cache.listings
+        option is off, persisted in the cache directory so that they are
+        downloaded once per KEGG release only.
+        """
+        key = (self.services.url, dbname)
+        with KEGG._listings_lock:
+            if key in KEGG._listings:
+                return KEGG._listings[key]
+
+        res = None
+        persist = self.services.settings.PERSIST_LISTINGS and self.mirror is None
+        filename = self._listing_filename(dbname)
+        if persist and os.path.exists(filename):
+            with open(filename) as fin:
+                release = fin.readline().rstrip("\n")
+                if release == "#release\t%s" % self.release:
+                    res = fin.read()
+
+        if res is None:
+            res = self.list(dbname)
+            if not isinstance(res, str):
+                # an error code; do not memoise it
+                return res
+            if persist and self.release:
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                with open(filename, "w") as fout:
+                    fout.write("#release\t%s\n" % self.release)
+                    fout.write(res)
+
+        with KEGG._listings_lock:
+            KEGG._listings[key] = res
+        return res
+
+    def clear_listings(self):
+        """Forget the memoised and persisted listings (e.g. organismIds)"""
+        with KEGG._listings_lock:
+            for key in [x for x in KEGG._listings if x[0] == self.services.url]:
+                del KEGG._listings[key]
+            KEGG._releases.pop(self.services.url, None)
+        self._organism_index = None
+        directory = os.path.dirname(self._listing_filename("organism"))
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+
+    def _get_organism_index(self):
+        # organism code <-> T number dictionaries and normalised definitions
+        if self._organism_index is None:
+            code2T, T2code, definitions = {}, {}, {}
+            for line in self._listing("organism").split("\n"):
+                fields = line.split()
+                if len(fields) < 2:
+                    continue
+                code2T[fields[1]] = fields[0]
+                T2code[fields[0]] = fields[1]
+                definitions[fields[1]] = " ".join(fields)
+            self._organism_index = {
+                "code2T": code2T,
+                "T2code": T2code,
+                "definitions": definitions,
+                "lower": [(x.lower(), x) for x in definitions.values()],
+            }
+        return self._organism_index
+
     def _get_organisms(self):
-        if self._organisms is None:
-            self._organisms = self._get_database("organism", 1)
-        return self._organisms
+        return list(self._get_organism_index()["code2T"])
 
     organismIds = property(_get_organisms, doc="Returns list of organism Ids")
 
@@ -852,9 +1222,7 @@ class KEGG:
     enzymeIds = property(_get_enzyme, doc="returns list of enzyme Ids" + _docIds)
 
     def _get_organisms_tnumbers(self):
-        if self._organisms_tnumbers is None:
-            self._organisms_tnumbers = self._get_database("organism", 0)
-        return self._organisms_tnumbers
+        return list(self._get_organism_index()["T2code"])
 
     organismTnumbers = property(_get_organisms_tnumbers, doc="returns list of organisms (T numbers)" + _docIds)
 
@@ -898,7 +1266,7 @@ class KEGG:
         return self._organism
 
     def _set_organism(self, organism):
-        if organism in self.organismIds:
+        if organism in self._get_organism_index()["code2T"]:
             self._organism = organism
             self._pathway = None
             self._module = None
@@ -968,15 +1336,16 @@ class KEGG:
     def lookfor_organism(self, query):
         """Look for a specific organism
 
-        :param str query: your search term. upper and lower cases are ignored
+        :param str query: your search term. upper and lower cases are ignored.
+            An organism code or T number returns its definition directly.
         :return: a list of definition that matches the query
         """
-        matches = []
-        definitions = [" ".join(x.split()) for x in self.list("organism").split("\n")]
-        for i, item in enumerate(definitions):
-            if query.lower() in item.lower():
-                matches.append(i)
-        return [definitions[i] for i in matches]
+        index = self._get_organism_index()
+        code = index["T2code"].get(query, query)
+        if code in index["definitions"]:
+            return [index["definitions"][code]]
+        query = query.lower()
+        return [definition for lower, definition in index["lower"] if query in lower]
 
     def lookfor_pathway(self, query):
         """Look for a specific pathway
@@ -1120,76 +1489,269 @@ class KEGG:
         # we need to map back to KEgg IDs...
         return output
 
-    def pathway2sif(self, pathwayId, uniprot=True):
+    def get_kgml(self, pathways=None, organism=None, progress=False):
+        """Download the KGML of many pathways concurrently
+
+        :param list pathways: list of pathway Ids (e.g. hsa04660)
+        :param organism: an organism code or a list of organism codes. All
+            their pathways are downloaded. Can be combined with *pathways*.
+        :param bool progress: show a progress bar
+        :return: dictionary with pathway Ids as keys and KGML as values
+
+        Pathways are fetched concurrently (see :meth:`get`); use
+        :meth:`kgml_tables` to parse them.
+
+        ::
+
+            k = KEGG()
+            kgmls = k.get_kgml(organism=["hsa", "mmu"])
+
+        """
+        pathways = list(pathways or [])
+        if isinstance(organism, str):
+            organism = [organism]
+        for org in organism or []:
+            res = self.list("pathway", org)
+            pathways += [x.split("\t")[0].replace("path:", "") for x in res.split("\n") if x]
+        return self.get(pathways, "kgml", progress=progress)
+
+    _kgml_columns = {
+        "entries": ["pathway", "id", "name", "type", "link", "gene_names"],
+        "relations": ["pathway", "entry1", "entry2", "link", "name", "value"],
+    }
+
+    def parse_kgml(self, kgml, pathwayId=None):
+        """Parse a KGML document into entry and relation tables
+
+        Faster and more compact alternative to :meth:`parse_kgml_pathway`:
+        the document is parsed incrementally (lxml iterparse) and the
+        results stored in two dataframes.
+
+        :param str kgml: the KGML document (see :meth:`get_kgml`)
+        :param str pathwayId: value of the *pathway* column. Defaults to the
+            pathway name found in the KGML (e.g. path:hsa04660)
+        :return: dictionary with *entries* and *relations* dataframes.
+            Entries have the columns pathway, id, name, type, link and
+            gene_names. Relations have the columns pathway, entry1, entry2,
+            link, name and value (one row per relation subtype; name and
+            value are None if the relation has no subtype).
+        """
+        import pandas as pd
+
+        from bioservices.decoders import get_xml_iterparse
+
+        if isinstance(kgml, str):
+            kgml = kgml.encode("utf-8")
+
+        entries, relations, subtypes = [], [], []
+        pathway, entry, graphics = pathwayId, None, None
+        iterparse = get_xml_iterparse(self.services.settings.XML_BACKEND)
+        for event, elem in iterparse(io.BytesIO(kgml), events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == "pathway" and pathway is None:
+                    pathway = elem.get("name")
+                elif tag == "entry":
+                    entry, graphics = elem, None
+                continue
+            if tag == "graphics" and entry is not None and graphics is None:
+                graphics = elem.get("name")
+            elif tag == "entry":
+                entries.append(
+                    (pathway, elem.get("id"), elem.get("name"), elem.get("type"), elem.get("link"), graphics)
+                )
+                entry = None
+                elem.clear()
+            elif tag == "subtype":
+                subtypes.append((elem.get("name"), elem.get("value")))
+            elif tag == "relation":
+                for name, value in subtypes or [(None, None)]:
+                    relations.append((pathway, elem.get("entry1"), elem.get("entry2"), elem.get("type"), name, value))
+                subtypes = []
+                elem.clear()
+
+        entries = pd.DataFrame(entries, columns=self._kgml_columns["entries"])
+        relations = pd.DataFrame(relations, columns=self._kgml_columns["relations"])
+        return {"entries": self._categorise(entries), "relations": self._categorise(relations)}
+
+    @staticmethod
+    def _categorise(df, columns=("pathway", "type", "link", "name", "value")):
+        # columns with repeated values are stored as categories
+        for column in columns:
+            if column in df.columns and df[column].nunique() < len(df) / 2:
+                df[column] = df[column].astype("category")
+        return df
+
+    def kgml_tables(self, pathways=None, organism=None, graph=False, progress=False):
+        """Download and parse the KGML of many pathways into two tables
+
+        :param list pathways: list of pathway Ids (see :meth:`get_kgml`)
+        :param organism: an organism code or a list of organism codes
+        :param bool graph: also build a directed graph of the relations
+            (requires networkx)
+        :param bool progress: show a progress bar
+        :return: dictionary with *entries* and *relations* dataframes of all
+            pathways (see :meth:`parse_kgml`) and, if requested, a *graph*
+            (see :meth:`kgml_graph`).
+
+        ::
+
+            k = KEGG()
+            tables = k.kgml_tables(organism="hsa")
+            tables["relations"].groupby("name").size()
+
+        """
+        import pandas as pd
+
+        kgmls = self.get_kgml(pathways=pathways, organism=organism, progress=progress)
+        tables = [self.parse_kgml(kgml, pathwayId=pathway) for pathway, kgml in kgmls.items()]
+        output = {}
+        for key, columns in self._kgml_columns.items():
+            frames = [x[key].astype(object) for x in tables]
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+            output[key] = self._categorise(df)
+        if graph:
+            output["graph"] = self.kgml_graph(output)
+        return output
+
+    def kgml_graph(self, tables):
+        """Build a networkx directed graph from KGML tables
+
+        :param dict tables: output of :meth:`parse_kgml` or :meth:`kgml_tables`
+        :return: a networkx MultiDiGraph. Nodes are the entry names (e.g.
+            hsa:1956) and edges carry the pathway, the relation type (link),
+            its name and value.
+        """
+        try:
+            import networkx as nx
+        except ImportError:
+            raise ImportError("kgml_graph requires networkx. Install it with: pip install networkx")
+
+        entries = tables["entries"].astype(object)
+        names = dict(zip(zip(entries["pathway"], entries["id"]), entries["name"]))
+        G = nx.MultiDiGraph()
+        for row in entries.itertuples(index=False):
+            G.add_node(row.name, type=row.type, gene_names=row.gene_names)
+        for row in tables["relations"].astype(object).itertuples(index=False):
+            source = names.get((row.pathway, row.entry1))
+            target = names.get((row.pathway, row.entry2))
+            if source is None or target is None:
+                continue
+            G.add_edge(source, target, pathway=row.pathway, link=row.link, name=row.name, value=row.value)
+        return G
+
+    def pathway2sif(self, pathwayId, uniprot=True, progress=False):
         """Extract protein-protein interaction from KEGG pathway to a SIF format
 
         .. warning:: experimental Not tested on all pathway. should be move to
             another package such as cellnopt
 
-        :param str pathwayId: a valid pathway Id
+        :param str pathwayId: a valid pathway Id or a list of pathway Ids.
         :param bool uniprot: convert to uniprot Id or not (default is True)
+        :param bool progress: show a progress bar (list of pathways only)
         :return: a list of relations (A 1 B) for activation and (A -1 B) for
-            inhibitions
+            inhibitions. If a list of pathways is provided, a dictionary with
+            the pathway Ids as keys and their relations as values.
+
+        KEGG Ids are converted to UniProt with one :meth:`conv` request per
+        batch of genes. The KGML of several pathways are fetched concurrently
+        (see :meth:`get`). See also :meth:`organism2sif`.
 
-        This is longish due to the conversion from KEGGIds to UniProt.
+        Genes without UniProt identifier keep their KEGG Id.
 
         This method can be useful to provide prior knowledge network to software
         such as CellNOpt (see http://www.cellnopt.org)
         """
-        res = self.parse_kgml_pathway(pathwayId)
+        if isinstance(pathwayId, (list, tuple, set)):
+            return self._pathways2sif(list(pathwayId), uniprot=uniprot, progress=progress)
+
+        sif = self._kgml2sif(self.parse_kgml_pathway(pathwayId))
+        if uniprot:
+            sif = self._sif2uniprot(sif, self._genes2uniprot(self._sif_genes(sif)))
+        return sif
+
+    def organism2sif(self, organism, uniprot=True, progress=True):
+        """Extract protein-protein interactions of all pathways of an organism
+
+        :param str organism: a valid organism (e.g. hsa)
+        :param bool uniprot: convert to uniprot Id or not (default is True)
+        :param bool progress: show a progress bar
+        :return: dictionary with pathway Ids as keys and relations as values
+            (see :meth:`pathway2sif`)
+
+        The KGML are downloaded concurrently and the KEGG Ids converted to
+        UniProt with a single :meth:`conv` request for the whole organism.
+
+        ::
+
+            k = KEGG()
+            sifs = k.organism2sif("hsa")
+        """
+        res = self.list("pathway", organism)
+        pathways = [x.split("\t")[0].replace("path:", "") for x in res.split("\n") if x]
+        mapping = None
+        if uniprot:
+            mapping = self.conv("uniprot", organism)
+            if not isinstance(mapping, dict):
+                raise BioServicesError("Could not convert genes of {} to UniProt".format(organism))
+        return self._pathways2sif(pathways, uniprot=uniprot, progress=progress, mapping=mapping)
+
+    def _pathways2sif(self, pathways, uniprot=True, progress=False, mapping=None):
+        kgmls = self.get(pathways, "kgml", progress=progress)
+        sifs = {}
+        for pathway in pathways:
+            if pathway in kgmls:
+                sifs[pathway] = self._kgml2sif(self.parse_kgml_pathway(pathway, res=kgmls[pathway]))
+
+        if uniprot:
+            if mapping is None:
+                genes = set()
+                for sif in sifs.values():
+                    genes.update(self._sif_genes(sif))
+                mapping = self._genes2uniprot(sorted(genes))
+            sifs = {k: self._sif2uniprot(v, mapping) for k, v in sifs.items()}
+        return sifs
+
+    @staticmethod
+    def _kgml2sif(res):
+        # activation/inhibition relations between genes of a parsed KGML
+        entries = {x["id"]: x for x in res["entries"]}
+        signs = {"activation": 1, "inhibition": -1}
         sif = []
         for rel in res["relations"]:
             # types can be PPrel (protein-protein interaction only
-            if rel["link"] != "PPrel":
+            if rel["link"] != "PPrel" or rel["name"] not in signs:
                 continue
-            if rel["name"] == "activation":
-                Id1 = rel["entry1"]
-                Id2 = rel["entry2"]
-                name1 = res["entries"][[x["id"] for x in res["entries"]].index(Id1)]["name"]
-                name2 = res["entries"][[x["id"] for x in res["entries"]].index(Id2)]["name"]
-                type1 = res["entries"][[x["id"] for x in res["entries"]].index(Id1)]["type"]
-                type2 = res["entries"][[x["id"] for x in res["entries"]].index(Id2)]["type"]
-                # print("names:", rel, name1, name2)
-                # print(type1, type2)
-                if type1 != "gene" or type2 != "gene":
-                    continue
-                if uniprot:
-                    try:
-                        # FIXME  sometimes, there are more than one name
-                        name1 = name1.split()[0]
-                        name2 = name2.split()[0]
-                        name1 = self.conv("uniprot", name1)[name1]
-                        name2 = self.conv("uniprot", name2)[name2]
-                    except Exception:
-                        self.services.logging.info(name1)
-                        self.services.logging.info(name2)
-                        raise Exception
-                # print(name1, 1, name2)
-                sif.append([name1, 1, name2])
-            elif rel["name"] == "inhibition":
-                Id1 = rel["entry1"]
-                Id2 = rel["entry2"]
-                name1 = res["entries"][[x["id"] for x in res["entries"]].index(Id1)]["name"]
-                name2 = res["entries"][[x["id"] for x in res["entries"]].index(Id2)]["name"]
-                type1 = res["entries"][[x["id"] for x in res["entries"]].index(Id1)]["type"]
-                type2 = res["entries"][[x["id"] for x in res["entries"]].index(Id2)]["type"]
-                # print("names:", rel, name1, name2)
-                # print(type1, type2)
-                if type1 != "gene" or type2 != "gene":
-                    continue
-                if uniprot:
-                    name1 = name1.split()[0]
-                    name2 = name2.split()[0]
-                    name1 = self.conv("uniprot", name1)[name1]
-                    name2 = self.conv("uniprot", name2)[name2]
-                # print(name1, -1, name2)
-                sif.append([name1, -1, name2])
-            else:
-                pass
-                # print("#", rel['entry1'], rel['name'], rel['entry2'])
-
+            entry1 = entries[rel["entry1"]]
+            entry2 = entries[rel["entry2"]]
+            if entry1["type"] != "gene" or entry2["type"] != "gene":
+                continue
+            sif.append([entry1["name"], signs[rel["name"]], entry2["name"]])
         return sif
 
+    @staticmethod
+    def _sif_genes(sif):
+        # FIXME  sometimes, there are more than one name; the first one is used
+        return sorted(set(x[0].split()[0] for x in sif) | set(x[2].split()[0] for x in sif))
+
+    def _genes2uniprot(self, genes, chunk_size=100):
+        chunks = [genes[i : i + chunk_size] for i in range(0, len(genes), chunk_size)]
+        mapping = {}
+        for res in self.services.map_concurrent(lambda chunk: self.conv("uniprot", "+".join(chunk)), chunks):
+            if isinstance(res, dict):
+                mapping.update(res)
+        return mapping
+
+    def _sif2uniprot(self, sif, mapping):
+        output = []
+        for name1, sign, name2 in sif:
+            name1, name2 = name1.split()[0], name2.split()[0]
+            for name in (name1, name2):
+                if name not in mapping:
+                    self.services.logging.warning("No UniProt identifier for {}".format(name))
+            output.append([mapping.get(name1, name1), sign, mapping.get(name2, name2)])
+        return output
+
     def parse(self, entry):
         """See :class:`KEGGParser` for details
 
@@ -1260,7 +1822,9 @@ class KEGGParser(object):
     def parse(self, res):
         """Parse to any outputs returned by :meth:`KEGG.get`
 
-        :param str res: output of a :meth:`KEGG.get`.
+        :param str res: output of a :meth:`KEGG.get` with a single entry. Use
+            :meth:`iter_parse` to get one dictionary per entry when several
+            entries were retrieved at once.
         :return: a dictionary. Keys are those found in the KEGG entry (e.g.,
             REACTION, ENTRY, EQUATION, ...). The format of each value is
             various. It could be a string, a list (of strings generally),
@@ -1323,7 +1887,58 @@ class KEGGParser(object):
 
         return parser
 
+    def iter_parse(self, lines):
+        """Parse a stream of KEGG entries, one ``///``-delimited record at a time
+
+        :param lines: an iterable of lines (e.g. an opened file or
+            :meth:`requests.Response.iter_lines`) or a string with one or
+            several entries (e.g. the output of :meth:`KEGG.get` called with
+            up to 10 entries).
+        :return: a generator of dictionaries (see :meth:`parse`)
+
+        Lines are consumed in a single pass so that large dumps (e.g. all genes
+        of an organism saved to a file) can be parsed with a flat memory::
+
+            parser = KEGGParser()
+            with open("hsa_genes.txt") as fin:
+                for record in parser.iter_parse(fin):
+                    print(record["ENTRY"], record.get("SYMBOL"))
+
+        """
+        if isinstance(lines, str):
+            lines = io.StringIO(lines)
+
+        sections = {}
+        name, section = None, []
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode()
+            line = line.rstrip("\r\n")
+            if line == "///":
+                if name is not None:
+                    sections.setdefault(name, []).append("\n".join(section))
+                if sections:
+                    yield self._interpret(sections)
+                sections = {}
+                name, section = None, []
+            elif not line:
+                continue
+            elif line[0] != " ":
+                if name is not None:
+                    sections.setdefault(name, []).append("\n".join(section))
+                name, section = line.split()[0], [line]
+            else:
+                section.append(line)
+
+        # last entry without trailing ///
+        if name is not None:
+            sections.setdefault(name, []).append("\n".join(section))
+        if sections:
+            yield self._interpret(sections)
+
     def _parse(self, res):
+        # parse() keeps merging the fields of all entries found in res; use
+        # iter_parse() to get one dictionary per ///-delimited record
         keys = [x.split(" ")[0] for x in res.split("\n") if len(x) and x[0] != " " and x != "///"]
         # let us go line by to not forget anything and know which entries are
         # found in the RHS. We may have duplicated once as can be found in th
@@ -1372,6 +1987,27 @@ class KEGGParser(object):
             except Exception:  # skip the lists
                 pass
 
+        return self._convert(output)
+
+    def _interpret(self, sections):
+        # sections is a dictionary with as key the name found in the LHS
+        # e.g., REACTION and as value the list of entries with that name.
+        # The value is then the entry content as a string if the key is
+        # unique or a list of strings otherwise e.g., for references. This
+        # could be a bit annoying since for example References could appear
+        # only once if some cases. This can be tested though by checking the type
+        output = {}
+        for k, entries in sections.items():
+            if len(entries) > 1:
+                output[k] = entries
+            elif k in ["CHROMOSOME", "TAXONOMY"]:
+                output[k] = entries[0]
+            else:
+                # remove name that are now the keys of the dictionary anyway
+                output[k] = entries[0].strip().replace(k, "", 1).strip()
+        return self._convert(output)
+
+    def _convert(self, output):
         # Now, let us do the real stuff.
         # This is tricky since format is not consistent with the names e,g
         # REACTIONS could be sometimes a list of names and sometimes list
@@ -1761,6 +2397,11 @@ class KEGGTools(KEGG):
         k.load_genes("hsa")
         genes = k.scan_genes()
 
+    Scanning a whole organism takes a while. With a checkpoint file, entries
+    are saved as they are downloaded and a scan that was interrupted
+    resumes where it stopped::
+
+        genes = k.scan_genes(checkpoint="hsa_genes.jsonl")
 
     """
 
@@ -1775,31 +2416,125 @@ class KEGGTools(KEGG):
         self.genes = [x.split("\t")[0] for x in res.strip().split("\n")]
         return self.genes
 
-    def scan_genes(self):
-        from easydev import progress_bar
-
-        pb = progress_bar(len(self.genes))
-        import time
+    def scan_genes(self, checkpoint=None, batch_size=500, progress=True):
+        """Fetch and parse all genes (see :meth:`load_genes`)
 
-        genes = {}
-        for i, gene in enumerate(self.genes):
-            genes[gene] = self.parser.parse(self.kegg.get(self.genes[i]))
-            pb.animate(i, time.time() - pb.start)
-        return genes
+        :param str checkpoint: a JSON lines file where parsed entries are
+            saved every *batch_size* entries. Entries already in the file are
+            not downloaded again.
+        :param int batch_size: number of entries fetched (concurrently)
+            between two checkpoints
+        :param bool progress: show a progress bar
+        :return: dictionary with gene Ids as keys and parsed entries as values
+        """
+        if checkpoint is None:
+            # entries are fetched by groups of 10, concurrently
+            return self.kegg.get(self.genes, parse=True, progress=progress)
+        return dict(self.iter_scan(self.genes, checkpoint, batch_size=batch_size, progress=progress))
 
     def load_reactions(self, organism):
         reactions = self.kegg.list("reaction")
         self.reactions = [x.split()[0] for x in reactions.split("\n") if len(x)]
         return self.reactions
 
-    def scan_reactions(self):
-        from easydev import progress_bar
+    def scan_reactions(self, checkpoint=None, batch_size=500, progress=True):
+        """Fetch and parse all reactions (see :meth:`load_reactions`)
+
+        Parameters are the same as in :meth:`scan_genes`.
+        """
+        if checkpoint is None:
+            return self.kegg.get(self.reactions, parse=True, progress=progress)
+        return dict(self.iter_scan(self.reactions, checkpoint, batch_size=batch_size, progress=progress))
 
-        pb = progress_bar(len(self.reactions))
-        import time
+    @staticmethod
+    def read_checkpoint(checkpoint):
+        """Returns the entries saved in a checkpoint file
 
-        reactions = {}
-        for i, this in enumerate(self.reactions):
-            reactions[this] = self.parser.parse(self.kegg.get(self.reactions[i]))
-            pb.animate(i, time.time() - pb.start)
-        return reactions
+        :return: dictionary with Ids as keys and parsed entries as values
+            (None for entries that were not found)
+        """
+        done = {}
+        if not os.path.exists(checkpoint):
+            return done
+        with open(checkpoint) as fin:
+            for line in fin:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # last line of a scan that was killed while writing
+                    continue
+                done[record["id"]] = record["entry"]
+        return done
+
+    @staticmethod
+    def _truncate_checkpoint(checkpoint, blocksize=1 << 16):
+        # drop the partial last line of a scan killed while writing, so that
+        # the next record is not appended to it
+        if not os.path.exists(checkpoint):
+            return
+        with open(checkpoint, "rb+") as fout:
+            end = fout.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - blocksize)
+                fout.seek(start)
+                block = fout.read(position - start)
+                newline = block.rfind(b"\n")
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position != end:
+                fout.truncate(position)
+
+    def iter_scan(self, entries, checkpoint, batch_size=500, progress=True):
+        """Fetch, parse and yield entries, saving them in a checkpoint file
+
+        :param list entries: KEGG entries (e.g. :attr:`genes`)
+        :param str checkpoint: a JSON lines file. Each line stores the
+            Id and the parsed entry. Entries already saved are read from the
+            file instead of being downloaded.
+        :param int batch_size: number of entries fetched (concurrently)
+            between two checkpoints
+        :param bool progress: show a progress bar
+        :return: generator of (Id, parsed entry) tuples. Entries that are
+            not found are saved (so that they are not requested again) but
+            not yielded. Entries whose request failed (e.g. server error,
+            timeout) are neither saved nor yielded; they are requested again
+            when the scan is resumed.
+        """
+        from tqdm import tqdm
+
+        done = self.read_checkpoint(checkpoint)
+        for key in entries:
+            if done.get(key) is not None:
+                yield key, done[key]
+
+        todo = [x for x in entries if x not in done]
+        if todo:
+            self._truncate_checkpoint(checkpoint)
+        failed = set()
+        pbar = tqdm(total=len(entries), initial=len(entries) - len(todo), disable=not progress)
+        try:
+            for i in range(0, len(todo), batch_size):
+                batch = todo[i : i + batch_size]
+                batch_failed = []
+                results = self.kegg._get_many(batch, parse=True, failed=batch_failed)
+                failed.update(batch_failed)
+                with open(checkpoint, "a") as fout:
+                    for key in batch:
+                        if key not in failed:
+                            fout.write(json.dumps({"id": key, "entry": results.get(key)}, default=str) + "\n")
+                    fout.flush()
+                    os.fsync(fout.fileno())
+                pbar.update(len(batch))
+                for key in batch:
+                    if results.get(key) is not None:
+                        yield key, results[key]
+        finally:
+            pbar.close()
+        if failed:
+            self.kegg.services.logging.warning(
+                "{} entries could not be retrieved and were not saved in {}; "
+                "scan again to retry them".format(len(failed), checkpoint)
+            )
@@ -0,0 +1,337 @@
+#
+#  This file is part of bioservices software
+#
+#  Distributed under the GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  website: https://github.com/cokelaer/bioservices
+#  documentation: http://bioservices.readthedocs.io
+#
+##############################################################################
+"""Local indexed copy of KEGG list, conv and link tables
+
+Calls such as ``KEGG.conv("hsa", "uniprot")`` download large tables (and may
+take a minute). The :class:`KEGGMirror` stores snapshots of those tables in
+a SQLite database, indexed on both columns, so that :meth:`KEGG.list`,
+:meth:`KEGG.conv`, :meth:`KEGG.link` and :meth:`KEGG.find` (by identifier)
+can be answered locally::
+
+    from bioservices import KEGG
+    k = KEGG(mirror="kegg.sqlite")
+    k.mirror.snapshot(organisms=["hsa"], databases=["pathway", "compound"])
+
+    k.conv("uniprot", "hsa:10458")     # answered by the local index
+    k.link("pathway", "hsa:10458")     # same
+    k.mirror.refresh()                 # update the tables if KEGG has a new release
+
+Calls that cannot be answered by the mirror are sent to the KEGG API.
+
+The KEGG release (from :meth:`KEGG.dbinfo`) is recorded with each table so
+that :meth:`KEGGMirror.refresh` only downloads tables again when KEGG has been
+updated. The mirror can also be created and refreshed from the command line::
+
+    bioservices kegg-mirror snapshot --organism hsa --database pathway
+    bioservices kegg-mirror refresh
+
+"""
+import contextlib
+import datetime
+import os
+import sqlite3
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+
+__all__ = ["KEGGMirror"]
+
+
+class KEGGMirror:
+    """Local indexed (SQLite) store of KEGG list, conv and link tables
+
+    :param str filename: the SQLite database. Defaults to *kegg_mirror.sqlite*
+        in the bioservices configuration directory.
+    :param kegg: a :class:`~bioservices.kegg.KEGG` instance used to download
+        the tables. Created if not provided.
+
+    Tables are stored as they are returned by KEGG: the first column is the
+    source identifier and the second column the target (or the description
+    for lists).
+    """
+
+    #: prefixes used in KEGG identifiers and their database
+    prefixes = {
+        "up": "uniprot",
+        "path": "pathway",
+        "cpd": "compound",
+        "dr": "drug",
+        "gl": "glycan",
+        "rn": "reaction",
+        "rc": "rclass",
+        "md": "module",
+        "ds": "disease",
+        "gn": "genome",
+        "ec": "enzyme",
+    }
+
+    #: gene identifier conversions snapshot for each organism
+    default_conv = ["uniprot", "ncbi-geneid"]
+    #: KEGG databases linked to each organism genes
+    default_link = ["pathway"]
+
+    def __init__(self, filename=None, kegg=None):
+        if filename is None:
+            from bioservices import bspath
+
+            filename = os.path.join(bspath, "kegg_mirror.sqlite")
+        self.filename = filename
+        self._kegg = kegg
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    kind TEXT, target TEXT, source TEXT, release TEXT, updated TEXT, size INTEGER,
+                    PRIMARY KEY (kind, target, source));
+                CREATE TABLE IF NOT EXISTS rows (
+                    kind TEXT, target TEXT, source TEXT, position INTEGER, col1 TEXT, col2 TEXT);
+                CREATE INDEX IF NOT EXISTS rows_table ON rows (kind, target, source, position);
+                CREATE INDEX IF NOT EXISTS rows_col1 ON rows (col1);
+                CREATE INDEX IF NOT EXISTS rows_col2 ON rows (col2);
+                """
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # a sqlite3 connection used as a context manager commits (or rolls
+        # back) the transaction but is not closed
+        conn = sqlite3.connect(self.filename)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _get_kegg(self):
+        if self._kegg is None:
+            from bioservices import KEGG
+
+            self._kegg = KEGG()
+        return self._kegg
+
+    kegg = property(_get_kegg)
+
+    def __repr__(self):
+        return "KEGGMirror({}, release {}, {} tables)".format(self.filename, self.release, len(self.snapshots))
+
+    # ------------------------------------------------------------------ #
+    # Snapshots                                                           #
+    # ------------------------------------------------------------------ #
+
+    def _get_release(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key='release'").fetchone()
+        return row[0] if row else None
+
+    release = property(_get_release, doc="KEGG release of the last snapshot")
+
+    def _get_snapshots(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT kind, target, source, release, updated, size FROM snapshots").fetchall()
+        keys = ["kind", "target", "source", "release", "updated", "size"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    snapshots = property(_get_snapshots, doc="list of tables stored in the mirror")
+
+    def current_release(self):
+        """Returns the current KEGG release (e.g. 108.0+/10-19) as found in :meth:`KEGG.dbinfo`"""
+        release = self.kegg._fetch_release()
+        if release is None:
+            raise ValueError("Could not find the KEGG release in the dbinfo output")
+        return release
+
+    def snapshot(self, organisms=(), databases=(), conv=None, link=None, release=None):
+        """Download tables and store them in the mirror
+
+        :param list organisms: KEGG organism codes (e.g. hsa). The list of
+            organisms is always stored. For each
+            organism, the list of genes, the list of pathways, the gene
+            identifier conversions (see :attr:`default_conv`) and the links to
+            pathways (see :attr:`default_link`) are stored.
+        :param list databases: KEGG databases (e.g. pathway, compound, ko) whose
+            list is stored.
+        :param list conv: extra (target, source) pairs to store (see :meth:`KEGG.conv`)
+        :param list link: extra (target, source) pairs to store (see :meth:`KEGG.link`)
+        :param str release: the KEGG release (fetched if not provided)
+        :return: number of tables stored
+        """
+        # used by KEGG.isOrganism to check the arguments of conv/link
+        tables = [("list", "organism", "")]
+        for org in organisms:
+            tables.append(("list", org, ""))
+            tables.append(("list", "pathway", org))
+            tables += [("conv", target, org) for target in (self.default_conv if conv is None else [])]
+            tables += [("link", target, org) for target in (self.default_link if link is None else [])]
+        tables += [("list", database, "") for database in databases]
+        tables += [("conv", target, source) for target, source in conv or []]
+        tables += [("link", target, source) for target, source in link or []]
+
+        release = release or self.current_release()
+        for kind, target, source in dict.fromkeys(tables):
+            self._store(kind, target, source, release)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('release', ?)", (release,))
+        return len(tables)
+
+    def refresh(self, force=False):
+        """Download all tables again if KEGG has a new release
+
+        :param bool force: download the tables even if the release did not change
+        :return: list of refreshed tables as (kind, target, source) tuples
+        """
+        release = self.current_release()
+        refreshed = []
+        for item in self.snapshots:
+            if force or item["release"] != release:
+                self._store(item["kind"], item["target"], item["source"], release)
+                refreshed.append((item["kind"], item["target"], item["source"]))
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('release', ?)", (release,))
+        if not refreshed:
+            logger.info("KEGG mirror is up to date (release {})".format(release))
+        return refreshed
+
+    def _store(self, kind, target, source, release):
+        url = "/".join(x for x in (kind, target, source) if x)
+        logger.info("Downloading {} into the KEGG mirror".format(url))
+        res = self.kegg.services.http_get(url, frmt="txt")
+        if not isinstance(res, str):
+            raise ValueError("Could not download {} (status {})".format(url, res))
+
+        rows = []
+        for i, line in enumerate(x for x in res.split("\n") if x):
+            col1, _, col2 = line.partition("\t")
+            rows.append((kind, target, source, i, col1, col2))
+
+        updated = datetime.datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute("DELETE FROM rows WHERE kind=? AND target=? AND source=?", (kind, target, source))
+            conn.executemany("INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, target, source, release, updated, len(rows)),
+            )
+
+    def clear(self):
+        """Remove all tables from the mirror"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM rows")
+            conn.execute("DELETE FROM snapshots")
+            conn.execute("DELETE FROM meta")
+
+    # ------------------------------------------------------------------ #
+    # Lookups (return None if the mirror cannot answer)                   #
+    # ------------------------------------------------------------------ #
+
+    def _has(self, conn, kind, target, source):
+        query = "SELECT 1 FROM snapshots WHERE kind=? AND target=? AND source=?"
+        return conn.execute(query, (kind, target, source)).fetchone() is not None
+
+    def _table(self, kind, target, source):
+        with self._connect() as conn:
+            if not self._has(conn, kind, target, source):
+                return None
+            query = "SELECT col1, col2 FROM rows WHERE kind=? AND target=? AND source=? ORDER BY position"
+            return conn.execute(query, (kind, target, source)).fetchall()
+
+    def _database(self, entry):
+        prefix = entry.split(":", 1)[0] if ":" in entry else None
+        return self.prefixes.get(prefix, prefix)
+
+    def _lookup(self, kind, target, entries):
+        """Rows of a (kind, target, database) table whose source is in entries
+
+        The reversed table (kind, database, target) is used if available.
+        """
+        databases = set(self._database(x) for x in entries)
+        if len(databases) != 1 or None in databases:
+            return None
+        database = databases.pop()
+        marks = ",".join("?" * len(entries))
+        with self._connect() as conn:
+            if self._has(conn, kind, target, database):
+                query = "SELECT col1, col2 FROM rows WHERE kind=? AND target=? AND source=? AND col1 IN ({})"
+                query += " ORDER BY position"
+                return conn.execute(query.format(marks), [kind, target, database] + entries).fetchall()
+            if self._has(conn, kind, database, target):
+                query = "SELECT col2, col1 FROM rows WHERE kind=? AND target=? AND source=? AND col2 IN ({})"
+                query += " ORDER BY position"
+                return conn.execute(query.format(marks), [kind, database, target] + entries).fetchall()
+        return None
+
+    @staticmethod
+    def _to_text(rows):
+        return "".join("{}\t{}\n".format(col1, col2) for col1, col2 in rows)
+
+    def list(self, query, organism=None):
+        """Same as :meth:`KEGG.list` or None if the table is not in the mirror"""
+        rows = self._table("list", query, organism or "")
+        if rows is None:
+            return None
+        return self._to_text(rows)
+
+    def _conv_rows(self, target, source):
+        rows = self._table("conv", target, source)
+        if rows is None:
+            rows = self._lookup("conv", target, source.split("+"))
+        return rows
+
+    def conv(self, target, source):
+        """Same as :meth:`KEGG.conv` or None if the mirror cannot answer"""
+        rows = self._conv_rows(target, source)
+        if rows is None:
+            return None
+        return dict(rows)
+
+    def conv_text(self, target, source):
+        """Same as :meth:`conv` but returns the table as sent by KEGG
+
+        Unlike the dictionary returned by :meth:`conv`, sources converted to
+        several identifiers (e.g. a gene with several UniProt entries) keep
+        all their rows.
+        """
+        rows = self._conv_rows(target, source)
+        if rows is None:
+            return None
+        return self._to_text(rows)
+
+    def link(self, target, source):
+        """Same as :meth:`KEGG.link` or None if the mirror cannot answer"""
+        rows = self._table("link", target, source)
+        if rows is None:
+            rows = self._lookup("link", target, source.split("+"))
+        if rows is None:
+            return None
+        return self._to_text(rows)
+
+    def find(self, database, query):
+        """Returns the entry of a list whose identifier is *query* or None
+
+        Only identifiers are searched (e.g. find("compound", "C00031")); other
+        queries (keywords) return None so that the KEGG API is used.
+        """
+        with self._connect() as conn:
+            if not self._has(conn, "list", database, ""):
+                return None
+            candidates = [query, query.split(":", 1)[-1]]
+            candidates += [
+                "{}:{}".format(prefix, candidates[1]) for prefix, db in self.prefixes.items() if db == database
+            ]
+            marks = ",".join("?" * len(candidates))
+            sql = "SELECT col1, col2 FROM rows WHERE kind='list' AND target=? AND source='' AND col1 IN ({})"
+            rows = conn.execute(sql.format(marks), [database] + candidates).fetchall()
+        if not rows:
+            return None
+        return self._to_text(rows)
@@ -771,3 +771,123 @@ def reaction(**kwargs):
         print(result)
     else:
         logger.warning("No Rhea reactions found for %s", kwargs["query"])
+
+
+# kegg-mirror command group
+# ---------------------------------------------------------------------------
+
+
+@main.group(name="kegg-mirror")
+def kegg_mirror(**kwargs):
+    """Manage a local indexed copy of KEGG list/conv/link tables
+
+    \b
+    Examples:
+        bioservices kegg-mirror snapshot --organism hsa --database compound
+        bioservices kegg-mirror refresh
+        bioservices kegg-mirror info
+    """
+    pass
+
+
+@kegg_mirror.command()
+@click.option("--filename", default=None, type=click.STRING, help="SQLite database (default in the config directory)")
+@click.option("--organism", multiple=True, type=click.STRING, help="KEGG organism code (e.g. hsa). May be repeated")
+@click.option(
+    "--database", multiple=True, type=click.STRING, help="KEGG database to list (e.g. compound). May be repeated"
+)
+def snapshot(**kwargs):
+    """Download KEGG tables into the local mirror.
+
+    \b
+    Examples:
+        bioservices kegg-mirror snapshot --organism hsa
+        bioservices kegg-mirror snapshot --organism hsa --organism mmu --database pathway
+    """
+    from bioservices.keggmirror import KEGGMirror
+
+    mirror = KEGGMirror(kwargs["filename"])
+    mirror.snapshot(organisms=kwargs["organism"], databases=kwargs["database"])
+    print(mirror)
+
+
+@kegg_mirror.command()
+@click.option("--filename", default=None, type=click.STRING, help="SQLite database (default in the config directory)")
+@click.option("--force", is_flag=True, default=False, help="Download the tables even if the release did not change")
+def refresh(**kwargs):
+    """Update the local mirror if KEGG has a new release.
+
+    \b
+    Examples:
+        bioservices kegg-mirror refresh
+        bioservices kegg-mirror refresh --force
+    """
+    from bioservices.keggmirror import KEGGMirror
+
+    mirror = KEGGMirror(kwargs["filename"])
+    refreshed = mirror.refresh(force=kwargs["force"])
+    for kind, target, source in refreshed:
+        print("refreshed {}".format("/".join(x for x in (kind, target, source) if x)))
+    print(mirror)
+
+
+@kegg_mirror.command(name="info")
+@click.option("--filename", default=None, type=click.STRING, help="SQLite database (default in the config directory)")
+def mirror_info(**kwargs):
+    """List the tables stored in the local mirror."""
+    from bioservices.keggmirror import KEGGMirror
+
+    mirror = KEGGMirror(kwargs["filename"])
+    print(mirror)
+    for item in mirror.snapshots:
+        name = "/".join(x for x in (item["kind"], item["target"], item["source"]) if x)
+        print("{:<30} {:>10} rows  release {}  ({})".format(name, item["size"], item["release"], item["updated"]))
+
+
+# ---------------------------------------------------------------------------
+# uniprot-index command group
+# ---------------------------------------------------------------------------
+
+
+@main.group(name="uniprot-index")
+def uniprot_index(**kwargs):
+    """Manage a local index of UniProt flat files
+
+    \b
+    Examples:
+        bioservices uniprot-index build uniprot_sprot.dat.gz
+        bioservices uniprot-index info
+    """
+    pass
+
+
+@uniprot_index.command()
+@click.argument("sources", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--filename", default=None, type=click.STRING, help="SQLite database (default in the config directory)")
+@click.option("--format", "frmt", default=None, type=click.Choice(["txt", "fasta"]), help="Guessed from the extension")
+def build(**kwargs):
+    """Index UniProt flat (.dat) or FASTA files (possibly gzipped).
+
+    \b
+    Examples:
+        bioservices uniprot-index build uniprot_sprot.dat.gz
+        bioservices uniprot-index build uniprot_sprot.fasta.gz uniprot_trembl.fasta.gz
+    """
+    from bioservices.uniprotindex import UniProtIndex
+
+    index = UniProtIndex(kwargs["filename"])
+    for source in kwargs["sources"]:
+        print("{}: {} records".format(source, index.build(source, frmt=kwargs["frmt"])))
+    print(index)
+
+
+@uniprot_index.command(name="info")
+@click.option("--filename", default=None, type=click.STRING, help="SQLite database (default in the config directory)")
+def index_info(**kwargs):
+    """List the files stored in the local index."""
+    from bioservices.uniprotindex import UniProtIndex
+
+    index = UniProtIndex(kwargs["filename"])
+    print(index)
+    for item in index.files:
+        print("{:<50} {:>5} {:>10} records  ({})".format(item["path"], item["format"], item["size"], item["built"]))
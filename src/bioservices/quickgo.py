@@ -383,9 +383,7 @@ or a string (e.g., 'PUBMED:') """
         res = self.services.http_get(url, frmt="txt", params=params, headers=self.services.get_headers("json"))
 
         try:
-            import json
-
-            res = json.loads(res)
+            res = self.services.json_loads(res)
         except Exception:
             pass
 
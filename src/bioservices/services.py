@@ -15,19 +15,23 @@
 #
 ##############################################################################
 """Modules with common tools to access web resources"""
+import functools
 import os
 import platform
+import threading
 import time
 import traceback
 from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
 from urllib.request import urlopen
 
 import colorlog
 from easydev import DevTools
 
+from bioservices.decoders import get_json_decoder, get_xml_parser
 from bioservices.settings import BioServicesConfig
 
-__all__ = ["Service", "BioServicesError", "HTTPResponseError", "REST"]
+__all__ = ["Service", "BioServicesError", "HTTPResponseError", "CircuitBreaker", "CircuitOpenError", "REST"]
 
 
 class BioServicesError(Exception):
@@ -123,6 +127,120 @@ class HTTPResponseError(int):
         self._raise_friendly()
 
 
+class CircuitOpenError(BioServicesError):
+    """Raised when a request is rejected because the circuit of its host is open"""
+
+
+class CircuitBreaker:
+    """Circuit breaker protecting calls to a single upstream host
+
+    The circuit starts *closed*: requests go through and consecutive failures
+    are counted. Once **threshold** consecutive failures are reached, the
+    circuit becomes *open* and requests fail fast (no network call) for
+    **reset_timeout** seconds. Then, the circuit becomes *half-open*: a single
+    probe request is let through. If it succeeds, the circuit is closed again,
+    otherwise it is re-opened for another **reset_timeout** seconds.
+
+    Failures are exceptions (e.g. timeouts, connection errors) and HTTP 5xx
+    replies. Other replies (including 4xx) count as successes since the host
+    is responsive.
+
+    Breakers are shared by all :class:`REST` instances talking to the same
+    host. See :meth:`REST.circuit_metrics` to inspect them.
+
+    :param str host: the host name (used for reporting only)
+    :param int threshold: number of consecutive failures before opening the
+        circuit. If set to 0, the breaker is disabled.
+    :param float reset_timeout: seconds before a probe is let through.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, host, threshold=5, reset_timeout=60):
+        self.host = host
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._state = CircuitBreaker.CLOSED
+        self._opened_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def _get_state(self):
+        with self._lock:
+            return self._current_state()
+
+    state = property(_get_state, doc="current state (closed, open or half-open)")
+
+    def _current_state(self):
+        # must be called with the lock acquired
+        if self._state == CircuitBreaker.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = CircuitBreaker.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow_request(self):
+        """Returns True if a request can be sent to the host"""
+        if not self.threshold:
+            return True
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitBreaker.CLOSED:
+                return True
+            if state == CircuitBreaker.HALF_OPEN and not self._probing:
+                # only one probe at a time
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self._state = CircuitBreaker.CLOSED
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            state = self._current_state()
+            if state == CircuitBreaker.HALF_OPEN or (
+                self.threshold and state == CircuitBreaker.CLOSED and self.consecutive_failures >= self.threshold
+            ):
+                self._state = CircuitBreaker.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self.opened += 1
+
+    def reset(self):
+        """Close the circuit and reset the failure counter"""
+        with self._lock:
+            self._state = CircuitBreaker.CLOSED
+            self._probing = False
+            self.consecutive_failures = 0
+
+    def metrics(self):
+        """Returns a dictionary with the state and counters of this breaker"""
+        return {
+            "host": self.host,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failures": self.failures,
+            "successes": self.successes,
+            "rejected": self.rejected,
+            "opened": self.opened,
+        }
+
+
 class Service:
     """Base class for REST service classes
 
@@ -202,21 +320,20 @@ class Service:
         self.settings = BioServicesConfig()
 
         self._last_call = 0
+        self._calls_lock = threading.Lock()
 
     def _calls(self):
+        # thread-safe: each caller books the next free slot, then waits for it
         time_lapse = 1.0 / self.requests_per_sec
-        current_time = time.time()
-        dt = current_time - self._last_call
-
-        if self._last_call == 0:
-            self._last_call = current_time
-            return
-        else:
-            self._last_call = current_time
-            if dt > time_lapse:
+        with self._calls_lock:
+            current_time = time.time()
+            if self._last_call == 0:
+                self._last_call = current_time
                 return
-            else:
-                time.sleep(time_lapse - dt)
+            wait = max(0, self._last_call + time_lapse - current_time)
+            self._last_call = current_time + wait
+        if wait:
+            time.sleep(wait)
 
     def _get_caching(self):
         return self.settings.params["cache.on"][0]
@@ -290,8 +407,18 @@ class RESTbase(Service):
             url_defined_later=url_defined_later,
         )
         self.logging.info("Initialising %s service (REST)" % self.name)
+        self._local = threading.local()
         self.last_response = None
 
+    def _get_last_response(self):
+        return getattr(self._local, "response", None)
+
+    def _set_last_response(self, response):
+        self._local.response = response
+
+    # per thread so that paginated requests can run concurrently (see map_concurrent)
+    last_response = property(_get_last_response, _set_last_response, doc="last response received by this thread")
+
     def http_get(self):
         # should return unicode
         raise NotImplementedError
@@ -401,6 +528,10 @@ class REST(RESTbase):
     }
     # special_characters = ['/', '#', '+']
 
+    #: circuit breakers shared by all instances (one per host)
+    _circuit_breakers = {}
+    _circuit_lock = threading.Lock()
+
     def __init__(
         self,
         name,
@@ -484,11 +615,7 @@ class REST(RESTbase):
         max retries is defined in the :attr:`MAX_RETRIES`
         """
         self.logging.debug("Creating session (uncached version)")
-        self._session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(max_retries=self.settings.MAX_RETRIES)
-        # , pool_block=True does not work with asynchronous requests
-        self._session.mount("http://", adapter)
-        self._session.mount("https://", adapter)
+        self._session = self._create_plain_session()
         return self._session
 
     def _create_cache_session(self):
@@ -516,12 +643,67 @@ class REST(RESTbase):
 
     TIMEOUT = property(_get_timeout, _set_timeout)
 
+    def _get_circuit_breaker(self, url):
+        host = urlparse(url).netloc
+        with REST._circuit_lock:
+            if host not in REST._circuit_breakers:
+                REST._circuit_breakers[host] = CircuitBreaker(
+                    host,
+                    threshold=self.settings.CIRCUIT_THRESHOLD,
+                    reset_timeout=self.settings.CIRCUIT_RESET_TIMEOUT,
+                )
+            return REST._circuit_breakers[host]
+
+    def _get_circuit(self):
+        return self._get_circuit_breaker(self.url or "")
+
+    circuit = property(_get_circuit, doc="the :class:`CircuitBreaker` of this service's host")
+
+    def circuit_metrics(self):
+        """Returns the state and counters of the circuit breakers of all hosts
+
+        ::
+
+            >>> s = REST("test", "https://rest.uniprot.org")
+            >>> s.circuit_metrics()
+            {'rest.uniprot.org': {'host': 'rest.uniprot.org', 'state': 'closed', ...}}
+        """
+        with REST._circuit_lock:
+            breakers = list(REST._circuit_breakers.values())
+        return {breaker.host: breaker.metrics() for breaker in breakers}
+
+    def _send(self, method, url, session=None, **kargs):
+        """Send a request through the session, guarded by the host circuit breaker
+
+        :param session: the session to use (default to :attr:`session`)
+        :raises CircuitOpenError: if the circuit of the host is open
+        """
+        breaker = self._get_circuit_breaker(url)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {breaker.host}; failing fast. Retry later.")
+        try:
+            res = getattr(session or self.session, method)(url, **kargs)
+        except Exception:
+            breaker.record_failure()
+            raise
+        if getattr(res, "status_code", 200) >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return res
+
+    def _circuit_open_response(self, url, err):
+        self.logging.warning(err.value)
+        return HTTPResponseError(503, reason="Service Unavailable (circuit open)", url=url)
+
     def _process_get_request(self, url, session, frmt, data=None, **kwargs):
         try:
-            res = session.get(url, **kwargs)
+            res = self._send("get", url, session=session, **kwargs)
             self.last_response = res
             res = self._interpret_returned_request(res, frmt)
             return res
+        except CircuitOpenError as err:
+            return self._circuit_open_response(url, err)
         except Exception:
             return None
 
@@ -536,12 +718,32 @@ class REST(RESTbase):
             return HTTPResponseError(res.status_code, reason=res.reason, url=url)
         if frmt == "json":
             try:
+                # decode straight from bytes with the fastest backend available
+                return self.json_loads(res.content)
+            except Exception:
+                pass
+            try:
+                # not UTF-8 or invalid: let requests guess the encoding
                 return res.json()
             except Exception:
                 return res
         # finally
         return res.content
 
+    def json_loads(self, data):
+        """Decode a JSON document (bytes or str) using the backend set in the settings
+
+        See :mod:`bioservices.decoders`.
+        """
+        return get_json_decoder(self.settings.JSON_BACKEND)(data)
+
+    def xml_fromstring(self, data):
+        """Parse an XML document (bytes or str) using the backend set in the settings
+
+        See :mod:`bioservices.decoders`.
+        """
+        return get_xml_parser(self.settings.XML_BACKEND)(data)
+
     def _apply(self, iterable, fn, *args, **kwargs):
         return [fn(x, *args, **kwargs) for x in iterable if x is not None]
 
@@ -550,20 +752,47 @@ class REST(RESTbase):
         import grequests
 
         session = self._get_session()
-        try:
-            # build the requests
-            urls = self._get_all_urls(keys, frmt)
+        breaker = self._get_circuit()
+        urls = list(self._get_all_urls(keys, frmt))
+        reason = "Service Unavailable (circuit open)"
+        # if the circuit is not closed, the only request allowed is the probe
+        probing = breaker.state != CircuitBreaker.CLOSED
+        if not breaker.allow_request():
+            err = CircuitOpenError(f"Circuit open for {breaker.host}; failing fast. Retry later.")
+            self.logging.warning(err.value)
+            return [HTTPResponseError(503, reason=reason, url=url) for url in urls]
+
+        def send(urls):
             self.logging.debug("grequests.get processing")
-            rs = (grequests.get(url, session=session, params=params) for key, url in zip(keys, urls))
-            # execute them
+            rs = (grequests.get(url, session=session, params=params) for url in urls)
             self.logging.debug("grequests.map call")
-            ret = grequests.map(rs, size=min(self.settings.CONCURRENT, len(keys)))
-            self.last_response = ret
+            ret = grequests.map(rs, size=min(self.settings.CONCURRENT, len(urls)))
             self.logging.debug("grequests.map call done")
+            # failed requests are None (e.g. timeout) or 5xx replies
+            for res in ret:
+                if res is None or res.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
             return ret
+
+        try:
+            if probing:
+                # half-open: send the first request alone and release the
+                # others only if it closes the circuit
+                ret = send(urls[:1])
+                if breaker.state != CircuitBreaker.CLOSED:
+                    ret += [HTTPResponseError(503, reason=reason, url=url) for url in urls[1:]]
+                elif urls[1:]:
+                    ret += send(urls[1:])
+            else:
+                ret = send(urls)
+            self.last_response = ret
         except Exception as err:
-            self.logging.warning("Error caught in async. " + err.message)
+            breaker.record_failure()
+            self.logging.warning("Error caught in async. " + str(err))
             return []
+        return ret
 
     def _get_all_urls(self, keys, frmt=None):
         return ("%s/%s" % (self.url, query) for query in keys)
@@ -575,6 +804,94 @@ class REST(RESTbase):
     def get_sync(self, keys, frmt="json", **kargs):
         return [self.get_one(key, frmt=frmt, **kargs) for key in keys]
 
+    def map_concurrent(self, func, items, max_workers=None, progress=False, desc=None):
+        """Call *func* on each item using a pool of threads
+
+        Requests sent by *func* (e.g. via :meth:`http_get`) share the rate
+        limit of this instance (:attr:`requests_per_sec`), so concurrency only
+        hides the network latency.
+
+        :param func: a function with one argument
+        :param items: list of arguments
+        :param int max_workers: number of threads (default to the
+            general.max_workers setting)
+        :param bool progress: show a progress bar
+        :return: list of results in the order of *items*
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        from tqdm import tqdm
+
+        items = list(items)
+        max_workers = max_workers or self.settings.MAX_WORKERS
+        if max_workers <= 1 or len(items) <= 1:
+            return [func(item) for item in tqdm(items, desc=desc, disable=not progress)]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+            return list(tqdm(executor.map(func, items), total=len(items), desc=desc, disable=not progress))
+
+    def download(self, query, target, checksum=None, segments=1, force=False, progress=False, params=None):
+        """Download a (large) file to disk
+
+        The file is streamed into a temporary file, resumed with HTTP Range
+        requests if the transfer is interrupted and checked against the
+        checksum if provided (or sent by the server). See
+        :class:`~bioservices.download.DownloadManager` for details.
+
+        :param str query: suffix appended to :attr:`url` or a full URL (HTTP or FTP)
+        :param str target: local filename
+        :param str checksum: expected checksum as "algorithm:hexdigest"
+        :param int segments: number of parallel ranged requests for large files
+        :param bool force: download the file even if *target* exists
+        :param bool progress: show a progress bar
+        :return: the target filename
+        :raises CircuitOpenError: if the circuit of the host is (or becomes) open
+        """
+        from bioservices.download import DownloadManager
+
+        url = query if query.startswith("ftp://") else self._build_url(query)
+        # partial replies must not be stored in the cache
+        session = self._create_plain_session() if self.CACHING else self.session
+        manager = DownloadManager(
+            session=session,
+            # HTTP requests go through the circuit breaker of the host
+            send=functools.partial(self._send, session=session),
+            segments=segments,
+            max_retries=self.settings.MAX_RETRIES,
+            timeout=self.TIMEOUT,
+            progress=progress,
+        )
+        headers = {"User-Agent": self.getUserAgent()}
+        return manager.download(url, target, checksum=checksum, force=force, headers=headers, params=params)
+
+    def http_stream(self, query, params=None, method="get", **kargs):
+        """Send a request and returns the response without reading its body
+
+        The body can then be processed as it arrives (e.g. with
+        ``res.iter_content()``) instead of being held in memory. The
+        response should be closed once consumed (or used as a context
+        manager). Streamed responses are never cached.
+
+        :param str query: suffix appended to :attr:`url` or a full URL
+        :param dict params: parameters of the request
+        :param str method: get or post
+        :return: a :class:`requests.Response` (the status code is not checked)
+        """
+        self._calls()
+        url = self._build_url(query)
+        session = self._create_plain_session() if self.CACHING else self.session
+        kargs.setdefault("timeout", self.TIMEOUT)
+        headers = kargs.pop("headers", {})
+        headers.setdefault("User-Agent", self.getUserAgent())
+        return self._send(method, url, session=session, params=params, headers=headers, stream=True, **kargs)
+
+    def _create_plain_session(self):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(max_retries=self.settings.MAX_RETRIES)
+        # , pool_block=True does not work with asynchronous requests
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
     def http_get(self, query, frmt="json", params={}, **kargs):
         """
 
@@ -636,7 +953,7 @@ class REST(RESTbase):
                 kargs["auth"] = self.authentication
 
             # res = self.session.get(url, **{'timeout':self.TIMEOUT, 'params':params})
-            res = self.session.get(url, **kargs)
+            res = self._send("get", url, **kargs)
 
             self.last_response = res
             res = self._interpret_returned_request(res, frmt)
@@ -646,6 +963,8 @@ class REST(RESTbase):
             except Exception:
                 pass
             return res
+        except CircuitOpenError as err:
+            return self._circuit_open_response(url, err)
         except Exception as err:
             self.logging.critical(err)
             self.logging.critical(
@@ -692,7 +1011,7 @@ class REST(RESTbase):
             url = "%s/%s" % (self.url, query)
         self.logging.debug(url)
         try:
-            res = self.session.post(url, **kargs)
+            res = self._send("post", url, **kargs)
             self.last_response = res
             res = self._interpret_returned_request(res, frmt)
             try:
@@ -700,6 +1019,8 @@ class REST(RESTbase):
             except Exception:
                 self.logging.debug("BioServices:: Could not decode the response")
                 return res
+        except CircuitOpenError as err:
+            return self._circuit_open_response(url, err)
         except Exception:
             traceback.print_exc()
             return None
@@ -757,7 +1078,7 @@ class REST(RESTbase):
             url = "%s/%s" % (self.url, query)
         self.logging.debug(url)
         try:
-            res = self.session.delete(url, **kargs)
+            res = self._send("delete", url, **kargs)
             self.last_response = res
             res = self._interpret_returned_request(res, frmt)
             try:
@@ -765,6 +1086,8 @@ class REST(RESTbase):
             except Exception:
                 self.debug("BioServices:: Could not decode the response")
                 return res
+        except CircuitOpenError as err:
+            return self._circuit_open_response(url, err)
         except Exception as err:
             print(err)
             return None
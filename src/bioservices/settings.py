@@ -23,10 +23,36 @@ defaultParams = {
         (str),
         "email addresss that may be used in some utilities (e.g. EUtils)",
     ],
+    "user.ncbi_api_key": [
+        None,
+        (str, type(None)),
+        "NCBI API key used by EUtils (10 requests per second instead of 3)",
+    ],
     "general.timeout": [30, (int, float), ""],
     "general.max_retries": [3, int, ""],
     "general.async_concurrent": [50, int, ""],
     "general.async_threshold": [10, int, "when to switch to asynchronous requests"],
+    "general.max_workers": [4, int, "number of threads used to send concurrent requests"],
+    "general.circuit_threshold": [
+        5,
+        int,
+        "number of consecutive failures on a host before failing fast (0 to disable)",
+    ],
+    "general.circuit_reset_timeout": [
+        60,
+        (int, float),
+        "seconds to wait before probing a failing host again",
+    ],
+    "general.json_backend": [
+        "auto",
+        str,
+        "JSON decoder: auto, orjson, msgspec or json",
+    ],
+    "general.xml_backend": [
+        "auto",
+        str,
+        "XML parser: auto, lxml or etree",
+    ],
     "cache.tag_suffix": [
         "_bioservices_database",
         str,
@@ -34,6 +60,16 @@ defaultParams = {
     ],
     "cache.on": [False, bool, "CACHING on/off"],
     "cache.fast": [True, bool, "FAST_SAVE option"],
+    "cache.listings": [
+        True,
+        bool,
+        "persist database listings (e.g. KEGG organisms) in the cache directory until the next release",
+    ],
+    "cache.metadata_max_age": [
+        7,
+        int,
+        "number of days persisted service metadata (e.g. UniProt fields) is used without being downloaded again",
+    ],
     "chemspider.token": [
         None,
         (str, type(None)),
@@ -283,6 +319,22 @@ class BioServicesConfig(ConfigReadOnly):
 
     FAST_SAVE = property(_get_fast_save)
 
+    def _get_persist_listings(self):
+        return self.params["cache.listings"][0]
+
+    def _set_persist_listings(self, value):
+        self.params["cache.listings"][0] = value
+
+    PERSIST_LISTINGS = property(_get_persist_listings, _set_persist_listings)
+
+    def _get_metadata_max_age(self):
+        return self.params["cache.metadata_max_age"][0]
+
+    def _set_metadata_max_age(self, value):
+        self.params["cache.metadata_max_age"][0] = value
+
+    METADATA_MAX_AGE = property(_get_metadata_max_age, _set_metadata_max_age)
+
     def _get_async_concurrent(self):
         return self.params["general.async_concurrent"][0]
 
@@ -308,3 +360,43 @@ class BioServicesConfig(ConfigReadOnly):
         self.params["general.max_retries"][0] = max_retries
 
     MAX_RETRIES = property(_get_max_retries, _set_max_retries)
+
+    def _get_circuit_threshold(self):
+        return self.params["general.circuit_threshold"][0]
+
+    def _set_circuit_threshold(self, threshold):
+        self.params["general.circuit_threshold"][0] = threshold
+
+    CIRCUIT_THRESHOLD = property(_get_circuit_threshold, _set_circuit_threshold)
+
+    def _get_circuit_reset_timeout(self):
+        return self.params["general.circuit_reset_timeout"][0]
+
+    def _set_circuit_reset_timeout(self, timeout):
+        self.params["general.circuit_reset_timeout"][0] = timeout
+
+    CIRCUIT_RESET_TIMEOUT = property(_get_circuit_reset_timeout, _set_circuit_reset_timeout)
+
+    def _get_json_backend(self):
+        return self.params["general.json_backend"][0]
+
+    def _set_json_backend(self, backend):
+        self.params["general.json_backend"][0] = backend
+
+    JSON_BACKEND = property(_get_json_backend, _set_json_backend)
+
+    def _get_xml_backend(self):
+        return self.params["general.xml_backend"][0]
+
+    def _set_xml_backend(self, backend):
+        self.params["general.xml_backend"][0] = backend
+
+    XML_BACKEND = property(_get_xml_backend, _set_xml_backend)
+
+    def _get_max_workers(self):
+        return self.params["general.max_workers"][0]
+
+    def _set_max_workers(self, max_workers):
+        self.params["general.max_workers"][0] = max_workers
+
+    MAX_WORKERS = property(_get_max_workers, _set_max_workers)
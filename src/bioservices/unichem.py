@@ -331,9 +331,10 @@ class UniChem:
         body = json.dumps(body)
         res = self.services.http_post("api/v1/compounds", data=body, headers=self.services.get_headers("json"))
         try:  # pragma: no cover
-            res = json.loads(res)
+            res = self.services.json_loads(res)
             return res
-        except TypeError:  # pragma: no cover
+        except (TypeError, ValueError):  # pragma: no cover
+            # error status or no reply (orjson raises a ValueError subclass)
             return {}
 
     def get_connectivity(self, compound, source_type):
@@ -381,9 +382,10 @@ class UniChem:
         body = json.dumps(body)
         res = self.services.http_post("api/v1/connectivity", data=body, headers=self.services.get_headers("json"))
         try:  # pragma: no cover
-            res = json.loads(res)
+            res = self.services.json_loads(res)
             return res
-        except TypeError:  # pragma: no cover
+        except (TypeError, ValueError):  # pragma: no cover
+            # error status or no reply (orjson raises a ValueError subclass)
             return {}
 
     def get_images(self, uci, filename=None):
@@ -37,16 +37,23 @@
 .. http://www.uniprot.org/docs/pkinfam
 
 """
+import codecs
+import gzip
 import io
+import itertools
 import json
+import os
+import threading
 import time
-import urllib
+import warnings
+import zlib
+from urllib.parse import urlparse
 
 import pandas as pd
 import tqdm
 
 from bioservices import logger
-from bioservices.services import REST
+from bioservices.services import REST, BioServicesError
 
 logger.name = __name__
 
@@ -339,25 +346,130 @@ class UniProt:
     ]
     _url = "https://rest.uniprot.org"
 
-    def __init__(self, verbose=False, cache=False):
+    #: configure endpoints memoised per URL and shared by all instances (see :meth:`_get_metadata`)
+    _metadata = {}
+    _metadata_lock = threading.Lock()
+    #: layout of the persisted metadata files; files with another version are ignored
+    _metadata_version = 1
+
+    def __init__(self, verbose=False, cache=False, index=None):
         """**Constructor**
 
         :param bool verbose: set to False to prevent informative messages
         :param bool cache: set to True to cache request
+        :param index: a :class:`~bioservices.uniprotindex.UniProtIndex` or the
+            filename of its database. If set, :meth:`retrieve`, :meth:`get_fasta`
+            and :meth:`get_df` read the entries from local files whenever possible.
         """
 
         self.services = REST(name="UniProt", url=UniProt._url, verbose=verbose, cache=cache, url_defined_later=True)
 
         self.TIMEOUT = 100
         self._valid_mapping = None
+        self._mapping_pairs = set()
+        self._result_fields = {}
         self._database = "uniprot"
+        self.index = None
+        if index is not None:
+            self.use_index(index)
+
+    def use_index(self, index):
+        """Read entries from a local index of UniProt flat files
+
+        :param index: a :class:`~bioservices.uniprotindex.UniProtIndex` or the
+            filename of its database. Set to None to stop using the index.
+
+        ::
+
+            u.use_index("uniprot_index.sqlite")
+            u.index.build("uniprot_sprot.dat.gz")
+
+        Entries not found in the index are retrieved from UniProt.
+        """
+        from bioservices.uniprotindex import UniProtIndex
+
+        if index is not None and not isinstance(index, UniProtIndex):
+            index = UniProtIndex(index)
+        self.index = index
+        return index
 
     def _download_flat_files(self, output="uniprot_sprot.dat.gz"):  # pragma: no cover
-        """could be used to get all data in flat files (about compressed 500Mb )"""
-        # deprecated in v1.10 due to API change in uniprot
-        url = "ftp://ftp.ebi.ac.uk/pub/databases/uniprot/knowledgebase/uniprot_sprot.dat.gz"
+        """could be used to get all data in flat files (about compressed 500Mb )
+
+        The file can then be indexed with :meth:`UniProtIndex.build
+        <bioservices.uniprotindex.UniProtIndex.build>` (see :meth:`use_index`).
+        """
+        url = "https://ftp.uniprot.org/pub/databases/uniprot/current_release/knowledgebase/complete/" + output
         self.services.logging.info("Downloading uniprot file from the web. May take some time.:")
-        urllib.request.urlretrieve(url, output)
+        return self.services.download(url, output, progress=True)
+
+    def _metadata_filename(self, name):
+        host = urlparse(self.services.url).netloc.replace(":", "_")
+        return os.path.join(self.services.settings.user_cache_dir, "uniprot", host, name + ".json")
+
+    def _get_metadata(self, name, query):
+        """Returns the output of a configure endpoint, memoised
+
+        The output is shared by all instances and, unless the cache.listings
+        option is off, persisted in the cache directory together with the
+        UniProt release. Persisted files are used for
+        cache.metadata_max_age days. Returns None if the endpoint cannot be
+        reached (nothing is memoised then).
+        """
+        key = (self.services.url, name)
+        with UniProt._metadata_lock:
+            if key in UniProt._metadata:
+                return UniProt._metadata[key]
+
+        settings = self.services.settings
+        filename = self._metadata_filename(name)
+        data = None
+        if settings.PERSIST_LISTINGS and os.path.exists(filename):
+            if time.time() - os.path.getmtime(filename) < settings.METADATA_MAX_AGE * 86400:
+                try:
+                    with open(filename) as fin:
+                        item = json.load(fin)
+                    if item["version"] == self._metadata_version:
+                        data = item["data"]
+                except (ValueError, KeyError):
+                    logger.warning("Ignoring corrupted file {}".format(filename))
+
+        if data is None:
+            data = self.services.http_get(query, frmt="json")
+            if not isinstance(data, (dict, list)):
+                logger.warning("Could not fetch {} (status {})".format(query, data))
+                return None
+            if settings.PERSIST_LISTINGS:
+                release = self.services.last_response.headers.get("X-UniProt-Release")
+                item = {"version": self._metadata_version, "release": release, "query": query, "data": data}
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                with open(filename + ".part", "w") as fout:
+                    json.dump(item, fout)
+                os.replace(filename + ".part", filename)
+
+        with UniProt._metadata_lock:
+            UniProt._metadata[key] = data
+        return data
+
+    def clear_metadata(self):
+        """Forget the memoised and persisted metadata (fields, databases)"""
+        with UniProt._metadata_lock:
+            for key in [x for x in UniProt._metadata if x[0] == self.services.url]:
+                del UniProt._metadata[key]
+        self._valid_mapping = None
+        self._result_fields = {}
+        directory = os.path.dirname(self._metadata_filename("idmapping_fields"))
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+
+    def _get_metadata_release(self):
+        filename = self._metadata_filename("idmapping_fields")
+        if os.path.exists(filename):
+            with open(filename) as fin:
+                return json.load(fin).get("release")
+
+    metadata_release = property(_get_metadata_release, doc="UniProt release of the persisted metadata (if any)")
 
     def _get_valid_mapping(self):
         if not self._valid_mapping:
@@ -365,7 +477,9 @@ class UniProt:
         return self._valid_mapping
 
     def _set_valid_mapping(self):
-        fields = self.services.http_get("configure/idmapping/fields")
+        fields = self._get_metadata("idmapping_fields", "configure/idmapping/fields")
+        if fields is None:
+            return
         groups = fields["groups"]
         rules = {}
         for item in fields["rules"]:
@@ -382,9 +496,75 @@ class UniProt:
                 from_to[name] = tos
 
         self._valid_mapping = from_to
+        self._mapping_pairs = set((fr, to) for fr, tos in from_to.items() for to in tos)
 
     valid_mapping = property(_get_valid_mapping, _set_valid_mapping)
 
+    def _check_mapping(self, fr, to):
+        # skipped if the metadata cannot be fetched; UniProt will then reply
+        if not self.valid_mapping or (fr, to) in self._mapping_pairs:
+            return
+        if fr not in self.valid_mapping:
+            raise ValueError("{} is not a valid source database. See valid_mapping".format(fr))
+        raise ValueError("{} is not a valid target for {}. Use one of {}".format(to, fr, self.valid_mapping[fr]))
+
+    def get_result_fields(self, database="uniprotkb"):
+        """Returns the fields (columns) available in search results
+
+        :param str database: uniprotkb, uniref, uniparc...
+        :return: dictionary of field names (e.g. gene_primary) and their labels
+            (e.g. Gene Names (primary)). Empty if the metadata cannot be fetched.
+        """
+        if database not in self._result_fields:
+            data = self._get_metadata(f"result_fields_{database}", f"configure/{database}/result-fields")
+            if data is None:
+                return {}
+            self._result_fields[database] = {x["name"]: x["label"] for group in data for x in group["fields"]}
+        return self._result_fields[database]
+
+    result_fields = property(get_result_fields, doc="fields available in UniProtKB search results")
+
+    def _get_databases(self):
+        return self._get_metadata("databases", "configure/uniprotkb/allDatabases") or []
+
+    databases = property(_get_databases, doc="cross-referenced databases (name, displayName, category...)")
+
+    def _column_fields(self, columns, database="uniprotkb"):
+        """Returns the field names of *columns*, converting TSV labels (deprecated)
+
+        Column labels (e.g. "Gene Names" as in the TSV header) and legacy
+        names (see :attr:`_legacy_names`) are converted to the corresponding
+        field names (e.g. gene_names) with a DeprecationWarning.
+        """
+        fields = self.get_result_fields(database)
+        labels = {label.lower(): name for name, label in fields.items()}
+        converted = []
+        for column in columns:
+            if fields and column in fields:
+                converted.append(column)
+            elif column.lower() in labels:
+                converted.append(labels[column.lower()])
+            elif column in self._legacy_names:
+                converted.append(self._legacy_names[column])
+            else:
+                converted.append(column)
+        renamed = ["{} -> {}".format(x, y) for x, y in zip(columns, converted) if x != y]
+        if renamed:
+            warnings.warn(
+                "UniProt column labels are deprecated; use field names (see result_fields): {}".format(
+                    ", ".join(renamed)
+                ),
+                DeprecationWarning,
+                stacklevel=3,
+            )
+        return converted
+
+    def _check_columns(self, columns, database="uniprotkb"):
+        fields = self.get_result_fields(database)
+        unknown = [x for x in columns if fields and x not in fields]
+        if unknown:
+            raise ValueError("Invalid columns {} for {}. See result_fields".format(unknown, database))
+
     def _get_next_link(self, headers):
         import re
 
@@ -402,6 +582,9 @@ class UniProt:
         polling_interval_seconds=3,
         max_waiting_time=100,
         progress=True,
+        frmt="dict",
+        chunk_size=100000,
+        max_workers=None,
     ):
         """This is an interface to the UniProt mapping service
 
@@ -410,9 +593,20 @@ class UniProt:
         :param query: a string containing one or more IDs separated by a comma
             It can also be a list of strings.
         :param polling_interval_seconds: the number of seconds between each status check of the current job
-        :param max_waiting_time: the maximum number of seconds to wait for the final answer.
+        :param max_waiting_time: the maximum number of seconds to wait for the final answer
+            (of each job).
+        :param bool progress: show a progress bar (one step per job)
+        :param str frmt: 'dict' (default) or 'dataframe'
+        :param int chunk_size: maximum number of identifiers per job. Larger queries
+            are split into several jobs, submitted and polled concurrently.
+        :param int max_workers: number of jobs processed at the same time (default to
+            the general.max_workers setting)
         :return: a dictionary with two possible keys. The first one is 'results'
-            with the from / to answers and the second one 'failedIds' with Ids that were not found
+            with the from / to answers and the second one 'failedIds' with Ids that were not found.
+            With frmt='dataframe', a dataframe with two columns ('from' and 'to'); the
+            identifiers that were not found are stored in its ``attrs["failedIds"]``.
+        :raises ValueError: if **to** is not a valid target of **fr** (see
+            :attr:`valid_mapping`). The check is done before any job is submitted.
 
         ::
 
@@ -431,6 +625,13 @@ class UniProt:
 
         See :attr:`valid_mapping` attribute for list of valid mapping identifiers.
 
+        Large queries are supported: identifiers are split into jobs of
+        **chunk_size** identifiers (UniProt accepts up to 100,000 identifiers per
+        job) and the results of each job are downloaded in one go from the
+        idmapping stream endpoint (or 500 at a time if the stream is refused)::
+
+            df = u.mapping("UniProtKB_AC-ID", "KEGG", accessions, frmt="dataframe")
+
         Note that according to Uniprot (June 2022), there are various limits on ID Mapping Job Submission:
 
         ========= =====================================================================================
@@ -451,48 +652,103 @@ class UniProt:
             faster and allows queries with more than 600 entries in one go.
         .. versionchanged:: 1.10.0 new API due to  uniprot website update
         .. versionchanged:: 1.11.0 implement batch to prevent limit of 25 results.
+        .. versionchanged:: 1.16.0 large queries are split into concurrent jobs;
+            results are streamed; new frmt argument.
         """
 
-        if isinstance(query, (list, tuple)):
-            query = ",".join(query)
-        elif isinstance(query, str):
-            pass
+        if frmt not in ("dict", "dataframe"):
+            raise ValueError("frmt must be 'dict' or 'dataframe'")
+        self._check_mapping(fr, to)
+        if isinstance(query, str):
+            query = query.split(",")
+        # duplicated identifiers would be mapped several times
+        ids = list(dict.fromkeys(x.strip() for x in query if x.strip()))
+        shards = [ids[i : i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+        def run(shard):
+            return self._mapping_job(fr, to, shard, polling_interval_seconds, max_waiting_time)
 
-        # First, we call the real mapping request
-        params = {"from": fr, "to": to, "ids": query}
+        jobs = self.services.map_concurrent(run, shards, max_workers=max_workers, progress=progress, desc="mapping")
+        if any(job is None for job in jobs):
+            return
 
-        job = self.services.http_post("idmapping/run", frmt="json", data=params)
+        results = [x for job in jobs for x in job["results"]]
+        fails = [x for job in jobs for x in job["failedIds"]]
+        if frmt == "dict":
+            return {"results": results, "failedIds": fails}
+
+        df = pd.DataFrame(
+            {"from": [x["from"] for x in results], "to": [self._mapping_target(x["to"]) for x in results]}
+        )
+        df.attrs["failedIds"] = fails
+        return df
+
+    @staticmethod
+    def _mapping_target(to):
+        # mappings to UniProtKB or UniParc return whole entries
+        if isinstance(to, dict):
+            for key in ("primaryAccession", "uniParcId", "id"):
+                if key in to:
+                    return to[key]
+        return to
+
+    def _mapping_job(self, fr, to, ids, polling_interval_seconds, max_waiting_time):
+        """Submit one mapping job, wait for it and returns its results and failedIds"""
+        job = self.services.http_post("idmapping/run", frmt="json", data={"from": fr, "to": to, "ids": ",".join(ids)})
         try:
             job_id = job["jobId"]
         except TypeError:
-            logger.error(self.services.last_response.content.decode())
+            logger.error("Mapping job could not be submitted (status {})".format(job))
             return
 
-        # the job id will tell us about the job status
-        results = None
         waiting_time = 0
-        while not results and waiting_time < max_waiting_time:
-            logger.info("Waiting for {job_id} to complete")
-            results = self.services.http_get(f"idmapping/status/{job_id}", frmt="json")
-
-            # once ready, we can process the data
-            if results != 500 and "results" in results:
-                total = int(self.services.last_response.headers["X-Total-Results"])
-                batches = results["results"]
-                fails = results.get("failedIds", [])
-
-                size = 25
-                for x in tqdm.tqdm(range(size, total, size), disable=not progress):
-                    link = self._get_next_link(self.services.last_response.headers)
-                    batch = self.services.http_get(link, frmt="json")
-                    batches += batch["results"]
-                    fails += results.get("failedIds", [])
-                return {"results": batches, "failedIds": fails}
-
-            else:  # pragma: no cover
-                time.sleep(polling_interval_seconds)
-                results = None
+        url = None
+        while waiting_time < max_waiting_time:
+            logger.info(f"Waiting for {job_id} to complete")
+            with self.services.http_stream(f"idmapping/status/{job_id}", allow_redirects=False) as res:
+                if res.status_code in (301, 302, 303):
+                    url = res.headers["Location"]
+                    break
+                if res.status_code == 200:
+                    data = self.services.json_loads(res.content)
+                else:
+                    # busy server: poll again later
+                    data = {"jobStatus": "RUNNING" if res.status_code in (429, 500, 502, 503, 504) else "ERROR"}
+            if "results" in data or data.get("jobStatus") == "FINISHED":
+                url = f"idmapping/results/{job_id}"
+                break
+            if data.get("jobStatus") not in ("NEW", "RUNNING"):
+                logger.error("Mapping job {} failed: {}".format(job_id, data))
+                return
+            time.sleep(polling_interval_seconds)
             waiting_time += polling_interval_seconds
+        if url is None:
+            logger.error("Mapping job {} did not complete within {} seconds".format(job_id, max_waiting_time))
+            return
+        return self._mapping_results(url)
+
+    def _mapping_results(self, url):
+        # the stream endpoint returns all results at once; if refused (too
+        # many results), fetch the pages of 500 results (the maximum)
+        with self.services.http_stream(url.replace("/results/", "/results/stream/")) as res:
+            if res.status_code == 200:
+                data = self.services.json_loads(res.content)
+                return {"results": data["results"], "failedIds": data.get("failedIds", [])}
+            logger.warning("Mapping stream refused (status {}). Using pagination".format(res.status_code))
+
+        results, fails = [], {}
+        params = {"size": 500}
+        while url:
+            with self.services.http_stream(url, params=params) as res:
+                if res.status_code != 200:
+                    logger.error("Could not fetch mapping results (status {})".format(res.status_code))
+                    return
+                data = self.services.json_loads(res.content)
+                url = self._get_next_link(res.headers)
+            results += data["results"]
+            fails.update(dict.fromkeys(data.get("failedIds", [])))
+            params = None
+        return {"results": results, "failedIds": list(fails)}
 
     def retrieve(self, uniprot_id, frmt="json", database="uniprot", include=False):
         """Search for a uniprot ID in UniProtKB database
@@ -517,6 +773,9 @@ class UniProt:
             interpreted anymore. The RDF has now an additional option to include data
             from referenced data sets directly in the returned data (set include=True parameter).
             Default output format is now set to json.
+
+        If a local index is used (see :meth:`use_index`), txt and fasta records are
+        read from the indexed files; other entries are retrieved from UniProt.
         """
         if database == "uniprot":
             if frmt not in ("txt", "xml", "rdf", "gff", "fasta", "json"):  # pragma: no cover
@@ -538,15 +797,25 @@ class UniProt:
         else:
             queries = uniprot_id
 
+        local = {}
+        if self.index is not None and database == "uniprot" and frmt in ("txt", "fasta"):
+            local = self.index.get_many(queries, frmt)
+            if len(local) == len(queries):
+                res = [local[query] for query in queries]
+                return res[0] if len(res) == 1 else res
+
         # some magic here not documented on uniprot website...but multiple queries are possible
-        url = [database + "/" + query + "." + frmt for query in queries]
+        url = [database + "/" + query + "." + frmt for query in queries if query not in local]
 
         # the frmt=txt here is for the requests, nothing related to the uniprot format
         res = self.services.http_get(url, frmt="txt", params={"include": include})
+        if local:
+            remote = iter(res)
+            res = [local[query] if query in local else next(remote) for query in queries]
         if frmt == "json":
             for i, x in enumerate(res):
                 try:
-                    res[i] = json.loads(x)
+                    res[i] = self.services.json_loads(x)
                 except Exception:
                     pass
 
@@ -661,34 +930,9 @@ class UniProt:
             * add progress bar option (True by default)
             * drop frmt in : rdf, obo, xml, html
 
+        .. seealso:: :meth:`iter_search` to process large results page by page.
         """
-        params = {}
-
-        if frmt is not None:
-            _valid_formats = [
-                "xlsx",
-                "fasta",
-                "json",
-                "gff",
-                "tsv",
-            ]
-            self.services.devtools.check_param_in_list(frmt, _valid_formats)
-            params["format"] = frmt
-
-        if columns is not None:
-            self.services.devtools.check_param_in_list(frmt, ["tsv", "xls"])
-
-            # remove unneeded spaces before/after commas if any
-            if "," in columns:
-                columns = [x.strip() for x in columns.split(",")]
-            else:
-                columns = [columns]
-
-            # convert back to a string as expected by uniprot
-            params["fields"] = ",".join([x.strip() for x in columns])
-
-        if include_isoforms is True and frmt in ["fasta", "rdf"]:
-            params["includeIsoform"] = "yes"
+        params = self._search_params(query, frmt, columns, include_isoforms)
 
         if compress is True:
             params["compressed"] = "true"
@@ -707,21 +951,17 @@ class UniProt:
             if isinstance(size, int):
                 params["size"] = limit
 
-        # + are interpreted and have a meaning. See arrayexpress module for details
-        query = query.replace("+", " ")
-        params["query"] = query
         params.pop("sort", None)
 
-        res = self.services.http_get(f"{database}/search", frmt="txt", params=params)
+        # JSON pages are decoded straight from bytes by the REST layer
+        frmt_request = "json" if frmt == "json" else "txt"
+        res = self.services.http_get(f"{database}/search", frmt=frmt_request, params=params)
 
-        # concatenate by removing intermediate header
-        if frmt in ["tsv"]:
-            batches = res
-        # concatenate
-        elif frmt in ["fasta", "gff"]:
-            batches = res
+        # pages are stored in a list and concatenated once at the end
+        if frmt in ["tsv", "fasta", "gff"]:
+            batches = [res]
         elif frmt in ["json"]:
-            batches = json.loads(res)
+            batches = res
         else:
             batches = [res]
 
@@ -737,25 +977,350 @@ class UniProt:
         # start after first chunk since we already called the general search once
         for x in tqdm.tqdm(range(size, total, size), disable=not progress):
             link = self._get_next_link(self.services.last_response.headers)
-            batch = self.services.http_get(link, frmt="txt")
+            batch = self.services.http_get(link, frmt=frmt_request)
 
             # drop the header for tsv
             if frmt in ["tsv"]:
-                batch = batch.split("\n")[1:]
-                batches += "\n".join(batch)
-            elif frmt in ["fasta", "gff"]:
-                batches += batch
+                batches.append(batch.split("\n", 1)[1] if "\n" in batch else "")
             elif frmt in ["json"]:
-                batches["results"].extend(json.loads(batch)["results"])
+                batches["results"].extend(batch["results"])
             else:
-                batches += [batch]
+                batches.append(batch)
 
         if frmt in ["tsv"]:
             # remove last empty line
-            batches = batches.strip()
+            batches = "".join(batches).strip()
+        elif frmt in ["fasta", "gff"]:
+            batches = "".join(batches)
 
         return batches
 
+    def _search_params(self, query, frmt, columns=None, include_isoforms=False):
+        # parameters shared by search, iter_search and the stream endpoint
+        params = {}
+
+        if frmt is not None:
+            _valid_formats = [
+                "xlsx",
+                "fasta",
+                "json",
+                "gff",
+                "tsv",
+            ]
+            self.services.devtools.check_param_in_list(frmt, _valid_formats)
+            params["format"] = frmt
+
+        if columns is not None:
+            self.services.devtools.check_param_in_list(frmt, ["tsv", "xls"])
+
+            # remove unneeded spaces before/after commas if any
+            if "," in columns:
+                columns = [x.strip() for x in columns.split(",")]
+            else:
+                columns = [columns]
+
+            # convert back to a string as expected by uniprot
+            params["fields"] = ",".join([x.strip() for x in columns])
+
+        if include_isoforms is True and frmt in ["fasta", "rdf"]:
+            params["includeIsoform"] = "yes"
+
+        # + are interpreted and have a meaning. See arrayexpress module for details
+        params["query"] = query.replace("+", " ")
+        return params
+
+    @staticmethod
+    def _iter_records(lines, frmt):
+        # group lines (without end of line) into records: one line per
+        # record for tsv and gff, one entry (with its sequence) for fasta
+        if frmt == "fasta":
+            record = []
+            for line in lines:
+                if line.startswith(">") and record:
+                    yield "\n".join(record) + "\n"
+                    record = []
+                if line:
+                    record.append(line)
+            if record:
+                yield "\n".join(record) + "\n"
+        else:
+            for line in lines:
+                if line:
+                    yield line
+
+    def iter_search(
+        self,
+        query,
+        frmt="tsv",
+        columns=None,
+        include_isoforms=False,
+        limit=None,
+        size=500,
+        database="uniprotkb",
+        progress=False,
+    ):
+        """Iterate over the results of a search, page by page
+
+        Same as :meth:`search` except that results are yielded as they are
+        downloaded so that large results (e.g. all of Swiss-Prot) can be
+        processed in constant memory.
+
+        :param str query: a valid uniprot query (see :meth:`search`)
+        :param str frmt: tsv, fasta, gff or json
+        :param str columns: comma-separated list of columns (tsv only)
+        :param bool include_isoforms: include isoform sequences (fasta only)
+        :param int limit: stop after this number of records
+        :param int size: number of records per page (500 is the maximum
+            allowed by UniProt)
+        :param str database: uniprotkb, uniref, uniparc...
+        :param bool progress: show a progress bar
+        :return: a generator. For tsv, the header line and then one line per
+            record (without end of line); for gff, one line per record; for
+            fasta, one record (header and sequence) at a time; for json, one
+            dictionary per record.
+        :raises BioServicesError: if a page cannot be retrieved
+
+        ::
+
+            >>> for row in u.iter_search("reviewed:true", columns="accession,length"):
+            ...     accession, length = row.split("\t")
+
+        """
+        if frmt == "xlsx":
+            raise ValueError("xlsx is not supported by iter_search. Use tsv, fasta, gff or json")
+        params = self._search_params(query, frmt, columns, include_isoforms)
+        params["size"] = size
+        frmt_request = "json" if frmt == "json" else "txt"
+
+        url = f"{database}/search"
+        count = 0
+        header = frmt == "tsv"
+        pbar = tqdm.tqdm(total=limit, disable=not progress)
+        try:
+            while url:
+                page = self.services.http_get(url, frmt=frmt_request, params=params)
+                if not isinstance(page, (str, dict)):
+                    # do not end the generator as if all results were yielded
+                    failed = getattr(page, "url", "") or url
+                    raise BioServicesError(
+                        "UniProt search failed after {} records ({}): {}".format(count, page, failed)
+                    )
+                if frmt == "json":
+                    records = page["results"]
+                else:
+                    lines = page.split("\n")
+                    if frmt == "tsv":
+                        if header:
+                            yield lines[0]
+                            header = False
+                        lines = lines[1:]
+                    records = self._iter_records(lines, frmt)
+
+                if pbar.total is None:
+                    pbar.total = int(self.services.last_response.headers.get("X-Total-Results", 0)) or None
+                for record in records:
+                    yield record
+                    count += 1
+                    pbar.update(1)
+                    if limit is not None and count >= limit:
+                        return
+
+                # the next link contains all parameters
+                url = self._get_next_link(self.services.last_response.headers)
+                params = {}
+        finally:
+            pbar.close()
+
+    def _open_stream(self, database, params):
+        # returns the streamed response or None if the query was refused
+        try:
+            res = self.services.http_stream(f"{database}/stream", params=params)
+        except Exception as err:
+            self.services.logging.warning("UniProt stream failed ({}).".format(err))
+            return None
+        if res.status_code != 200:
+            self.services.logging.warning(
+                "UniProt stream refused the query (status {}): {}".format(res.status_code, res.text[:200])
+            )
+            res.close()
+            return None
+        return res
+
+    @staticmethod
+    def _iter_stream_bytes(res, progress=False):
+        with res, tqdm.tqdm(unit="B", unit_scale=True, disable=not progress) as pbar:
+            for chunk in res.iter_content(chunk_size=1 << 16):
+                pbar.update(len(chunk))
+                yield chunk
+
+    @staticmethod
+    def _iter_stream_text(chunks):
+        # decompress (if gzipped) and decode incrementally
+        decompressor = None
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        first = True
+        for chunk in chunks:
+            if first:
+                if chunk[:2] == b"\x1f\x8b":
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                first = False
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decompressor.flush() if decompressor is not None else b""
+        text = decoder.decode(tail, final=True)
+        if text:
+            yield text
+
+    @staticmethod
+    def _iter_lines(chunks):
+        buffer = ""
+        for text in chunks:
+            buffer += text
+            lines = buffer.split("\n")
+            buffer = lines.pop()
+            yield from lines
+        if buffer:
+            yield buffer
+
+    def iter_stream(
+        self,
+        query,
+        frmt="tsv",
+        columns=None,
+        include_isoforms=False,
+        database="uniprotkb",
+        compressed=True,
+        progress=False,
+    ):
+        """Iterate over all results of a query using the UniProt stream endpoint
+
+        All results are sent in a single (gzip compressed) response, which is
+        decompressed and split into records as it arrives. If UniProt refuses
+        the query (too many results), the results are fetched page by page
+        with :meth:`iter_search` instead.
+
+        :param str query: a valid uniprot query (see :meth:`search`)
+        :param str frmt: tsv, fasta, gff or json. With json, the whole
+            document is decoded before records are yielded.
+        :param str columns: comma-separated list of columns (tsv only)
+        :param bool include_isoforms: include isoform sequences (fasta only)
+        :param str database: uniprotkb, uniref, uniparc...
+        :param bool compressed: request a gzip compressed transfer
+        :param bool progress: show a progress bar
+        :return: a generator of records (see :meth:`iter_search`)
+
+        .. seealso:: :meth:`export` to save the results into a file.
+        """
+        params = self._search_params(query, frmt, columns, include_isoforms)
+        if compressed:
+            params["compressed"] = "true"
+        res = self._open_stream(database, params)
+        if res is None:
+            self.services.logging.info("Falling back to paginated search")
+            yield from self.iter_search(
+                query,
+                frmt=frmt,
+                columns=columns,
+                include_isoforms=include_isoforms,
+                database=database,
+                progress=progress,
+            )
+            return
+
+        chunks = self._iter_stream_text(self._iter_stream_bytes(res, progress=progress))
+        if frmt == "json":
+            yield from self.services.json_loads("".join(chunks))["results"]
+        else:
+            yield from self._iter_records(self._iter_lines(chunks), frmt)
+
+    def export(
+        self,
+        query,
+        filename,
+        frmt="tsv",
+        columns=None,
+        include_isoforms=False,
+        database="uniprotkb",
+        compressed=True,
+        progress=False,
+    ):
+        """Save all results of a query into a file using the UniProt stream endpoint
+
+        Same as :meth:`iter_stream` but results are written into a file as
+        they arrive. If *filename* ends with .gz, the compressed transfer is
+        saved as is; otherwise it is decompressed on the fly. If UniProt
+        refuses the query (too many results), results are fetched page by
+        page (:meth:`iter_search`) and written the same way.
+
+        :param str query: a valid uniprot query (see :meth:`search`)
+        :param str filename: the output file (e.g. sprot.fasta.gz)
+        :return: the filename
+        :raises BioServicesError: if a page of the paginated search cannot be
+            retrieved. Results are written into *filename*.part, which is
+            renamed only once all results are saved (and removed on error).
+
+        ::
+
+            >>> u.export("reviewed:true", "sprot.fasta.gz", frmt="fasta")
+
+        """
+        params = self._search_params(query, frmt, columns, include_isoforms)
+        if compressed:
+            params["compressed"] = "true"
+        gzipped = filename.endswith(".gz")
+        part = filename + ".part"
+
+        res = self._open_stream(database, params)
+        try:
+            if res is not None:
+                self._export_stream(res, part, gzipped, progress)
+            else:
+                self.services.logging.info("Falling back to paginated search")
+                records = self.iter_search(
+                    query,
+                    frmt=frmt,
+                    columns=columns,
+                    include_isoforms=include_isoforms,
+                    database=database,
+                    progress=progress,
+                )
+                self._export_records(records, part, gzipped, frmt)
+        except BaseException:
+            # a partial export is never published under the final name
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        os.replace(part, filename)
+        return filename
+
+    def _export_stream(self, res, part, gzipped, progress):
+        chunks = self._iter_stream_bytes(res, progress=progress)
+        first = next(chunks, b"")
+        chunks = itertools.chain([first], chunks)
+        if gzipped and first[:2] == b"\x1f\x8b":
+            with open(part, "wb") as fout:
+                for chunk in chunks:
+                    fout.write(chunk)
+        else:
+            with gzip.open(part, "wt") if gzipped else open(part, "w") as fout:
+                for text in self._iter_stream_text(chunks):
+                    fout.write(text)
+
+    @staticmethod
+    def _export_records(records, part, gzipped, frmt):
+        with gzip.open(part, "wt") if gzipped else open(part, "w") as fout:
+            if frmt == "json":
+                fout.write('{"results": [')
+                for i, record in enumerate(records):
+                    fout.write(("," if i else "") + json.dumps(record))
+                fout.write("]}")
+            else:
+                for record in records:
+                    fout.write(record if frmt == "fasta" else record + "\n")
+
     def quick_search(self, query, limit=1):
         """a specialised version of :meth:`search`
 
@@ -809,15 +1374,46 @@ class UniProt:
         res = self.services.http_get(f"uniref/UniRef90_{query}.json", frmt="json")
         return res
 
-    def get_df(self, entries, nChunk=100, organism=None, limit=10, columns=None, progress=False):
+    #: dtypes of the numeric columns returned by :meth:`get_df` (other columns are strings)
+    _df_dtypes = {"Length": "Int64", "Mass": "Int64", "Entry version": "Int64", "Sequence version": "Int64"}
+    #: columns with few distinct values stored as categories by :meth:`get_df`
+    _df_categories = ["Reviewed", "Organism", "Organism (ID)", "Protein existence"]
+
+    def get_df(
+        self,
+        entries,
+        nChunk=100,
+        organism=None,
+        limit=10,
+        columns=None,
+        progress=False,
+        max_workers=None,
+        parquet=None,
+    ):
         """Given a list of uniprot entries, returns a dataframe with all possible columns
 
-        :param entries: list of valid entry name. if list is too large (about
-            >200), you need to split the list
+        :param entries: list of valid entry name. Entries are queried by chunks
+            that are processed concurrently.
         :param int nChunk: queries are processed by chunks of this size
-        :param limit: limit number of entries per identifier to 10. You can
-            set it to None to keep all entries but this will be very slow
-        :return: dataframe with indices being the uniprot id (e.g. DIG1_YEAST)
+        :param limit: maximum number of entries returned per identifier on
+            average: each chunk returns at most *limit* times the number of
+            identifiers in the chunk (an identifier with many hits may take
+            the share of others). Set it to None to keep all entries but this
+            will be very slow
+        :param columns: list (or comma-separated string) of UniProt fields (see
+            :attr:`_valid_columns`). Only those columns are downloaded. Default
+            to all valid columns. Column labels as found in the TSV header
+            (e.g. "Gene Names") are still accepted but deprecated: they are
+            converted to field names (e.g. gene_names) with a DeprecationWarning.
+        :param bool progress: show a progress bar (one step per chunk)
+        :param int max_workers: number of chunks fetched at the same time
+            (default to the general.max_workers setting)
+        :param str parquet: if provided, chunks are written to this Parquet
+            file as they arrive (requires pyarrow) instead of being kept in memory.
+        :return: dataframe with one row per UniProt entry (or the Parquet
+            filename if **parquet** is set)
+        :raises BioServicesError: if the results of a chunk cannot be
+            retrieved (instead of returning a dataframe missing those rows)
 
         To get about 100 columns related to the accession P62988, type::
 
@@ -827,52 +1423,125 @@ class UniProt:
 
             df = u.get_df('sec_acc:P62988')
 
+        Only the requested columns are downloaded::
+
+            df = u.get_df(accessions, columns="accession,gene_primary,length")
+
+        Numeric columns (e.g. Length) are integers, low-cardinality columns
+        (e.g. Organism) are categories and other columns are strings.
 
+        If a local index is used (see :meth:`use_index`) and all columns are
+        available in the indexed files (see :attr:`UniProtIndex.labels
+        <bioservices.uniprotindex.UniProtIndex.labels>`), the entries found
+        in the index are not sent to UniProt.
+
+        .. versionchanged:: 1.16.0 chunks are fetched concurrently, only the
+            requested columns are downloaded; new parquet argument. *columns*
+            takes UniProt field names (e.g. accession,gene_names,length)
+            instead of column labels (Entry,Gene Names,Length), which are
+            deprecated.
         """
         if isinstance(entries, str):
             entries = [entries]
         else:
-            entries = list(set(entries))
-        output = pd.DataFrame()
+            entries = list(dict.fromkeys(entries))
+        fields = self.result_fields
+        if columns is None:
+            # columns not available anymore are ignored
+            columns = [x for x in self._valid_columns if not fields or x in fields]
+        else:
+            if isinstance(columns, str):
+                columns = [x.strip() for x in columns.split(",")]
+            columns = self._column_fields(columns)
+        self._check_columns(columns)
+        columns = ",".join(columns)
 
         self.services.logging.info("fetching information from uniprot for {} entries".format(len(entries)))
-
-        nChunk = min(nChunk, len(entries))
-        N, rest = divmod(len(entries), nChunk)
-        for i in range(0, N + 1):
-            this_entries = entries[i * nChunk : (i + 1) * nChunk]
-            if len(this_entries):
-                self.services.logging.info("uniprot.get_df {}/{}".format(i + 1, N))
-                query = "+OR+".join(this_entries)
-                if organism:
-                    query += f"+AND+{organism}"
-
-                res = self.search(
-                    query, frmt="tsv", columns=",".join(self._valid_columns), limit=limit, progress=progress
-                )
-            else:
-                break
-
-            if res is None or len(res) == 0:
-                self.services.logging.warning("some entries %s not found" % entries)
-            else:
-                df = pd.read_csv(io.StringIO(str(res)), sep="\t")
-
-                if isinstance(output, type(None)):
-                    output = df.copy()
-                else:
-                    # output = output.append(df, ignore_index=True)
-                    output = pd.concat([output, df], ignore_index=True)
-
+        chunks = [entries[i : i + nChunk] for i in range(0, len(entries), nChunk)]
+
+        # entries found in the local index are not sent to UniProt
+        local = self.index is not None and organism is None and set(columns.split(",")) <= set(self.index.labels)
+
+        def fetch(chunk):
+            frames = []
+            if local:
+                found = self.index.get_fields(chunk)
+                if found:
+                    df = pd.DataFrame([found[x] for x in chunk if x in found], columns=columns.split(","))
+                    df.columns = [self.index.labels[x] for x in df.columns]
+                    frames.append(df.astype({x: self._df_dtypes.get(x, str) for x in df.columns}))
+                    chunk = [x for x in chunk if x not in found]
+            if chunk:
+                frames.append(self._fetch_df(chunk, organism, columns, limit))
+            frames = [df for df in frames if df is not None]
+            return pd.concat(frames, ignore_index=True) if frames else None
+
+        if parquet:
+            return self._get_df_parquet(fetch, chunks, parquet, progress, max_workers)
+
+        frames = self.services.map_concurrent(fetch, chunks, max_workers=max_workers, progress=progress)
+        frames = [df for df in frames if df is not None]
+        if not frames:
+            return pd.DataFrame()
+
+        # a single concatenation (instead of one per chunk)
+        output = pd.concat(frames, ignore_index=True)
         # you may end up with duplicated...
-        output.drop_duplicates(inplace=True)
-        # Sequences are splitted into chunks of 10 characters. let us remove
-        # the spaces:
-        if "sequence" in output.columns:
-            output["sequence"].fillna("", inplace=True)
-            output.Sequence = output["sequence"].apply(lambda x: x.replace(" ", ""))
+        output = output.drop_duplicates(ignore_index=True)
+        for name in self._df_categories:
+            if name in output.columns:
+                output[name] = output[name].astype("category")
+        return output
 
-        if columns:
-            output = output[columns.split(",")]
+    def _fetch_df(self, chunk, organism, columns, limit):
+        query = " OR ".join(chunk)
+        if organism:
+            query = f"({query}) AND {organism}"
+        lines = self.iter_search(query, frmt="tsv", columns=columns, limit=limit and limit * len(chunk), size=500)
+        try:
+            text = "\n".join(lines)
+        except BioServicesError as err:
+            # do not build a dataframe missing the rows of a failed page
+            raise BioServicesError(
+                "Could not fetch the chunk of {} entries starting with {}: {}".format(len(chunk), chunk[0], err.value)
+            )
+        if text.count("\n") == 0:
+            self.services.logging.warning("entries not found: {}".format(chunk))
+            return None
+        header = text.split("\n", 1)[0].split("\t")
+        dtypes = {x: self._df_dtypes.get(x, str) for x in header}
+        df = pd.read_csv(io.StringIO(text), sep="\t", dtype=dtypes)
+        if "Sequence" in df.columns:
+            df["Sequence"] = df["Sequence"].str.replace(" ", "", regex=False)
+        return df
+
+    def _get_df_parquet(self, fetch, chunks, filename, progress, max_workers):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("get_df(parquet=...) requires pyarrow. Install it with: pip install pyarrow")
+
+        state = {"writer": None}
+        lock = threading.Lock()
+
+        def write(chunk):
+            df = fetch(chunk)
+            if df is None:
+                return 0
+            with lock:
+                if state["writer"] is None:
+                    # the same schema for all chunks even if a column is empty in one of them
+                    types = {x: pa.int64() if x in self._df_dtypes else pa.string() for x in df.columns}
+                    state["schema"] = pa.schema([(x, types[x]) for x in df.columns])
+                    state["writer"] = pq.ParquetWriter(filename, state["schema"])
+                table = pa.Table.from_pandas(df, schema=state["schema"], preserve_index=False)
+                state["writer"].write_table(table)
+            return len(df)
 
-        return output
+        try:
+            self.services.map_concurrent(write, chunks, max_workers=max_workers, progress=progress)
+        finally:
+            if state["writer"] is not None:
+                state["writer"].close()
+        return filename
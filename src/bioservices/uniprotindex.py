@@ -0,0 +1,360 @@
+#
+#  This file is part of bioservices software
+#
+#  Distributed under the GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  website: https://github.com/cokelaer/bioservices
+#  documentation: http://bioservices.readthedocs.io
+#
+##############################################################################
+"""Local index of UniProt flat files (Swiss-Prot, TrEMBL)
+
+UniProt releases are available as flat files (uniprot_sprot.dat.gz) and
+FASTA files (uniprot_sprot.fasta.gz). The :class:`UniProtIndex` parses such a
+dump once and stores, for each accession (primary and secondary) and entry
+name, the position of its record in the file. Records are then read with a
+memory map so that :meth:`UniProt.retrieve`, :meth:`UniProt.get_fasta` and
+:meth:`UniProt.get_df` can be answered locally::
+
+    from bioservices import UniProt
+    u = UniProt(index="uniprot_index.sqlite")
+    u.index.build("uniprot_sprot.dat.gz")
+    u.index.build("uniprot_sprot.fasta.gz")
+
+    u.retrieve("P43403", frmt="txt")      # read from the local file
+    u.get_fasta("P43403")                  # same
+    u.retrieve("Q00000", frmt="txt")      # not in the index: sent to UniProt
+
+Compressed dumps are decompressed next to the index while being parsed
+(random access in gzip files is not possible). The index can also be built
+from the command line::
+
+    bioservices uniprot-index build uniprot_sprot.dat.gz
+
+"""
+import contextlib
+import datetime
+import gzip
+import mmap
+import os
+import re
+import sqlite3
+import threading
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+
+__all__ = ["UniProtIndex"]
+
+
+class UniProtIndex:
+    """Index of UniProt records (accession to position in a flat or FASTA file)
+
+    :param str filename: the SQLite database. Defaults to *uniprot_index.sqlite*
+        in the bioservices configuration directory.
+
+    Each key (accession, secondary accession or entry name) is stored once per
+    format: *txt* for flat files and *fasta* for FASTA files.
+    """
+
+    #: fields that can be extracted from the records and their label in UniProt TSV outputs.
+    #: Protein names are not included: UniProt joins all names (RecName, EC
+    #: numbers, AltNames, Contains...) while FASTA headers only give the first one.
+    labels = {
+        "accession": "Entry",
+        "id": "Entry Name",
+        "reviewed": "Reviewed",
+        "gene_primary": "Gene Names (primary)",
+        "organism_name": "Organism",
+        "organism_id": "Organism (ID)",
+        "length": "Length",
+        "sequence": "Sequence",
+    }
+
+    #: number of keys inserted at once when building the index
+    batch_size = 100000
+
+    def __init__(self, filename=None):
+        if filename is None:
+            from bioservices import bspath
+
+            filename = os.path.join(bspath, "uniprot_index.sqlite")
+        self.filename = filename
+        self._maps = {}
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY, path TEXT, format TEXT, source TEXT, built TEXT, size INTEGER);
+                CREATE TABLE IF NOT EXISTS keys (
+                    key TEXT, format TEXT, file INTEGER, offset INTEGER, length INTEGER,
+                    PRIMARY KEY (key, format));
+                """
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # a sqlite3 connection used as a context manager commits (or rolls
+        # back) the transaction but is not closed
+        conn = sqlite3.connect(self.filename, check_same_thread=False)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def __repr__(self):
+        return "UniProtIndex({}, {} files, {} keys)".format(self.filename, len(self.files), len(self))
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+
+    def __contains__(self, key):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM keys WHERE key=?", (key,)).fetchone() is not None
+
+    def _get_files(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, path, format, source, built, size FROM files").fetchall()
+        keys = ["id", "path", "format", "source", "built", "size"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    files = property(_get_files, doc="list of files indexed")
+
+    def _get_formats(self):
+        return sorted(set(x["format"] for x in self.files))
+
+    formats = property(_get_formats, doc="formats available (txt and/or fasta)")
+
+    # ------------------------------------------------------------------ #
+    # Building                                                            #
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def _guess_format(source):
+        name = source[:-3] if source.endswith(".gz") else source
+        if name.endswith((".fasta", ".fa", ".faa")):
+            return "fasta"
+        elif name.endswith((".dat", ".txt")):
+            return "txt"
+        raise ValueError("Cannot guess the format of {}. Use frmt='txt' or frmt='fasta'".format(source))
+
+    def build(self, source, frmt=None, data=None):
+        """Parse a flat (.dat) or FASTA file and index its records
+
+        :param str source: a UniProt flat file or FASTA file, possibly gzipped
+        :param str frmt: 'txt' (flat file) or 'fasta'. Guessed from the
+            extension if not provided.
+        :param str data: where to store the decompressed records if *source*
+            is gzipped. Default to the source name without .gz in the
+            directory of the index.
+        :return: number of records indexed
+
+        Indexing a file again replaces its previous keys.
+        """
+        frmt = frmt or self._guess_format(source)
+        if frmt not in ("txt", "fasta"):
+            raise ValueError("frmt must be 'txt' or 'fasta'")
+
+        path = os.path.abspath(source)
+        if source.endswith(".gz"):
+            if data is None:
+                directory = os.path.dirname(os.path.abspath(self.filename))
+                data = os.path.join(directory, os.path.basename(source)[:-3])
+            path = os.path.abspath(data)
+
+        with self._connect() as conn:
+            previous = conn.execute("SELECT id FROM files WHERE path=?", (path,)).fetchone()
+            if previous:
+                conn.execute("DELETE FROM keys WHERE file=?", previous)
+                conn.execute("DELETE FROM files WHERE id=?", previous)
+            file_id = conn.execute(
+                "INSERT INTO files (path, format, source) VALUES (?, ?, ?)", (path, frmt, os.path.abspath(source))
+            ).lastrowid
+        self._close_map(path)
+
+        logger.info("Indexing {} ({})".format(source, frmt))
+        if source.endswith(".gz"):
+            with gzip.open(source, "rb") as fin, open(path + ".part", "wb") as fout:
+                count = self._index(self._copy_lines(fin, fout), frmt, file_id)
+            os.replace(path + ".part", path)
+        else:
+            with open(source, "rb") as fin:
+                count = self._index(fin, frmt, file_id)
+
+        built = datetime.datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute("UPDATE files SET built=?, size=? WHERE id=?", (built, count, file_id))
+        return count
+
+    @staticmethod
+    def _copy_lines(fin, fout):
+        for line in fin:
+            fout.write(line)
+            yield line
+
+    def _index(self, lines, frmt, file_id):
+        records = self._iter_flat(lines) if frmt == "txt" else self._iter_fasta(lines)
+        count = 0
+        batch = []
+        with self._connect() as conn:
+            for keys, offset, length in records:
+                batch += [(key, frmt, file_id, offset, length) for key in keys]
+                count += 1
+                if len(batch) >= self.batch_size:
+                    conn.executemany("INSERT OR IGNORE INTO keys VALUES (?, ?, ?, ?, ?)", batch)
+                    batch = []
+            conn.executemany("INSERT OR IGNORE INTO keys VALUES (?, ?, ?, ?, ?)", batch)
+        logger.info("{} records indexed".format(count))
+        return count
+
+    @staticmethod
+    def _iter_flat(lines):
+        # yields (keys, offset, length); primary accession first
+        offset = 0
+        start = None
+        keys = []
+        for line in lines:
+            if line.startswith(b"ID   "):
+                start = offset
+                keys = [line.split()[1].decode()]
+            elif line.startswith(b"AC   "):
+                keys += [x.strip() for x in line[5:].decode().split(";") if x.strip()]
+            elif line.startswith(b"//") and start is not None:
+                # primary accession first, then secondary accessions and entry name
+                yield keys[1:] + keys[:1], start, offset + len(line) - start
+                start = None
+            offset += len(line)
+
+    @staticmethod
+    def _iter_fasta(lines):
+        offset = 0
+        start = None
+        keys = []
+        for line in lines:
+            if line.startswith(b">"):
+                if start is not None:
+                    yield keys, start, offset - start
+                start = offset
+                name = line[1:].split(None, 1)[0].decode()
+                # >sp|P12345|NAME_HUMAN; other headers (e.g. UniRef) are indexed on their first word
+                keys = name.split("|")[1:3] if name.count("|") == 2 else [name]
+            offset += len(line)
+        if start is not None:
+            yield keys, start, offset - start
+
+    # ------------------------------------------------------------------ #
+    # Lookups                                                             #
+    # ------------------------------------------------------------------ #
+
+    def _close_map(self, path):
+        with self._lock:
+            item = self._maps.pop(path, None)
+        if item:
+            item[1].close()
+            item[0].close()
+
+    def close(self):
+        """Close the memory-mapped files"""
+        for path in list(self._maps):
+            self._close_map(path)
+
+    def _read(self, path, offset, length):
+        with self._lock:
+            if path not in self._maps:
+                fin = open(path, "rb")
+                self._maps[path] = (fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ))
+            data = self._maps[path][1]
+        return data[offset : offset + length].decode()
+
+    def _locate(self, keys, frmt):
+        located = {}
+        keys = list(keys)
+        with self._connect() as conn:
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                marks = ",".join("?" * len(batch))
+                sql = "SELECT key, path, offset, length FROM keys JOIN files ON keys.file = files.id "
+                sql += "WHERE keys.format=? AND key IN ({})".format(marks)
+                for key, path, offset, length in conn.execute(sql, [frmt] + batch):
+                    located[key] = (path, offset, length)
+        return located
+
+    def get(self, key, frmt="txt"):
+        """Returns the record of an accession (or entry name) or None if not indexed
+
+        :param str key: accession (e.g. P43403) or entry name (ZAP70_HUMAN)
+        :param str frmt: 'txt' (flat file record) or 'fasta'
+        """
+        return self.get_many([key], frmt).get(key)
+
+    def get_many(self, keys, frmt="txt"):
+        """Returns a dictionary with the records of the keys found in the index"""
+        located = self._locate(keys, frmt)
+        return {key: self._read(*located[key]) for key in keys if key in located}
+
+    def get_fields(self, keys):
+        """Returns the fields (see :attr:`labels`) of the records found in the index
+
+        Flat file records are used if available, FASTA records otherwise
+        (organism names have no common name in FASTA headers).
+
+        :param list keys: accessions or entry names
+        :return: a dictionary with one dictionary of fields per key found
+        """
+        output = {}
+        for frmt, parser in (("txt", self._parse_flat), ("fasta", self._parse_fasta)):
+            missing = [x for x in keys if x not in output]
+            if missing:
+                output.update({key: parser(record) for key, record in self.get_many(missing, frmt).items()})
+        return output
+
+    @staticmethod
+    def _parse_flat(record):
+        fields = {"gene_primary": ""}
+        organism = []
+        sequence = []
+        in_sequence = False
+        for line in record.split("\n"):
+            code, value = line[:2], line[5:]
+            if in_sequence and line.startswith("     "):
+                sequence.append(value.replace(" ", ""))
+            elif code == "ID":
+                items = value.split()
+                fields["id"] = items[0]
+                fields["reviewed"] = items[1].strip(";").lower()
+            elif code == "AC" and "accession" not in fields:
+                fields["accession"] = value.split(";")[0].strip()
+            elif code == "GN" and not fields["gene_primary"] and "Name=" in value:
+                fields["gene_primary"] = re.sub(r" \{.*\}", "", value.split("Name=", 1)[1].split(";")[0])
+            elif code == "OS":
+                organism.append(value.strip())
+            elif code == "OX" and "organism_id" not in fields:
+                fields["organism_id"] = value.split("=", 1)[1].split(";")[0].split()[0]
+            elif code == "SQ":
+                in_sequence = True
+        fields["organism_name"] = " ".join(organism).rstrip(".")
+        fields["sequence"] = "".join(sequence)
+        fields["length"] = len(fields["sequence"])
+        return fields
+
+    @staticmethod
+    def _parse_fasta(record):
+        header, _, sequence = record.partition("\n")
+        name, _, description = header[1:].partition(" ")
+        items = name.split("|")
+        fields = {"accession": items[1] if len(items) == 3 else name, "id": items[-1]}
+        fields["reviewed"] = "reviewed" if items[0] == "sp" else "unreviewed"
+        tags = dict(re.findall(r" (OS|OX|GN|PE|SV)=(.*?)(?= \w\w=|$)", " " + description))
+        fields["gene_primary"] = tags.get("GN", "")
+        fields["organism_name"] = tags.get("OS", "")
+        fields["organism_id"] = tags.get("OX", "")
+        fields["sequence"] = sequence.replace("\n", "")
+        fields["length"] = len(fields["sequence"])
+        return fields
@@ -0,0 +1,100 @@
+"""Fixtures shared by the offline benchmark suite.
+
+Benchmarks use pytest-benchmark and are skipped if the plugin is not
+installed. Inputs are generated once per session by the local stand-in server
+(:mod:`bioservices.dev.mockserver`) so that no network access is needed and
+results are reproducible. Run them with::
+
+    pytest test/benchmarks --benchmark-only --benchmark-json=benchmarks.json
+
+Each benchmark stores the number of processed items, the throughput
+(items per second) and the peak memory (in KiB, measured with tracemalloc)
+in the *extra_info* field of the JSON report.
+"""
+import tracemalloc
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:  # pragma: no cover
+    collect_ignore_glob = ["test_*.py"]
+
+
+@pytest.fixture(scope="session")
+def generator():
+    """A (not started) mock server used only to generate data"""
+    from bioservices.dev.mockserver import MockServer
+
+    return MockServer(n_genes=2000, n_proteins=2000, n_molecules=5000, n_records=2000)
+
+
+@pytest.fixture
+def measure(benchmark):
+    """Benchmark a callable and record throughput and peak memory
+
+    ::
+
+        def test_something(measure):
+            measure(func, arg1, items=1000)
+    """
+
+    def _measure(func, *args, items=1, **kwargs):
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        result = benchmark(func, *args, **kwargs)
+
+        benchmark.extra_info["items"] = items
+        benchmark.extra_info["peak_memory_kb"] = round(peak / 1024, 1)
+        stats = getattr(benchmark, "stats", None)
+        if stats is not None and stats.stats.mean:
+            benchmark.extra_info["items_per_sec"] = round(items / stats.stats.mean, 1)
+        return result
+
+    return _measure
+
+
+@pytest.fixture(scope="session")
+def offline():
+    """Instanciate a bioservices class without reaching the network"""
+
+    def _offline(cls, *args, **kwargs):
+        with patch("bioservices.services.urlopen", return_value=MagicMock()):
+            return cls(*args, **kwargs)
+
+    return _offline
+
+
+class _PagedResponses:
+    """Replay a list of pages through a REST http_get call
+
+    Emulates the Link and X-Total-Results headers of paginated services
+    (UniProt) so that client-side concatenation can be benchmarked alone.
+    """
+
+    def __init__(self, services, pages, total):
+        self.services = services
+        self.pages = pages
+        self.total = total
+        self.index = 0
+
+    def __call__(self, query, *args, **kwargs):
+        page = self.pages[self.index % len(self.pages)]
+        self.index += 1
+        headers = {"X-Total-Results": str(self.total)}
+        if self.index % len(self.pages):
+            headers["Link"] = f'<https://example.com/next?cursor={self.index}>; rel="next"'
+        self.services.last_response = MagicMock(headers=headers)
+        return page
+
+
+@pytest.fixture
+def paged():
+    """Returns a factory of fake http_get replaying pages (see _PagedResponses)"""
+    return _PagedResponses
@@ -0,0 +1,69 @@
+"""Benchmarks of the JSON/XML decoding backends on large pages."""
+import importlib
+
+import pytest
+
+
+def _installed(backend):
+    module = {"etree": "xml", "json": "json"}.get(backend, backend)
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        return False
+    return True
+
+
+def _backends(names):
+    return [pytest.param(x, marks=pytest.mark.skipif(not _installed(x), reason=f"{x} not installed")) for x in names]
+
+
+@pytest.fixture(scope="module")
+def chembl_page(generator):
+    return generator.handle("GET", "/chembl/api/data/molecule.json?limit=1000&offset=0").body
+
+
+@pytest.fixture(scope="module")
+def uniprot_page(generator):
+    body, _ = generator._uniprot_format(range(1, 2001), "json", None)
+    return body.encode()
+
+
+@pytest.fixture(scope="module")
+def pubmed_xml(generator):
+    ids = ",".join(str(100000 + i) for i in range(1, 2001))
+    return generator.handle("GET", f"/eutils/efetch.fcgi?db=pubmed&retmode=xml&id={ids}").body
+
+
+@pytest.mark.parametrize("backend", _backends(["orjson", "msgspec", "json"]))
+def test_decode_chembl_page(measure, chembl_page, backend):
+    from bioservices.decoders import get_json_decoder
+
+    res = measure(get_json_decoder(backend), chembl_page, items=1000)
+    assert len(res["molecules"]) == 1000
+
+
+@pytest.mark.parametrize("backend", _backends(["orjson", "msgspec", "json"]))
+def test_decode_uniprot_page(measure, uniprot_page, backend):
+    from bioservices.decoders import get_json_decoder
+
+    res = measure(get_json_decoder(backend), uniprot_page, items=2000)
+    assert len(res["results"]) == 2000
+
+
+def test_decode_json_stdlib_from_text(measure, uniprot_page):
+    # former code path: bytes decoded to str by the REST layer, then json.loads
+    import json
+
+    def decode(data):
+        return json.loads(data.decode())
+
+    res = measure(decode, uniprot_page, items=2000)
+    assert len(res["results"]) == 2000
+
+
+@pytest.mark.parametrize("backend", _backends(["lxml", "etree"]))
+def test_parse_pubmed_xml(measure, pubmed_xml, backend):
+    from bioservices.decoders import get_xml_parser
+
+    root = measure(get_xml_parser(backend), pubmed_xml, items=2000)
+    assert len(root) == 2000
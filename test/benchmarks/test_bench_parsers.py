@@ -0,0 +1,201 @@
+"""Offline benchmarks of parsers and client-side hot paths."""
+import json
+import xml.etree.ElementTree as ET
+from unittest.mock import PropertyMock, patch
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def kegg_pathway(generator):
+    return generator.handle("GET", "/kegg/get/hsa00010").body.decode()
+
+
+@pytest.fixture(scope="module")
+def kegg_genes(generator):
+    entries = "+".join(f"hsa:{i}" for i in range(1, 11))
+    return generator.handle("GET", f"/kegg/get/{entries}").body.decode()
+
+
+@pytest.fixture(scope="module")
+def kgml(generator):
+    return generator.handle("GET", "/kegg/get/hsa04010/kgml").body.decode()
+
+
+@pytest.fixture(scope="module")
+def pubmed_xml(generator):
+    ids = ",".join(str(100000 + i) for i in range(1, 2001))
+    return generator.handle("GET", f"/eutils/efetch.fcgi?db=pubmed&retmode=xml&id={ids}").body.decode()
+
+
+@pytest.fixture(scope="module")
+def elink_xml(generator):
+    ids = ",".join(str(100000 + i) for i in range(1, 2001))
+    return generator.handle("GET", f"/eutils/elink.fcgi?dbfrom=pubmed&db=pubmed&id={ids}").body.decode()
+
+
+def test_kegg_parser_pathway(measure, kegg_pathway):
+    from bioservices import KEGGParser
+
+    parser = KEGGParser()
+    res = measure(parser.parse, kegg_pathway, items=kegg_pathway.count("\n"))
+    assert len(res["GENE"]) > 100
+
+
+def test_kegg_parser_gene(measure, kegg_genes):
+    from bioservices import KEGGParser
+
+    parser = KEGGParser()
+    # KEGGParser.parse expects a single entry
+    entry = kegg_genes.split("///")[0] + "///"
+    res = measure(parser.parse, entry, items=1)
+    assert res["SYMBOL"] == "GENE1"
+
+
+def test_kegg_parse_kgml_pathway(measure, offline, kgml):
+    from bioservices import KEGG
+
+    k = offline(KEGG)
+    res = measure(k.parse_kgml_pathway, "hsa04010", res=kgml, items=kgml.count("<entry"))
+    assert len(res["entries"]) == kgml.count("<entry")
+
+
+def test_kegg_parse_kgml_tables(measure, offline, kgml):
+    from bioservices import KEGG
+
+    k = offline(KEGG)
+    res = measure(k.parse_kgml, kgml, items=kgml.count("<entry"))
+    assert len(res["entries"]) == kgml.count("<entry")
+
+
+def test_eutils_parser(measure, elink_xml):
+    from bioservices.eutils import EUtilsParser
+
+    def parse(xml):
+        return EUtilsParser(ET.fromstring(xml))
+
+    res = measure(parse, elink_xml, items=elink_xml.count("<Link>"))
+    assert len(res["LinkSet"]["LinkSetDb"]["Link"]) == 2000
+
+
+def test_easyxml(measure, pubmed_xml):
+    from bioservices.xmltools import easyXML
+
+    def parse(xml):
+        return easyXML(xml).findAll("PMID")
+
+    res = measure(parse, pubmed_xml, items=2000)
+    assert len(res) == 2000
+
+
+def test_multifasta_read_fasta(measure, offline, generator, tmp_path):
+    from bioservices.apps.fasta import MultiFASTA
+
+    body, _ = generator._uniprot_format(range(1, 2001), "fasta", None)
+    filename = tmp_path / "proteins.fasta"
+    filename.write_text(body)
+
+    def read(filename):
+        mf = offline(MultiFASTA)
+        mf.read_fasta(filename)
+        return mf
+
+    mf = measure(read, str(filename), items=2000)
+    assert len(mf) == 2000
+
+
+def test_uniprot_search_concatenation(measure, offline, paged, generator):
+    from bioservices import UniProt
+
+    u = offline(UniProt)
+    size = 100
+    pages = [generator._uniprot_format(range(i, i + size), "tsv", None)[0] for i in range(1, 2001, size)]
+
+    def search():
+        with patch.object(u.services, "http_get", paged(u.services, pages, 2000)):
+            return u.search("*", frmt="tsv", size=size)
+
+    res = measure(search, items=2000)
+    assert res.count("\n") == 2000
+
+
+def test_uniprot_iter_search(measure, offline, paged, generator):
+    from bioservices import UniProt
+
+    u = offline(UniProt)
+    size = 100
+    pages = [generator._uniprot_format(range(i, i + size), "tsv", None)[0] for i in range(1, 2001, size)]
+
+    def iter_search():
+        with patch.object(u.services, "http_get", paged(u.services, pages, 2000)):
+            return sum(1 for _ in u.iter_search("*", frmt="tsv", size=size))
+
+    # header and one row per entry
+    assert measure(iter_search, items=2000) == 2001
+
+
+def test_chembl_get_data_aggregation(measure, offline, generator):
+    from bioservices import ChEMBL
+
+    c = offline(ChEMBL)
+    bodies = {
+        offset: generator.handle("GET", f"/chembl/api/data/molecule.json?limit=1000&offset={offset}").body
+        for offset in range(0, 5000, 1000)
+    }
+
+    def http_get(query, params=None, **kwargs):
+        return json.loads(bodies[params["offset"]])
+
+    def get_data():
+        with patch.object(c.services, "http_get", side_effect=http_get):
+            return c._get_data("molecule", {"limit": -1, "offset": 0})
+
+    res = measure(get_data, items=5000)
+    assert len(res) == 5000
+
+
+def test_biomart_tsv_to_dataframe(measure, offline):
+    from bioservices import BioMart
+
+    rows = "\n".join(f"html\tdataset_{i}\tDataset number {i}\t1\t{i}" for i in range(50000))
+    b = BioMart.__new__(BioMart)
+
+    def get_datasets():
+        with patch.object(BioMart, "names", new_callable=PropertyMock, return_value=["ENSEMBL_MART_ENSEMBL"]):
+            with patch.object(b, "http_get", return_value=rows, create=True):
+                return b.get_datasets("ENSEMBL_MART_ENSEMBL")
+
+    df = measure(get_datasets, items=50000)
+    assert len(df) == 50000
+
+
+@pytest.fixture(scope="module")
+def kegg_gene_dump(generator):
+    # about 2000 gene entries as found in a whole-organism dump
+    return "\n".join(generator._kegg_gene_entry(f"hsa:{i}") for i in range(1, 2001)) + "\n"
+
+
+def test_kegg_parser_gene_dump_per_entry(measure, kegg_gene_dump):
+    from bioservices import KEGGParser
+
+    parser = KEGGParser()
+
+    def parse(dump):
+        return [parser.parse(x.strip("\n") + "\n///\n") for x in dump.split("///") if x.strip()]
+
+    res = measure(parse, kegg_gene_dump, items=2000)
+    assert len(res) == 2000
+
+
+def test_kegg_parser_gene_dump_streaming(measure, kegg_gene_dump, tmp_path):
+    from bioservices import KEGGParser
+
+    parser = KEGGParser()
+    filename = tmp_path / "hsa_genes.txt"
+    filename.write_text(kegg_gene_dump)
+
+    def parse(filename):
+        with open(filename) as fin:
+            return sum(1 for _ in parser.iter_parse(fin))
+
+    assert measure(parse, filename, items=2000) == 2000
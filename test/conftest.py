@@ -4,6 +4,42 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def _reset_circuit_breakers():
+    """Circuit breakers are shared per host; do not leak state across tests."""
+    from bioservices.services import REST
+
+    REST._circuit_breakers.clear()
+    yield
+    REST._circuit_breakers.clear()
+
+
+@pytest.fixture(autouse=True)
+def _isolated_listings(tmp_path, monkeypatch):
+    """KEGG listings and UniProt metadata are memoised per URL and persisted in the cache directory."""
+    from bioservices.kegg import KEGG
+    from bioservices.settings import BioServicesConfig
+    from bioservices.uniprot import UniProt
+
+    monkeypatch.setattr(BioServicesConfig, "user_cache_dir", str(tmp_path / "cache"))
+    KEGG._listings.clear()
+    KEGG._releases.clear()
+    UniProt._metadata.clear()
+    yield
+    KEGG._listings.clear()
+    KEGG._releases.clear()
+    UniProt._metadata.clear()
+
+
+@pytest.fixture(autouse=True)
+def _uninstall_requests_cache():
+    """REST(cache=True) installs requests_cache globally; do not leak it across tests."""
+    import requests_cache
+
+    yield
+    requests_cache.uninstall_cache()
+
+
 @pytest.fixture
 def svc():
     """A Service instance that never makes real network calls."""
@@ -32,3 +68,21 @@ def restbase():
     with patch("bioservices.services.urlopen", return_value=MagicMock()):
         rb = RESTbase("testbase", "http://example.com/api", verbose=False)
     return rb
+
+
+@pytest.fixture
+def mockserver():
+    """A running local stand-in server (see :mod:`bioservices.dev.mockserver`)."""
+    from bioservices.dev.mockserver import MockServer
+
+    with MockServer() as server:
+        yield server
+
+
+@pytest.fixture
+def ftpserver():
+    """A running local stand-in FTP server (see :mod:`bioservices.dev.ftpserver`)."""
+    from bioservices.dev.ftpserver import MockFTPServer
+
+    with MockFTPServer() as server:
+        yield server
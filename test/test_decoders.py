@@ -0,0 +1,75 @@
+"""Tests for the pluggable JSON/XML decoders."""
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from requests.models import Response
+
+from bioservices import decoders
+
+DATA = {"results": [{"primaryAccession": "P%05d" % i, "sequence": {"length": i}} for i in range(10)]}
+
+
+@pytest.mark.parametrize("backend", ["auto", "orjson", "msgspec", "json"])
+def test_json_backends(backend):
+    payload = json.dumps(DATA)
+    assert decoders.json_loads(payload.encode(), backend=backend) == DATA
+    assert decoders.json_loads(payload, backend=backend) == DATA
+
+
+def test_json_unknown_backend():
+    with pytest.raises(ValueError):
+        decoders.get_json_decoder("simdjson")
+
+
+def test_json_missing_backend_falls_back(mocker):
+    decoders.get_json_decoder.cache_clear()
+    mocker.patch.dict(decoders._JSON_FACTORIES, {"msgspec": MagicMock(side_effect=ImportError)})
+    try:
+        assert decoders.get_json_decoder("msgspec")(b"[1]") == [1]
+    finally:
+        decoders.get_json_decoder.cache_clear()
+
+
+@pytest.mark.parametrize("backend", ["auto", "lxml", "etree"])
+def test_xml_backends(backend):
+    xml = '<?xml version="1.0" encoding="UTF-8"?>\n<!-- comment --><root><a id="1">x</a><a id="2">y</a></root>'
+    for data in (xml, xml.encode()):
+        root = decoders.xml_fromstring(data, backend=backend)
+        assert root.tag == "root"
+        assert [x.text for x in root] == ["x", "y"]
+        assert [dict(x.attrib) for x in root] == [{"id": "1"}, {"id": "2"}]
+
+
+def test_rest_json_decoding(rest):
+    response = Response()
+    response.status_code = 200
+    response._content = json.dumps(DATA).encode()
+    assert rest._interpret_returned_request(response, "json") == DATA
+
+    rest.settings.JSON_BACKEND = "json"
+    assert rest._interpret_returned_request(response, "json") == DATA
+
+    # not UTF-8: requests guesses the encoding
+    response._content = json.dumps({"name": "caf\xe9"}, ensure_ascii=False).encode("utf-16")
+    assert rest._interpret_returned_request(response, "json") == {"name": "caf\xe9"}
+
+    # not JSON at all: the response is returned
+    response._content = b"not json"
+    assert rest._interpret_returned_request(response, "json") is response
+
+
+@pytest.mark.parametrize("backend", ["orjson", "json"])
+@pytest.mark.parametrize("reply", [None, 500])
+def test_unichem_error_reply_with_backend(mocker, backend, reply):
+    from bioservices import UniChem
+    from bioservices.services import HTTPResponseError
+
+    mocker.patch("bioservices.services.urlopen", return_value=MagicMock())
+    mocker.patch("bioservices.services.REST.http_get", return_value={"sources": [{"name": "chembl", "sourceID": 1}]})
+    unichem = UniChem()
+    unichem.services.settings.JSON_BACKEND = backend
+    reply = reply and HTTPResponseError(reply, reason="Internal Server Error")
+    mocker.patch.object(unichem.services, "http_post", return_value=reply)
+    assert unichem.get_compounds("CHEMBL12", "chembl") == {}
+    assert unichem.get_connectivity("CHEMBL12", "chembl") == {}
@@ -0,0 +1,175 @@
+"""Tests for the resumable download manager (against the local stand-in server)."""
+import hashlib
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from bioservices.download import DownloadError, DownloadManager, file_checksum
+
+CONTENT = bytes(range(256)) * 400
+
+
+def _md5(content):
+    return "md5:" + hashlib.md5(content).hexdigest()
+
+
+def _gets(server, name):
+    return [x for x in server.log if x[0] == "GET" and x[1] == f"/files/{name}"]
+
+
+def test_download(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT)
+    target = tmp_path / "sub" / "data.bin"
+    res = DownloadManager().download(url, target, checksum=_md5(CONTENT))
+    assert res == str(target)
+    assert target.read_bytes() == CONTENT
+    assert not os.path.exists(str(target) + ".part")
+
+    # exists already: nothing downloaded
+    DownloadManager().download(url, target)
+    assert len(_gets(mockserver, "data.bin")) == 1
+
+
+def test_download_resumes_interrupted_transfer(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT, interrupt=2)
+    target = tmp_path / "data.bin"
+    DownloadManager(chunk_size=1024, retry_delay=0).download(url, target)
+    assert target.read_bytes() == CONTENT
+    assert len(_gets(mockserver, "data.bin")) == 3
+    # resumed transfers are partial replies
+    assert [x[2] for x in _gets(mockserver, "data.bin")] == [200, 206, 206]
+
+
+def test_download_resumes_part_file(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT)
+    target = tmp_path / "data.bin"
+    with open(str(target) + ".part", "wb") as fout:
+        fout.write(CONTENT[:1000])
+    DownloadManager().download(url, target)
+    assert target.read_bytes() == CONTENT
+    assert [x[2] for x in _gets(mockserver, "data.bin")] == [206]
+
+
+def test_download_without_range_support(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT, interrupt=1, ranges=False)
+    target = tmp_path / "data.bin"
+    DownloadManager(retry_delay=0).download(url, target)
+    assert target.read_bytes() == CONTENT
+    assert [x[2] for x in _gets(mockserver, "data.bin")] == [200, 200]
+
+
+def test_download_gives_up(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT, interrupt=5)
+    with pytest.raises(DownloadError):
+        DownloadManager(max_retries=1, retry_delay=0).download(url, tmp_path / "data.bin")
+    assert not os.path.exists(tmp_path / "data.bin")
+
+
+def test_download_segments(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT, interrupt=2)
+    target = tmp_path / "data.bin"
+    DownloadManager(segments=4, min_segment_size=1, retry_delay=0).download(url, target)
+    assert target.read_bytes() == CONTENT
+    statuses = [x[2] for x in _gets(mockserver, "data.bin")]
+    assert statuses == [206] * 6
+
+
+def test_download_segments_state_is_resumed(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT, interrupt=4)
+    target = tmp_path / "data.bin"
+    manager = DownloadManager(chunk_size=1024, segments=4, min_segment_size=1, max_retries=0, retry_delay=0)
+    with pytest.raises(DownloadError):
+        manager.download(url, target)
+    assert os.path.exists(str(target) + ".part.json")
+
+    mockserver.reset()
+    manager.download(url, target)
+    assert target.read_bytes() == CONTENT
+    assert not os.path.exists(str(target) + ".part.json")
+    # only the missing half of each segment is requested
+    assert len(_gets(mockserver, "data.bin")) == 4
+
+
+def test_download_segments_killed_then_stream_resume(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT, interrupt=4)
+    target = tmp_path / "data.bin"
+    manager = DownloadManager(chunk_size=1024, segments=4, min_segment_size=1, max_retries=0, retry_delay=0)
+    save_state = DownloadManager._save_state
+    calls = []
+
+    def killed(*args):
+        # process killed: only the state saved before the first byte is on disk
+        calls.append(args)
+        if len(calls) == 1:
+            save_state(*args)
+
+    with patch.object(DownloadManager, "_save_state", side_effect=killed):
+        with pytest.raises(DownloadError):
+            manager.download(url, target)
+    assert os.path.getsize(str(target) + ".part") == len(CONTENT)
+
+    # resumed without segments: the preallocated .part file is not trusted
+    DownloadManager(segments=1).download(url, target)
+    assert target.read_bytes() == CONTENT
+    assert not os.path.exists(str(target) + ".part.json")
+
+    # a saved state is resumed segment by segment even with segments=1
+    os.remove(target)
+    mockserver.add_file("data.bin", CONTENT, interrupt=4)
+    with pytest.raises(DownloadError):
+        manager.download(url, target)
+    mockserver.reset()
+    DownloadManager(chunk_size=1024, segments=1).download(url, target)
+    assert target.read_bytes() == CONTENT
+    assert len(_gets(mockserver, "data.bin")) == 4
+
+
+def test_download_full_part_without_state_is_discarded(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT)
+    target = tmp_path / "data.bin"
+    with open(str(target) + ".part", "wb") as fout:
+        fout.write(bytes(len(CONTENT)))
+    DownloadManager().download(url, target)
+    assert target.read_bytes() == CONTENT
+    assert [x[2] for x in _gets(mockserver, "data.bin")] == [200]
+
+
+def test_download_checksums(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT)
+    target = tmp_path / "data.bin"
+    with pytest.raises(DownloadError):
+        DownloadManager().download(url, target, checksum="md5:0123")
+    assert not os.path.exists(target)
+    assert not os.path.exists(str(target) + ".part")
+
+    sha = "sha256:" + hashlib.sha256(CONTENT).hexdigest()
+    DownloadManager().download(url, target, checksum=sha)
+    assert file_checksum(target, "sha256") == sha.split(":")[1]
+
+
+def test_download_server_digest(mockserver, tmp_path):
+    url = mockserver.add_file("data.bin", CONTENT, digest=True)
+    target = tmp_path / "data.bin"
+    DownloadManager().download(url, target)
+    assert target.read_bytes() == CONTENT
+
+    with patch("bioservices.download.file_checksum", return_value="bad"):
+        with pytest.raises(DownloadError):
+            DownloadManager().download(url, tmp_path / "other.bin")
+
+
+def test_download_not_found(mockserver, tmp_path):
+    with pytest.raises(DownloadError):
+        DownloadManager().download(mockserver.url + "/files/missing", tmp_path / "missing")
+
+
+def test_rest_download(mockserver, tmp_path):
+    from bioservices.services import REST
+
+    mockserver.add_file("models/e_coli_core.json.gz", CONTENT)
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        rest = REST("test", mockserver.url + "/files", verbose=False)
+    target = tmp_path / "e_coli_core.json.gz"
+    assert rest.download("models/e_coli_core.json.gz", target, segments=2) == str(target)
+    assert target.read_bytes() == CONTENT
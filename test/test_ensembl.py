@@ -0,0 +1,173 @@
+"""Offline tests of the Ensembl batch (POST) and tiled region endpoints using the local stand-in server."""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+
+@pytest.fixture
+def ensembl(mockserver):
+    from bioservices import Ensembl
+
+    mockserver.n_genes = 2500
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        e = Ensembl(verbose=False)
+    return mockserver.bind(e)
+
+
+def _posts(server, path):
+    return [x for x in server.log if x[0] == "POST" and x[1].split("?")[0] == "/ensembl/" + path]
+
+
+def test_post_lookup_by_id_chunks(ensembl, mockserver):
+    assert ensembl.services.requests_per_sec == 15
+    ids = [mockserver.ensembl_id(i) for i in range(1, 2501)] + ["ENSG99999999999"]
+    res = ensembl.post_lookup_by_id(ids)
+    assert len(res) == 2501
+    assert res[ids[0]]["display_name"] == "GENE1"
+    assert res["ENSG99999999999"] is None
+    # the 1000 identifiers limit is respected
+    assert [x[2] for x in _posts(mockserver, "lookup/id")] == [200, 200, 200]
+
+    df = ensembl.post_lookup_by_id(ids[:10] + ["ENSG99999999999"], frmt="dataframe")
+    assert df.index.tolist() == ids[:10]
+    assert df.loc[ids[1], "start"] == 2000
+
+
+def test_post_lookup_by_symbol(ensembl, mockserver):
+    res = ensembl.post_lookup_by_symbol("homo_sapiens", [f"GENE{i}" for i in range(1, 1201)])
+    assert res["GENE1200"]["id"] == mockserver.ensembl_id(1200)
+    assert len(_posts(mockserver, "lookup/symbol/homo_sapiens")) == 2
+
+
+def test_post_archive_and_sequence(ensembl, mockserver):
+    ids = [mockserver.ensembl_id(i) for i in range(1, 121)]
+    res = ensembl.post_archive(ids)
+    assert [x["id"] for x in res] == ids
+
+    df = ensembl.post_sequence_by_id(ids, frmt="dataframe")
+    assert df["id"].tolist() == ids
+    assert len(_posts(mockserver, "sequence/id")) == 3
+
+    regions = [f"X:{i}..{i + 100}:1" for i in range(0, 6000, 100)]
+    res = ensembl.post_sequence_by_region(regions, "human")
+    assert [x["id"] for x in res] == regions
+
+
+def test_post_vep(ensembl, mockserver):
+    ids = [f"rs{i}" for i in range(450)]
+    res = ensembl.post_vep_by_id("human", ids, hgvs=True)
+    assert [x["input"] for x in res] == ids
+    posts = _posts(mockserver, "vep/human/id")
+    assert len(posts) == 3
+    assert "hgvs=1" in posts[0][1]
+
+    variants = ["21 26960070 rs116645811 G A . . .", "21 26965148 rs1135638 G A . . ."]
+    df = ensembl.post_vep_by_region("human", variants, frmt="dataframe")
+    assert df["id"].tolist() == ["rs116645811", "rs1135638"]
+
+
+def test_post_xrefs_by_id(ensembl, mockserver):
+    from bioservices import BioServicesError
+
+    ids = [mockserver.ensembl_id(i) for i in range(1, 6)]
+    res = ensembl.post_xrefs_by_id(ids)
+    assert list(res) == ids
+    assert res[ids[0]][0]["primary_id"] == "HGNC:1"
+    df = ensembl.post_xrefs_by_id(ids[:2], frmt="dataframe")
+    assert df["id"].tolist() == [ids[0], ids[0], ids[1], ids[1]]
+
+    # a failed identifier is reported, not silently dropped
+    with pytest.raises(BioServicesError, match="1 of 6 identifiers.*ENSG99999999999"):
+        ensembl.post_xrefs_by_id(ids + ["ENSG99999999999"])
+
+
+def test_post_retries_when_busy(ensembl, mockserver, monkeypatch):
+    # the server accepts one request per second and replies 429 with Retry-After: 1
+    mockserver.requests_per_sec = 1
+    monkeypatch.setitem(ensembl._post_limits, "lookup", 10)
+    ids = [mockserver.ensembl_id(i) for i in range(1, 31)]
+    res = ensembl.post_lookup_by_id(ids, max_workers=1)
+    assert list(res) == ids
+    statuses = [x[2] for x in _posts(mockserver, "lookup/id")]
+    assert statuses.count(200) == 3 and 429 in statuses
+
+
+def test_post_failed_chunk_raises(ensembl, mockserver, monkeypatch):
+    from bioservices import BioServicesError
+
+    monkeypatch.setitem(ensembl._post_limits, "lookup", 10)
+    ids = [mockserver.ensembl_id(i) for i in range(1, 31)]
+    post_one = ensembl._post_one
+
+    def failing(query, body, params):
+        return 503 if ids[10] in body["ids"] else post_one(query, body, params)
+
+    monkeypatch.setattr(ensembl, "_post_one", failing)
+    with pytest.raises(BioServicesError, match="10 items in 1 of 3 chunks"):
+        ensembl.post_lookup_by_id(ids, frmt="dataframe")
+
+    # all chunks fail: no bare status
+    mockserver.down = True
+    monkeypatch.setattr(ensembl, "_post_one", post_one)
+    ensembl.services.settings.MAX_RETRIES = 0
+    with pytest.raises(BioServicesError, match="30 items in 3 of 3 chunks"):
+        ensembl.post_lookup_by_id(ids)
+
+
+def _gets(server, path):
+    return [x for x in server.log if x[0] == "GET" and x[1].startswith("/ensembl/" + path)]
+
+
+def test_overlap_by_region_tiled(ensembl, mockserver, monkeypatch):
+    monkeypatch.setitem(ensembl._region_limits, "overlap", 10000)
+    mockserver.ensembl_region_limits["overlap"] = 10000
+    # a single request is refused
+    assert ensembl.get_overlap_by_region("X:1..50000", "human", feature="gene") == 400
+
+    res = ensembl.get_overlap_by_region_tiled("X:1..50000", "human", feature="gene", max_workers=3)
+    expected = mockserver.ensembl_features(1, 50000)
+    assert [x["id"] for x in res] == [x["id"] for x in expected]
+    assert [x[2] for x in _gets(mockserver, "overlap/region/human/X:")] == [400] + [200] * 5
+
+    # genes crossing the ends of the region are trimmed, not those crossing tiles
+    df = ensembl.get_overlap_by_region_tiled(
+        "X:1500..45000", "human", frmt="dataframe", trim_upstream=True, trim_downstream=True
+    )
+    assert df["start"].min() >= 1500 and df["end"].max() <= 45000
+    assert len(df) == len(df["id"].unique()) == 41
+
+
+def test_overlap_by_region_tiled_stream(ensembl, mockserver):
+    # the whole sequence region, fetched by tiles of 7kb
+    features = ensembl.get_overlap_by_region_tiled("X", "human", tile_size=7000, max_workers=2, stream=True)
+    assert not _gets(mockserver, "overlap")
+    ids = [x["id"] for x in features]
+    assert ids == [x["id"] for x in mockserver.ensembl_features(1, mockserver.ensembl_region_length)]
+    assert len(_gets(mockserver, "overlap/region/human/X:")) == 15
+    assert len(_gets(mockserver, "info/assembly/human/X")) == 1
+
+    with pytest.raises(ValueError):
+        ensembl.get_overlap_by_region_tiled("X:100..1", "human")
+    mockserver.down = True
+    with pytest.raises(ValueError):
+        ensembl.get_overlap_by_region_tiled("X:1..100", "human")
+
+
+def test_sequence_by_region_tiled(ensembl, mockserver, monkeypatch):
+    monkeypatch.setitem(ensembl._region_limits, "sequence", 4000)
+    mockserver.ensembl_region_limits["sequence"] = 4000
+    res = ensembl.get_sequence_by_region_tiled("X:101..20100:1", "human")
+    assert res["seq"] == mockserver.ensembl_genome(101, 20100)
+    assert len(_gets(mockserver, "sequence/region/human/X:")) == 5
+
+    # the reverse strand is the reverse complement of the whole region
+    reverse = ensembl.get_sequence_by_region_tiled("X:101..20100:-1", "human", frmt="text", expand_5prime=50)
+    expected = mockserver.ensembl_genome(101, 20150)[::-1].translate(str.maketrans("ACGT", "TGCA"))
+    assert reverse == expected
+
+    pieces = list(ensembl.get_sequence_by_region_tiled("X:1-10000", "human", stream=True, tile_size=3000))
+    assert [len(x) for x in pieces] == [3000, 3000, 3000, 1000]
+    assert "".join(pieces) == mockserver.ensembl_genome(1, 10000)
+
+    fasta = ensembl.get_sequence_by_region_tiled("X:1..100", "human", frmt="fasta")
+    assert fasta.split("\n")[:2] == [">X:1..100:1", mockserver.ensembl_genome(1, 60)]
@@ -0,0 +1,111 @@
+"""Offline tests of the EnsemblFTP bulk downloader using the local stand-in FTP server."""
+import os
+
+import pytest
+
+from bioservices import EnsemblFTP
+from bioservices.download import DownloadError, file_checksum
+
+
+def _content(name, size=50000):
+    return (name.encode() * (size // len(name) + 1))[:size]
+
+
+def _sum(content, tmp_path):
+    filename = tmp_path / "checksum.tmp"
+    filename.write_bytes(content)
+    return int(file_checksum(filename, "sum"))
+
+
+@pytest.fixture
+def site(ftpserver, tmp_path):
+    """Fungi release 57 with two species and a collection"""
+    root = "pub/fungi/release-57"
+    species = {
+        "saccharomyces_cerevisiae": "fasta/saccharomyces_cerevisiae",
+        "aspergillus_nidulans": "fasta/aspergillus_nidulans",
+        "fusarium_sp": "fasta/fungi_ascomycota1_collection/fusarium_sp",
+    }
+    for name, path in species.items():
+        prefix = name.capitalize() + ".ASM1"
+        files = {
+            f"{prefix}.dna.toplevel.fa.gz": _content(name + "dna"),
+            f"{prefix}.dna_sm.toplevel.fa.gz": _content(name + "dna_sm"),
+            f"{prefix}.dna.chromosome.I.fa.gz": _content(name + "chr"),
+            "README": b"readme",
+        }
+        checksums = "".join(f"{_sum(v, tmp_path):05d} {len(v) // 1024 + 1:5d} {k}\n" for k, v in files.items())
+        for filename, content in files.items():
+            ftpserver.add_file(f"{root}/{path}/dna/{filename}", content)
+        ftpserver.add_file(f"{root}/{path}/dna/CHECKSUMS", checksums)
+        ftpserver.add_file(f"{root}/{path}/pep/{prefix}.pep.all.fa.gz", _content(name + "pep"))
+    ftpserver.species = species
+    return ftpserver
+
+
+def _ftp(server, **kwargs):
+    return EnsemblFTP(division="fungi", release=57, host=server.host, port=server.port, **kwargs)
+
+
+def test_bsd_sum(tmp_path, monkeypatch):
+    filename = tmp_path / "data.bin"
+    filename.write_bytes(bytes(range(256)) * 1000)
+    expected = "53248"
+    assert file_checksum(filename, "sum") == expected
+    # without the sum command
+    monkeypatch.setattr("bioservices.download.shutil.which", lambda name: None)
+    assert file_checksum(filename, "sum") == expected
+
+
+def test_get_species_and_files(site):
+    ftp = _ftp(site)
+    assert ftp.get_species() == sorted(site.species)
+
+    files = ftp.get_files(["saccharomyces_*", "fusarium_sp"])
+    assert [(x["species"], x["filename"]) for x in files] == [
+        ("fusarium_sp", "Fusarium_sp.ASM1.dna.toplevel.fa.gz"),
+        ("saccharomyces_cerevisiae", "Saccharomyces_cerevisiae.ASM1.dna.toplevel.fa.gz"),
+    ]
+    path = "/pub/fungi/release-57/fasta/fungi_ascomycota1_collection/fusarium_sp/dna/"
+    assert files[0]["url"] == site.url + path + files[0]["filename"]
+    assert files[0]["checksum"].startswith("sum:")
+
+    pep = ftp.get_files("aspergillus_nidulans", file_type="pep")
+    assert [x["checksum"] for x in pep] == [None]
+    assert ftp.get_files("homo_sapiens") == []
+    with pytest.raises(ValueError):
+        ftp.get_files(file_type="bam")
+    with pytest.raises(ValueError):
+        EnsemblFTP(division="archaea")
+
+
+def test_download_parallel_and_resume(site, tmp_path):
+    name = "Saccharomyces_cerevisiae.ASM1.dna.toplevel.fa.gz"
+    path = "pub/fungi/release-57/fasta/saccharomyces_cerevisiae/dna/" + name
+    # the first transfer is cut halfway
+    site.add_file(path, _content("saccharomyces_cerevisiaedna"), interrupt=1)
+
+    ftp = _ftp(site, max_workers=3)
+    res = ftp.download(file_type="dna", directory=str(tmp_path / "genomes"), progress=False)
+    assert len(res) == 3
+    target = tmp_path / "genomes" / "saccharomyces_cerevisiae" / name
+    assert target.read_bytes() == _content("saccharomyces_cerevisiaedna")
+    retrs = [x for x in site.log if x[0] == "RETR" and x[1].endswith(name)]
+    assert len(retrs) == 2
+    # the transfer was resumed where it stopped
+    assert ("REST", "25000") in site.log
+
+    # files downloaded already are not downloaded again
+    site.reset()
+    ftp.download(file_type="dna", directory=str(tmp_path / "genomes"), progress=False)
+    assert not [x for x in site.log if x[0] == "RETR" and not x[1].endswith("CHECKSUMS")]
+
+
+def test_download_checksum_mismatch(site, tmp_path):
+    path = "pub/fungi/release-57/fasta/aspergillus_nidulans/dna/Aspergillus_nidulans.ASM1.dna.toplevel.fa.gz"
+    site.add_file(path, b"corrupted")
+    with pytest.raises(DownloadError, match="Aspergillus_nidulans"):
+        _ftp(site).download(file_type="dna", directory=str(tmp_path), progress=False)
+    # the other files are kept
+    assert os.listdir(tmp_path / "saccharomyces_cerevisiae")
+    assert not os.path.exists(tmp_path / "aspergillus_nidulans" / os.path.basename(path))
@@ -0,0 +1,177 @@
+"""Offline tests of EUtils (History server pipeline, chunked identifier lists) using the local stand-in server."""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from bioservices.services import BioServicesError
+
+
+@pytest.fixture
+def eutils(mockserver):
+    from bioservices import EUtils
+
+    mockserver.n_records = 1200
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        e = EUtils(verbose=False, email="test@example.org")
+    return mockserver.bind(e)
+
+
+def _requests(server, method, name):
+    return [x for x in server.log if x[0] == method and x[1].split("?")[0] == "/eutils/" + name]
+
+
+def test_epost_uses_post(eutils, mockserver):
+    ids = [str(i) for i in range(1, 1001)]
+    ret = eutils.EPost("pubmed", ids)
+    posts = _requests(mockserver, "POST", "epost.fcgi")
+    assert len(posts) == 1 and "id=" not in posts[0][1]
+    assert mockserver._history[(ret["WebEnv"], ret["QueryKey"])] == ids
+
+
+def test_store_history_and_iter_esummary(eutils, mockserver, monkeypatch):
+    monkeypatch.setattr(eutils, "_epost_limit", 1000)
+    ids = [str(i) for i in range(1, 2501)]
+    history = eutils.store_history("pubmed", id=ids + ids[:10])
+    assert [x[1] for x in history["keys"]] == [1000, 1000, 500]
+    assert history["count"] == 2500
+    # the identifiers are added to the same Web Environment
+    assert len(set(webenv for webenv, _ in mockserver._history)) == 1
+
+    results = list(eutils.iter_esummary(history, retmax=400, max_workers=3))
+    assert [uid for res in results for uid in res["uids"]] == ids
+    # batches do not span query keys
+    assert [len(res["uids"]) for res in results] == [400, 400, 200] * 2 + [400, 100]
+    assert history["retstart"] == 2500
+    assert len(_requests(mockserver, "GET", "esummary.fcgi")) == 8
+
+
+def test_iter_efetch_search(eutils, mockserver):
+    history = eutils.store_history("pubmed", term="cancer")
+    assert history["count"] == 1200
+    batches = list(eutils.iter_efetch(history, retmode="xml", retmax=500))
+    assert [x.count("<PMID>") for x in batches] == [500, 500, 200]
+    assert "<PMID>101200</PMID>" in batches[-1]
+
+    fasta = list(eutils.iter_efetch(history, retmode="text", rettype="fasta", retmax=1000, retstart=900))
+    assert [x.count(">") for x in fasta] == [300]
+
+    with pytest.raises(ValueError):
+        eutils.store_history("pubmed")
+
+
+def test_iter_efetch_resume(eutils, mockserver):
+    eutils.services.settings.MAX_RETRIES = 0
+    history = eutils.store_history("pubmed", term="cancer")
+    batches = eutils.iter_efetch(history, retmode="text", retmax=100, max_workers=1)
+    first = [next(batches) for _ in range(3)]
+    mockserver.down = True
+    with pytest.raises(BioServicesError, match="retstart=300"):
+        next(batches)
+    assert history["retstart"] == 300
+
+    mockserver.down = False
+    rest = list(eutils.iter_efetch(history, retmode="text", retmax=100))
+    text = "".join(first + rest)
+    assert text.count("PMID-") == 1200
+    assert history["retstart"] == 1200
+
+
+def test_rate_limit_and_api_key(eutils, mockserver):
+    assert eutils.services.requests_per_sec == 3
+    eutils.api_key = "secret"
+    assert eutils.services.requests_per_sec == 10
+
+    # the server accepts 5 requests per second and replies 429 with Retry-After: 1
+    mockserver.requests_per_sec = 5
+    history = eutils.store_history("pubmed", term="cancer")
+    results = list(eutils.iter_esummary(history, retmax=100, max_workers=4))
+    assert sum(len(x["uids"]) for x in results) == 1200
+    gets = _requests(mockserver, "GET", "esummary.fcgi")
+    assert 429 in [x[2] for x in gets]
+    assert [x[2] for x in gets].count(200) == 12
+    assert all("api_key=secret" in x[1] for x in gets)
+
+
+def test_esummary_chunks(eutils, mockserver):
+    ids = [str(100000 + i) for i in range(1, 1201)]
+    res = eutils.ESummary("pubmed", ids)
+    assert res["uids"] == ids
+    assert res[ids[-1]]["title"] == f"Title {ids[-1]}"
+    assert len(_requests(mockserver, "POST", "esummary.fcgi")) == 3
+    assert not _requests(mockserver, "GET", "esummary.fcgi")
+
+    # a few identifiers are still sent in a GET request
+    assert eutils.ESummary("pubmed", ids[:200])["uids"] == ids[:200]
+    assert len(_requests(mockserver, "GET", "esummary.fcgi")) == 1
+
+    results = list(eutils.ESummary("pubmed", ids, stream=True))
+    assert [len(x["uids"]) for x in results] == [500, 500, 200]
+
+
+def test_efetch_chunks(eutils, mockserver):
+    ids = [str(100000 + i) for i in range(1, 1201)]
+    xml = eutils.EFetch("pubmed", ids, retmode="xml")
+    assert isinstance(xml, bytes)
+    root = eutils.services.xml_fromstring(xml)
+    assert root.tag == "PubmedArticleSet"
+    assert [x.text for x in root.iter("PMID")] == ids
+
+    fasta = eutils.EFetch("protein", ids, rettype="fasta")
+    assert fasta.count(b">") == 1200
+    assert fasta == eutils.EFetch("protein", ids[:200], rettype="fasta") + eutils.EFetch(
+        "protein", ids[200:], rettype="fasta"
+    )
+
+    res = eutils.EFetch("pubmed", ids[:300], retmode="dict")
+    assert len(res["PubmedArticleSet"]["PubmedArticle"]) == 300
+
+    batches = list(eutils.EFetch("pubmed", ids, retmode="xml", stream=True))
+    assert [x.count(b"<PMID>") for x in batches] == [500, 500, 200]
+
+    mockserver.down = True
+    eutils.services.settings.MAX_RETRIES = 0
+    with pytest.raises(BioServicesError, match=r"failed for 500 identifiers \(status HTTP 503.*\): 100001,"):
+        eutils.EFetch("pubmed", ids, retmode="xml")
+
+
+def test_chunks_failure_raises(eutils, mockserver):
+    ids = [str(100000 + i) for i in range(1, 1201)]
+    eutils.services.settings.MAX_RETRIES = 0
+    post = eutils.services.http_post
+
+    def failing(query, data=None, **kwargs):
+        # the second chunk fails: no partial merged reply
+        return 503 if data["id"].startswith("100501,") else post(query, data=data, **kwargs)
+
+    with patch.object(eutils.services, "http_post", side_effect=failing):
+        with pytest.raises(BioServicesError, match="100501,100502"):
+            eutils.ESummary("pubmed", ids)
+        with pytest.raises(BioServicesError, match="100501,100502"):
+            eutils.ELink(dbfrom="pubmed", db="protein", id=ids)
+
+
+def test_elink_chunks(eutils, mockserver):
+    ids = [str(100000 + i) for i in range(1, 701)]
+    xml = eutils.ELink(dbfrom="pubmed", db="protein", id=ids)
+    root = eutils.services.xml_fromstring(xml)
+    assert root.tag == "eLinkResult"
+    assert len(root.findall("LinkSet")) == 2
+    assert len(root.findall("LinkSet/IdList/Id")) == 700
+    posts = _requests(mockserver, "POST", "elink.fcgi")
+    assert len(posts) == 2
+
+    with pytest.raises(ValueError):
+        eutils._check_ids(ids)
+
+
+def test_merge_xml():
+    from bioservices import EUtils
+
+    docs = [
+        '<?xml version="1.0" ?>\n<!DOCTYPE Set PUBLIC "-//NLM//DTD" "set.dtd">\n<Set><A>1</A></Set>\n',
+        '<?xml version="1.0" ?>\n<Set/>\n',
+        '<?xml version="1.0" ?>\n<Set attr="x">\n<A>2</A><A>3</A></Set>\n',
+    ]
+    merged = EUtils._merge_xml(docs)
+    assert merged == docs[0].replace("<A>1</A>", "<A>1</A>\n<A>2</A><A>3</A>")
+    assert EUtils._merge_xml(docs[1:2] + docs[:1]) == '<?xml version="1.0" ?>\n<Set><A>1</A></Set>\n'
@@ -0,0 +1,482 @@
+"""Offline tests of KEGG features using the local stand-in server."""
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+
+@pytest.fixture
+def kegg(mockserver):
+    from bioservices import KEGG
+
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        k = KEGG(verbose=False)
+    k.services.requests_per_sec = 1000
+    return mockserver.bind(k)
+
+
+def test_get_list_of_entries(kegg, mockserver):
+    genes = [f"hsa:{i}" for i in range(1, 26)]
+    res = kegg.get(genes + ["hsa:999999"])
+    assert list(res) == genes
+    assert res["hsa:7"].startswith("ENTRY       7 ")
+    assert res["hsa:7"].endswith("///\n")
+    # 26 entries: 3 requests of 10 entries at most
+    assert mockserver.hits["kegg"] == 3
+    assert all(len(x[1].split("/")[-1].split("+")) <= 10 for x in mockserver.log)
+
+
+def test_get_list_parsed(kegg, mockserver):
+    res = kegg.get(["hsa:1", "hsa:2", "path:hsa00010"], parse=True)
+    assert res["hsa:2"]["DBLINKS"]["UniProt"] == mockserver.accession(2)
+    assert "GENE" in res["path:hsa00010"]
+
+
+def test_get_list_with_option(kegg):
+    res = kegg.get(["hsa:3", "hsa:4"], option="aaseq")
+    assert res["hsa:4"].startswith(">hsa:4 ")
+    res = kegg.get(["hsa00010", "hsa04010"], option="kgml")
+    assert set(res) == {"hsa00010", "hsa04010"}
+    assert "<pathway" in res["hsa04010"]
+
+
+def test_get_list_concurrent(kegg, mockserver):
+    import time
+
+    mockserver.latency = 0.3
+    kegg.services.settings.MAX_WORKERS = 8
+    kegg.services.requests_per_sec = 20
+    start = time.monotonic()
+    res = kegg.get([f"hsa:{i}" for i in range(1, 81)])
+    elapsed = time.monotonic() - start
+    assert len(res) == 80
+    assert mockserver.hits["kegg"] == 8
+    # requests overlap: faster than 8 requests sent one after the other
+    assert mockserver.max_in_flight > 1
+    assert elapsed < 8 * mockserver.latency
+    # the rate limit spaces the 8 requests by 1/20 second at least: the
+    # last one is sent after 7/20 second and answered after the latency
+    assert elapsed >= 7 / 20 + mockserver.latency
+
+
+def test_match_entries(kegg):
+    chunk = ["ec:1.1.1.1", "cpd:C00001", "cpd:C00002"]
+    records = ["ENTRY       EC 1.1.1.1   Enzyme\n///\n", "ENTRY       C00002   Compound\n///\n"]
+    res = kegg._match_entries(chunk, records, kegg._flat_entry_ids)
+    assert list(res) == ["ec:1.1.1.1", "cpd:C00002"]
+
+
+def test_parser_iter_parse(mockserver, tmp_path):
+    from bioservices import KEGGParser
+
+    parser = KEGGParser()
+    dump = mockserver.handle("GET", "/kegg/get/" + "+".join(f"hsa:{i}" for i in range(1, 11))).body.decode()
+    records = list(parser.iter_parse(dump))
+    assert [x["SYMBOL"] for x in records] == [f"GENE{i}" for i in range(1, 11)]
+
+    # same result as parsing entries one by one
+    entries = [x.strip("\n") + "\n///\n" for x in dump.split("///") if x.strip()]
+    assert records == [parser.parse(x) for x in entries]
+
+    # from a file, line by line
+    filename = tmp_path / "genes.txt"
+    filename.write_text(dump * 3)
+    with open(filename) as fin:
+        assert sum(1 for _ in parser.iter_parse(fin)) == 30
+
+
+def test_parser_iter_parse_without_trailing_separator():
+    from bioservices import KEGGParser
+
+    text = "ENTRY       C00031                      Compound\nNAME        D-Glucose;\n            Dextrose\n"
+    (record,) = KEGGParser().iter_parse(text.splitlines(keepends=True))
+    assert record["NAME"] == ["D-Glucose;", "Dextrose"]
+
+
+def test_parser_parse_multiple_entries(mockserver):
+    from bioservices import KEGGParser
+
+    parser = KEGGParser()
+    dump = mockserver.handle("GET", "/kegg/get/hsa:1+hsa:2").body.decode()
+    # parse() expects a single entry: as before, the fields of several
+    # entries are merged and cannot be interpreted. iter_parse() splits them
+    assert parser.parse(dump) == {}
+    assert [x["SYMBOL"] for x in parser.iter_parse(dump)] == ["GENE1", "GENE2"]
+
+
+@pytest.fixture
+def mirror(kegg, tmp_path):
+    from bioservices.keggmirror import KEGGMirror
+
+    mirror = KEGGMirror(str(tmp_path / "kegg.sqlite"), kegg=kegg)
+    mirror.snapshot(organisms=["hsa"], databases=["compound"])
+    return mirror
+
+
+def test_mirror_matches_api(kegg, mirror, mockserver):
+    genes = "hsa:1+hsa:2+hsa:3"
+    expected = {
+        "list": kegg.list("hsa"),
+        "pathway": kegg.list("pathway", "hsa"),
+        "conv": kegg.conv("uniprot", "hsa"),
+        "conv_ids": kegg.conv("uniprot", genes),
+        "link": kegg.link("pathway", "hsa"),
+        "link_ids": kegg.link("pathway", genes),
+        "find": kegg.find("compound", "C00031"),
+    }
+    kegg.use_mirror(mirror)
+    mockserver.reset()
+    assert kegg.list("hsa") == expected["list"]
+    assert kegg.list("pathway", "hsa") == expected["pathway"]
+    assert kegg.conv("uniprot", "hsa") == expected["conv"]
+    assert kegg.conv("uniprot", genes) == expected["conv_ids"]
+    assert kegg.link("pathway", "hsa") == expected["link"]
+    assert kegg.link("pathway", genes) == expected["link_ids"]
+    assert kegg.find("compound", "C00031") == expected["find"]
+    assert mockserver.hits["kegg"] == 0
+
+
+def test_mirror_conv_dataframe_one_to_many(kegg, mockserver, tmp_path):
+    from bioservices.keggmirror import KEGGMirror
+
+    table = "hsa:1\tup:P00001\nhsa:1\tup:Q00001\nhsa:2\tup:P00002\n"
+    mockserver.register("/kegg/conv/uniprot/hsa", table)
+    expected = kegg.conv("uniprot", "hsa", frmt="dataframe")
+    assert len(expected) == 3
+
+    mirror = KEGGMirror(str(tmp_path / "kegg.sqlite"), kegg=kegg)
+    mirror.snapshot(organisms=["hsa"], link=[])
+    kegg.use_mirror(mirror)
+    mockserver.reset()
+    df = kegg.conv("uniprot", "hsa", frmt="dataframe")
+    assert df.equals(expected)
+    assert mockserver.hits["kegg"] == 0
+
+
+def test_mirror_reversed_lookup(kegg, mirror, mockserver):
+    accession = mockserver.accession(5)
+    kegg.use_mirror(mirror)
+    mockserver.reset()
+    assert kegg.conv("hsa", f"up:{accession}") == {f"up:{accession}": "hsa:5"}
+    assert mockserver.hits["kegg"] == 0
+
+
+def test_mirror_falls_back_to_api(kegg, mirror, mockserver):
+    kegg.use_mirror(mirror)
+    mockserver.reset()
+    assert "C00012" in kegg.find("compound", "12")
+    assert kegg.list("reaction").startswith("R00001")
+    assert mockserver.hits["kegg"] == 2
+
+
+def test_mirror_refresh(mirror, mockserver):
+    assert mirror.release == "108.0+/10-19"
+    assert {x["release"] for x in mirror.snapshots} == {"108.0+/10-19"}
+    assert mirror.refresh() == []
+
+    mockserver.kegg_release = "109.0+/01-02"
+    refreshed = mirror.refresh()
+    assert ("conv", "uniprot", "hsa") in refreshed
+    assert len(refreshed) == len(mirror.snapshots)
+    assert mirror.release == "109.0+/01-02"
+
+
+def test_mirror_closes_connections(mirror, mockserver, mocker):
+    import sqlite3
+
+    connect = sqlite3.connect
+    connections = []
+
+    def tracked(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    mocker.patch("sqlite3.connect", side_effect=tracked)
+    mirror.release, mirror.snapshots
+    mirror.list("hsa"), mirror.conv("uniprot", "hsa:1+hsa:2"), mirror.find("compound", "C00031")
+    mirror.snapshot(databases=["compound"], release="108.0+/10-19")
+    assert len(connections) > 5
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+            conn.execute("SELECT 1")
+
+
+def test_mirror_cli(mockserver, tmp_path):
+    from click.testing import CliRunner
+
+    from bioservices import KEGG
+    from bioservices.main import main
+
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        k = KEGG(verbose=False)
+    mockserver.bind(k)
+    filename = str(tmp_path / "kegg.sqlite")
+    with patch("bioservices.KEGG", return_value=k):
+        runner = CliRunner()
+        result = runner.invoke(main, ["kegg-mirror", "snapshot", "--filename", filename, "--database", "compound"])
+        assert result.exit_code == 0, result.output
+        result = runner.invoke(main, ["kegg-mirror", "refresh", "--filename", filename, "--force"])
+        assert "refreshed list/compound" in result.output
+        result = runner.invoke(main, ["kegg-mirror", "info", "--filename", filename])
+        assert "list/compound" in result.output
+
+
+def test_listings_memoised(kegg, mockserver):
+    assert kegg.isOrganism("hsa")
+    assert kegg.isOrganism("T01001")
+    assert not kegg.isOrganism("xyz")
+    assert kegg.code2Tnumber("hsa") == "T01001"
+    assert kegg.Tnumber2code("T01001") == "hsa"
+    assert kegg.lookfor_organism("hsa") == kegg.lookfor_organism("T01001")
+    assert len(kegg.lookfor_organism("hsa")) == 1
+    assert kegg.lookfor_organism("HOMO")[0].startswith("T01001 hsa")
+    assert kegg.compoundIds[0] == "C00001"
+    assert kegg.compoundIds == kegg.compoundIds
+    kegg.organism = "hsa"
+    # info/kegg, list/organism and list/compound
+    assert mockserver.hits["kegg"] == 3
+
+    # shared by other instances
+    from bioservices import KEGG
+
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        other = mockserver.bind(KEGG(verbose=False))
+    assert other.isOrganism("hsa")
+    assert mockserver.hits["kegg"] == 3
+
+
+def test_listings_persisted_per_release(kegg, mockserver):
+    from bioservices import KEGG
+
+    assert kegg.isOrganism("hsa")
+    assert mockserver.hits["kegg"] == 2
+    filename = kegg._listing_filename("organism")
+    assert open(filename).readline() == "#release\t108.0+/10-19\n"
+
+    # new session: the persisted listing is used
+    KEGG._listings.clear()
+    KEGG._releases.clear()
+    kegg._organism_index = None
+    assert kegg.code2Tnumber("hsa") == "T01001"
+    assert mockserver.hits["kegg"] == 3
+
+    # new release: downloaded again
+    KEGG._listings.clear()
+    KEGG._releases.clear()
+    kegg._organism_index = None
+    mockserver.kegg_release = "109.0+/01-02"
+    assert kegg.isOrganism("hsa")
+    assert mockserver.hits["kegg"] == 5
+    assert open(filename).readline() == "#release\t109.0+/01-02\n"
+
+    kegg.clear_listings()
+    assert not os.path.exists(filename)
+
+
+def _reference_sif(kegg, pathway):
+    # relations computed without batching (previous implementation)
+    res = kegg.parse_kgml_pathway(pathway)
+    entries = {x["id"]: x for x in res["entries"]}
+    sif = []
+    for rel in res["relations"]:
+        if rel["link"] == "PPrel" and rel["name"] in ("activation", "inhibition"):
+            name1, name2 = entries[rel["entry1"]]["name"], entries[rel["entry2"]]["name"]
+            sign = 1 if rel["name"] == "activation" else -1
+            sif.append([kegg.conv("uniprot", name1)[name1], sign, kegg.conv("uniprot", name2)[name2]])
+    return sif
+
+
+def test_pathway2sif(kegg, mockserver):
+    expected = _reference_sif(kegg, "hsa04010")
+    assert expected
+    mockserver.reset()
+    assert kegg.pathway2sif("hsa04010") == expected
+    # one kgml and one conv request
+    assert mockserver.hits["kegg"] == 2
+    sif = kegg.pathway2sif("hsa04010", uniprot=False)
+    assert all(x[0].startswith("hsa:") for x in sif)
+
+
+def test_pathway2sif_many(kegg, mockserver):
+    sifs = kegg.pathway2sif(["hsa00010", "hsa04010"])
+    assert sifs["hsa04010"] == kegg.pathway2sif("hsa04010")
+
+    mockserver.reset()
+    sifs = kegg.organism2sif("hsa", progress=False)
+    assert len(sifs) == len(mockserver.pathways)
+    # list of pathways, a single conv and kgml files
+    hits = [x[1].split("/")[2] for x in mockserver.log]
+    assert hits.count("conv") == 1
+    assert hits.count("list") == 1
+    assert sifs["hsa04010"] == kegg.pathway2sif("hsa04010")
+
+
+def test_parse_kgml(kegg, mockserver):
+    kgml = kegg.get("hsa04010", "kgml")
+    expected = kegg.parse_kgml_pathway("hsa04010", res=kgml)
+    tables = kegg.parse_kgml(kgml)
+    for key in ("entries", "relations"):
+        df = tables[key].astype(object).drop(columns="pathway")
+        assert df.where(df.notna(), None).to_dict("records") == expected[key]
+    assert set(tables["entries"]["pathway"]) == {"path:hsa04010"}
+    assert tables["relations"]["name"].dtype == "category"
+
+
+def test_kgml_tables(kegg, mockserver):
+    kgmls = kegg.get_kgml(["hsa00010"], organism="hsa")
+    assert len(kgmls) == len(mockserver.pathways)
+
+    tables = kegg.kgml_tables(organism="hsa")
+    assert set(tables["entries"]["pathway"]) == set(kgmls)
+    sub = tables["relations"][tables["relations"]["pathway"] == "hsa04010"]
+    assert len(sub) == len(kegg.parse_kgml(kgmls["hsa04010"])["relations"])
+
+    empty = kegg.kgml_tables([])
+    assert list(empty["relations"].columns) == ["pathway", "entry1", "entry2", "link", "name", "value"]
+
+
+def test_kgml_graph(kegg):
+    pytest.importorskip("networkx")
+    tables = kegg.kgml_tables(["hsa04010"], graph=True)
+    G = tables["graph"]
+    assert G.number_of_edges() == len(tables["relations"])
+
+
+@pytest.fixture
+def keggtools(kegg):
+    from bioservices.kegg import KEGGTools
+
+    with patch("bioservices.kegg.KEGG", return_value=kegg):
+        tools = KEGGTools(organism="hsa")
+    return tools
+
+
+def test_scan_genes_checkpoint(keggtools, mockserver, tmp_path):
+    checkpoint = str(tmp_path / "genes.jsonl")
+    genes = keggtools.genes[:45] + ["hsa:999999"]
+    keggtools.genes = genes
+    get_many = keggtools.kegg._get_many
+    calls = []
+
+    def failing_get(entries, *args, **kwargs):
+        calls.append(entries)
+        if len(calls) == 3:
+            raise ConnectionError("killed")
+        return get_many(entries, *args, **kwargs)
+
+    with patch.object(keggtools.kegg, "_get_many", side_effect=failing_get):
+        with pytest.raises(ConnectionError):
+            keggtools.scan_genes(checkpoint=checkpoint, batch_size=20, progress=False)
+    assert len(keggtools.read_checkpoint(checkpoint)) == 40
+
+    # resume: only the last batch is fetched
+    mockserver.reset()
+    res = keggtools.scan_genes(checkpoint=checkpoint, batch_size=20, progress=False)
+    assert list(res) == genes[:45]
+    assert res["hsa:3"]["DBLINKS"]["UniProt"] == mockserver.accession(3)
+    assert mockserver.hits["kegg"] == 1
+    assert keggtools.read_checkpoint(checkpoint)["hsa:999999"] is None
+
+    # nothing left to fetch
+    mockserver.reset()
+    assert keggtools.scan_genes(checkpoint=checkpoint, progress=False) == res
+    assert mockserver.hits["kegg"] == 0
+
+
+def test_scan_genes_checkpoint_truncated_line(keggtools, mockserver, tmp_path):
+    checkpoint = tmp_path / "genes.jsonl"
+    genes = keggtools.genes[:30]
+    keggtools.genes = genes[:20]
+    keggtools.scan_genes(checkpoint=str(checkpoint), batch_size=10, progress=False)
+    # killed while writing the last line
+    content = checkpoint.read_bytes()
+    checkpoint.write_bytes(content[:-20])
+    assert len(keggtools.read_checkpoint(str(checkpoint))) == 19
+
+    keggtools.genes = genes
+    res = keggtools.scan_genes(checkpoint=str(checkpoint), batch_size=10, progress=False)
+    assert list(res) == genes
+    assert len(keggtools.read_checkpoint(str(checkpoint))) == 30
+
+    # resumed again: nothing lost, nothing fetched
+    mockserver.reset()
+    assert keggtools.scan_genes(checkpoint=str(checkpoint), progress=False) == res
+    assert mockserver.hits["kegg"] == 0
+
+
+def test_scan_genes_checkpoint_server_errors(keggtools, mockserver, tmp_path):
+    checkpoint = str(tmp_path / "genes.jsonl")
+    keggtools.genes = keggtools.genes[:25] + ["hsa:999999"]
+
+    # failed requests are not saved as "not found"
+    mockserver.down = True
+    assert keggtools.scan_genes(checkpoint=checkpoint, batch_size=20, progress=False) == {}
+    assert keggtools.read_checkpoint(checkpoint) == {}
+
+    # resume: all entries are requested again
+    mockserver.down = False
+    keggtools.kegg.services.circuit.reset()
+    mockserver.reset()
+    res = keggtools.scan_genes(checkpoint=checkpoint, batch_size=20, progress=False)
+    assert list(res) == keggtools.genes[:25]
+    assert mockserver.hits["kegg"] == 3
+    assert keggtools.read_checkpoint(checkpoint)["hsa:999999"] is None
+
+
+def test_get_list_not_found_is_not_a_failure(kegg):
+    failed = []
+    assert kegg._get_many(["hsa:999998", "hsa:999999"], failed=failed) == {}
+    assert failed == []
+
+
+def test_dataframe_output(kegg, mockserver):
+    df = kegg.link("pathway", "hsa", frmt="dataframe")
+    text = kegg.link("pathway", "hsa")
+    assert len(df) == text.count("\n")
+    assert list(df.columns) == ["source", "target", "source_db", "target_db"]
+    assert df["target"].dtype == "category"
+    assert list(df["source_db"].cat.categories) == ["hsa"]
+    assert "\t".join(df.iloc[0, :2]) == text.split("\n")[0]
+
+    df = kegg.conv("uniprot", "hsa", frmt="dataframe")
+    assert dict(zip(df["source"], df["target"])) == kegg.conv("uniprot", "hsa")
+    assert list(df["target_db"].cat.categories) == ["up"]
+
+    df = kegg.list("hsa", frmt="dataframe")
+    assert list(df.columns) == ["id", "type", "position", "definition"]
+    assert df["type"].dtype == "category"
+    df = kegg.list("organism", frmt="dataframe")
+    assert df.set_index("code").loc["hsa", "tnumber"] == "T01001"
+    df = kegg.list("compound", frmt="dataframe")
+    assert df["id"].iloc[0] == "C00001"
+
+    df = kegg.find("compound", "12", frmt="dataframe")
+    assert "C00012" in set(df["id"])
+
+    with pytest.raises(ValueError):
+        kegg.list("compound", frmt="arrow")
+
+
+def test_save_pathways(kegg, mockserver, tmp_path):
+    png = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 20
+    mockserver.add_file("tmp/mark_pathway.png", png)
+    mockserver.register("/kegg-bin/show_pathway", '<img src="/files/tmp/mark_pathway.png" />', method="POST")
+    # maps are never downloaded over plain HTTP
+    assert kegg.www.startswith("https://")
+    kegg.www = mockserver.url
+
+    colors = {"hsa00010": {"1": "red"}, "path:hsa04010": ["2", "3"], "hsa04150": {}}
+    res = kegg.save_pathways(colors, str(tmp_path / "maps"))
+    assert res == {x: str(tmp_path / "maps" / (x.split(":")[-1] + ".png")) for x in colors}
+    assert all(open(x, "rb").read() == png for x in res.values())
+    posts = [x for x in mockserver.log if x[0] == "POST"]
+    assert len(posts) == 3
+
+    # unchanged maps are not requested again
+    mockserver.reset()
+    colors["hsa04150"] = {"4": "blue"}
+    kegg.save_pathways(colors, str(tmp_path / "maps"))
+    assert [x[1].split("?")[1] for x in mockserver.log if x[0] == "POST"] == ["hsa04150/default%3Dpink//4%09,blue/"]
+
+    kegg.save_pathway("hsa00010", str(tmp_path / "single.png"))
+    assert (tmp_path / "single.png").read_bytes() == png
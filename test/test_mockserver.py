@@ -0,0 +1,103 @@
+"""Tests for the local stand-in server used for offline and load testing."""
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from bioservices.dev.mockserver import MockServer
+
+
+def _make(cls):
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        return cls(verbose=False)
+
+
+def test_kegg_list_and_get(mockserver):
+    from bioservices import KEGG
+
+    k = mockserver.bind(_make(KEGG))
+    res = k.list("pathway", organism="hsa")
+    assert "hsa00010" in res
+    assert "T01001" in k.organismTnumbers
+
+    entry = k.get("hsa:1")
+    assert entry.startswith("ENTRY")
+    assert k.parse(entry)["DBLINKS"]["UniProt"] == mockserver.accession(1)
+
+
+def test_kegg_get_limited_to_ten_entries(mockserver):
+    url = mockserver.url_for("kegg") + "/get/" + "+".join(f"hsa:{i}" for i in range(1, 12))
+    assert requests.get(url).status_code == 400
+
+
+def test_kegg_conv_and_link(mockserver):
+    from bioservices import KEGG
+
+    k = mockserver.bind(_make(KEGG))
+    conv = k.conv("uniprot", "hsa")
+    assert len(conv) == mockserver.n_genes
+    assert conv["hsa:2"] == "up:" + mockserver.accession(2)
+    link = k.link("pathway", "hsa:1")
+    assert link.startswith("hsa:1\tpath:hsa")
+
+
+def test_uniprot_search_pagination(mockserver):
+    from bioservices import UniProt
+
+    u = mockserver.bind(_make(UniProt))
+    res = u.search("*", frmt="tsv", columns="accession,length", size=10)
+    lines = res.split("\n")
+    assert lines[0] == "Entry\tLength"
+    assert len(lines) == mockserver.n_proteins + 1
+    assert mockserver.hits["uniprot"] == 10
+
+
+def test_uniprot_mapping(mockserver):
+    from bioservices import UniProt
+
+    u = mockserver.bind(_make(UniProt))
+    res = u.mapping("UniProtKB_AC-ID", "KEGG", query=["P00001", "P00002", "DUMMY"], progress=False)
+    assert res["results"][0] == {"from": "P00001", "to": "hsa:1"}
+    assert res["failedIds"] == ["DUMMY"]
+
+
+def test_chembl_page_meta(mockserver):
+    res = requests.get(mockserver.url_for("chembl") + "/api/data/molecule.json", params={"limit": 30, "offset": 90})
+    data = res.json()
+    assert len(data["molecules"]) == 10
+    assert data["page_meta"]["total_count"] == 100
+    assert data["page_meta"]["next"] is None
+
+
+def test_eutils_history(mockserver):
+    from bioservices import EUtils
+
+    e = mockserver.bind(_make(EUtils))
+    ret = e.ESearch("pubmed", "cancer", usehistory="y", retmax=5)
+    assert ret["count"] == "100"
+    assert len(ret["idlist"]) == 5
+
+    url = mockserver.url_for("eutils")
+    params = {"db": "pubmed", "WebEnv": ret["webenv"], "query_key": ret["querykey"], "retstart": 10, "retmax": 3}
+    summary = requests.get(url + "/esummary.fcgi", params=params).json()
+    assert summary["result"]["uids"] == ["100011", "100012", "100013"]
+
+    post = e.EPost("pubmed", "1,2,3")
+    params = {"db": "pubmed", "WebEnv": post["WebEnv"], "query_key": post["QueryKey"]}
+    assert requests.get(url + "/efetch.fcgi", params=params).text.count("PMID-") == 3
+
+
+def test_rate_limit_and_outage():
+    with MockServer(requests_per_sec=2) as server:
+        url = server.url_for("kegg") + "/info/kegg"
+        codes = [requests.get(url).status_code for _ in range(3)]
+        assert codes == [200, 200, 429]
+        assert server.log[-1][2] == 429
+
+    with MockServer() as server:
+        server.down = True
+        assert requests.get(server.url_for("kegg") + "/info/kegg").status_code == 503
+
+
+def test_canned_reply(mockserver):
+    mockserver.register("/kegg/info/kegg", "canned", status=200)
+    assert requests.get(mockserver.url_for("kegg") + "/info/kegg").text == "canned"
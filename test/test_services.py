@@ -12,6 +12,8 @@ from requests.models import Response
 from bioservices.services import (
     REST,
     BioServicesError,
+    CircuitBreaker,
+    CircuitOpenError,
     HTTPResponseError,
     RESTbase,
     Service,
@@ -551,6 +553,171 @@ def test_rest_http_delete_delegates_to_delete_one(rest, mocker):
     mock_delete_one.assert_called_once()
 
 
+def test_rest_map_concurrent_keeps_order_and_rate(rest):
+    rest.requests_per_sec = 50
+
+    def func(x):
+        rest._calls()
+        return x * 2
+
+    t0 = time.time()
+    assert rest.map_concurrent(func, range(20), max_workers=8) == [x * 2 for x in range(20)]
+    # the rate limit is shared by all threads
+    assert time.time() - t0 >= 19 / 50 - 0.05
+    assert rest.map_concurrent(func, [3], max_workers=8) == [6]
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+
+def test_circuit_breaker_state_machine(mocker):
+    clock = mocker.patch("bioservices.services.time.monotonic", return_value=100)
+    breaker = CircuitBreaker("example.com", threshold=2, reset_timeout=10)
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.allow_request() is True
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow_request() is False
+
+    # after the timeout, a single probe is let through
+    clock.return_value = 111
+    assert breaker.state == "half-open"
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+    # failed probe re-opens the circuit
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.return_value = 122
+    assert breaker.allow_request() is True
+    breaker.record_success()
+    assert breaker.state == "closed"
+    metrics = breaker.metrics()
+    assert metrics["opened"] == 2
+    assert metrics["rejected"] == 2
+    assert metrics["consecutive_failures"] == 0
+
+
+def test_circuit_breaker_disabled():
+    breaker = CircuitBreaker("example.com", threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.allow_request() is True
+
+
+def test_rest_circuit_fails_fast(rest, mocker):
+    mocker.patch.object(rest, "_calls")
+    rest.settings.CIRCUIT_THRESHOLD = 3
+    get = mocker.patch.object(rest.session, "get", side_effect=requests.exceptions.ConnectionError("down"))
+    for _ in range(3):
+        assert rest.get_one("resource") is None
+    assert get.call_count == 3
+
+    res = rest.get_one("resource")
+    assert res == 503
+    assert "circuit open" in res.reason
+    assert get.call_count == 3
+    assert rest.circuit_metrics()["example.com"]["state"] == "open"
+
+
+def test_rest_circuit_ignores_client_errors(rest, mocker):
+    mocker.patch.object(rest, "_calls")
+    rest.settings.CIRCUIT_THRESHOLD = 2
+    response = MagicMock(spec=Response)
+    response.status_code = 404
+    mocker.patch.object(rest.session, "get", return_value=response)
+    mocker.patch.object(rest, "_interpret_returned_request", return_value=404)
+    for _ in range(5):
+        rest.get_one("resource")
+    assert rest.circuit.state == "closed"
+    assert rest.circuit.successes == 5
+
+
+def test_rest_circuit_with_mockserver(mockserver, mocker):
+    from bioservices import KEGG
+
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        k = mockserver.bind(KEGG(verbose=False))
+    k.services.settings.CIRCUIT_THRESHOLD = 2
+    k.services.settings.CIRCUIT_RESET_TIMEOUT = 0.2
+    k.services.requests_per_sec = 1000
+    adapter = requests.adapters.HTTPAdapter(max_retries=0)
+    k.services.session.mount("http://", adapter)
+
+    mockserver.down = True
+    assert k.services.http_get("info/kegg", frmt="txt") == 503
+    assert k.services.http_get("info/kegg", frmt="txt") == 503
+    hits = mockserver.hits["kegg"]
+    # open: no request reaches the host
+    assert k.services.http_get("info/kegg", frmt="txt") == 503
+    assert mockserver.hits["kegg"] == hits
+
+    # host is back; after the timeout, the probe closes the circuit
+    mockserver.down = False
+    time.sleep(0.25)
+    assert "Release" in k.services.http_get("info/kegg", frmt="txt")
+    assert k.services.circuit.state == "closed"
+
+
+def test_rest_circuit_async_requests(rest, mocker):
+    import sys
+
+    rest.settings.CIRCUIT_THRESHOLD = 2
+    rest._session = MagicMock()
+    response = MagicMock(spec=Response)
+    response.status_code = 503
+    grequests = MagicMock()
+    grequests.map.return_value = [response, None]
+    mocker.patch.dict(sys.modules, {"grequests": grequests})
+
+    assert rest._get_async(["q1", "q2"]) == [response, None]
+    assert rest.circuit.state == "open"
+
+    # open: no request is sent
+    res = rest._get_async(["q1", "q2"])
+    assert res == [503, 503]
+    assert "circuit open" in res[0].reason
+    assert grequests.map.call_count == 1
+
+    # half-open: a single probe is sent; it fails so the batch is not released
+    rest.circuit.reset_timeout = 0
+    sizes = []
+
+    def send(rs, size):
+        rs = list(rs)
+        sizes.append(len(rs))
+        return [response] * len(rs)
+
+    grequests.map.side_effect = send
+    res = rest._get_async(["q1", "q2", "q3"])
+    assert sizes == [1]
+    assert res[0] is response and res[1:] == [503, 503]
+
+    # the probe succeeds: the rest of the batch is sent once the circuit is closed
+    response.status_code = 200
+    assert rest._get_async(["q1", "q2", "q3"]) == [response] * 3
+    assert sizes == [1, 1, 2]
+    assert rest.circuit.state == "closed"
+
+
+def test_rest_circuit_downloads(mockserver, mocker, tmp_path):
+    mockserver.add_file("data.bin", b"x" * 100)
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        rest = REST("test", mockserver.url + "/files", verbose=False)
+    rest.settings.CIRCUIT_THRESHOLD = 2
+    mocker.patch("bioservices.download.time.sleep")
+
+    mockserver.down = True
+    with pytest.raises(CircuitOpenError):
+        rest.download("data.bin", tmp_path / "data.bin")
+    # HEAD and GET failed, then the retry is rejected without reaching the host
+    assert mockserver.hits["files"] == 2
+    assert rest.circuit_metrics()[f"{mockserver.host}:{mockserver.port}"]["state"] == "open"
+
+
 # ---------------------------------------------------------------------------
 # RESTbase — abstract HTTP methods raise NotImplementedError
 # ---------------------------------------------------------------------------
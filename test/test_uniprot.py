@@ -0,0 +1,397 @@
+"""Offline tests of UniProt features using the local stand-in server."""
+import os
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def uniprot(mockserver):
+    from bioservices import UniProt
+
+    mockserver.n_proteins = 120
+    with patch("bioservices.services.urlopen", return_value=MagicMock()):
+        u = UniProt(verbose=False)
+    u.services.requests_per_sec = 1000
+    return mockserver.bind(u)
+
+
+def test_search_pages_concatenated(uniprot, mockserver):
+    res = uniprot.search("*", frmt="tsv", size=25)
+    lines = res.split("\n")
+    assert len(lines) == 121
+    assert lines[0].startswith("Entry")
+    assert lines[1].split("\t")[0] == mockserver.accession(1)
+
+    res = uniprot.search("*", frmt="fasta", size=50)
+    assert res.count(">") == 120
+    res = uniprot.search("*", frmt="json", size=50)
+    assert len(res["results"]) == 120
+
+
+@pytest.mark.parametrize("frmt", ["tsv", "fasta", "json"])
+def test_iter_search_matches_search(uniprot, frmt):
+    records = list(uniprot.iter_search("*", frmt=frmt, size=50))
+    expected = uniprot.search("*", frmt=frmt, size=25)
+    if frmt == "tsv":
+        assert records == expected.split("\n")
+    elif frmt == "fasta":
+        assert "".join(records) == expected
+        assert len(records) == 120
+    else:
+        assert records == expected["results"]
+
+
+def test_iter_search_pages_and_limit(uniprot, mockserver):
+    rows = uniprot.iter_search("*", columns="accession,length", size=50)
+    assert next(rows) == "Entry\tLength"
+    assert next(rows).split("\t")[0] == mockserver.accession(1)
+    # only the first page was requested
+    assert mockserver.hits["uniprot"] == 1
+    assert len(list(rows)) == 119
+    assert mockserver.hits["uniprot"] == 3
+
+    mockserver.reset()
+    records = list(uniprot.iter_search("*", frmt="fasta", size=50, limit=60))
+    assert len(records) == 60
+    assert mockserver.hits["uniprot"] == 2
+
+
+def test_iter_search_failed_page_raises(uniprot, mockserver):
+    from bioservices import BioServicesError
+
+    rows = uniprot.iter_search("*", columns="accession,length", size=50)
+    assert len([next(rows) for _ in range(51)]) == 51
+    # the stream must not end as if the result set were complete
+    mockserver.down = True
+    with pytest.raises(BioServicesError, match=r"failed after 50 records \(HTTP 503"):
+        list(rows)
+
+
+@pytest.mark.parametrize("frmt", ["tsv", "fasta", "json"])
+def test_iter_stream(uniprot, mockserver, frmt):
+    expected = list(uniprot.iter_search("*", frmt=frmt, size=500))
+    mockserver.reset()
+    assert list(uniprot.iter_stream("*", frmt=frmt)) == expected
+    assert [x[1].split("?")[0] for x in mockserver.log] == ["/uniprot/uniprotkb/stream"]
+
+
+def test_iter_stream_falls_back_to_pagination(uniprot, mockserver):
+    expected = list(uniprot.iter_stream("*", columns="accession,length"))
+    mockserver.uniprot_stream_limit = 100
+    mockserver.reset()
+    assert list(uniprot.iter_stream("*", columns="accession,length")) == expected
+    assert mockserver.hits["uniprot"] == 2
+
+
+@pytest.mark.parametrize("limit", [None, 100])
+@pytest.mark.parametrize("name", ["proteins.fasta", "proteins.fasta.gz"])
+def test_export(uniprot, mockserver, tmp_path, name, limit):
+    import gzip
+
+    expected = uniprot.search("*", frmt="fasta", size=500)
+    mockserver.uniprot_stream_limit = limit
+    filename = str(tmp_path / name)
+    assert uniprot.export("*", filename, frmt="fasta") == filename
+    opener = gzip.open if name.endswith(".gz") else open
+    with opener(filename, "rt") as fin:
+        assert fin.read() == expected
+
+
+def test_export_json_fallback(uniprot, mockserver, tmp_path):
+    import json
+
+    expected = uniprot.search("*", frmt="json", size=500)
+    mockserver.uniprot_stream_limit = 10
+    uniprot.export("*", str(tmp_path / "proteins.json"), frmt="json")
+    assert json.loads((tmp_path / "proteins.json").read_text()) == expected
+
+
+def test_export_failed_page_not_published(uniprot, mockserver, tmp_path):
+    from bioservices import BioServicesError
+
+    mockserver.uniprot_stream_limit = 10
+    filename = tmp_path / "proteins.tsv"
+    search = uniprot.iter_search
+
+    def truncated(*args, **kwargs):
+        rows = search(*args, **kwargs)
+        yield from (next(rows) for _ in range(20))
+        raise BioServicesError("UniProt search failed")
+
+    with patch.object(uniprot, "iter_search", side_effect=truncated):
+        with pytest.raises(BioServicesError):
+            uniprot.export("*", str(filename))
+    assert os.listdir(tmp_path) == []
+
+
+def _mapping_requests(server, prefix):
+    return len([x for x in server.log if x[1].startswith("/uniprot/idmapping/" + prefix)])
+
+
+def test_mapping_sharded(uniprot, mockserver):
+    ids = [mockserver.accession(i) for i in range(1, 121)] + ["DUMMY", mockserver.accession(1)]
+    df = uniprot.mapping("UniProtKB_AC-ID", "KEGG", ids, frmt="dataframe", chunk_size=50, progress=False)
+    assert list(df.columns) == ["from", "to"]
+    assert len(df) == 120
+    assert df.iloc[0].tolist() == [mockserver.accession(1), "hsa:1"]
+    assert df.attrs["failedIds"] == ["DUMMY"]
+
+    # 3 jobs (duplicates removed); results of each job in a single request
+    assert _mapping_requests(mockserver, "run") == 3
+    assert _mapping_requests(mockserver, "results/stream/") == 3
+
+    res = uniprot.mapping("UniProtKB_AC-ID", "KEGG", ",".join(ids), chunk_size=50, progress=False)
+    assert res["results"] == df.to_dict("records")
+    assert res["failedIds"] == ["DUMMY"]
+
+
+def test_mapping_pagination_fallback(uniprot, mockserver):
+    mockserver.uniprot_stream_limit = 10
+    ids = [mockserver.accession(i) for i in range(1, 101)] + ["DUMMY"]
+    res = uniprot.mapping("UniProtKB_AC-ID", "KEGG", ids, progress=False)
+    assert [x["to"] for x in res["results"]] == [f"hsa:{i}" for i in range(1, 101)]
+    assert res["failedIds"] == ["DUMMY"]
+    # 100 results fit in one page of 500
+    assert _mapping_requests(mockserver, "results/stream/") == 1
+    assert _mapping_requests(mockserver, "results/") == 2
+
+
+def test_mapping_target_entries():
+    from bioservices import UniProt
+
+    assert UniProt._mapping_target({"primaryAccession": "P12345", "sequence": {}}) == "P12345"
+    assert UniProt._mapping_target({"uniParcId": "UPI0000000001"}) == "UPI0000000001"
+    assert UniProt._mapping_target("hsa:1") == "hsa:1"
+
+
+def test_get_df(uniprot, mockserver):
+    entries = [mockserver.accession(i) for i in range(1, 121)]
+    df = uniprot.get_df(entries + entries[:5], nChunk=25, columns="accession,gene_primary,length,organism_name")
+    assert list(df.columns) == ["Entry", "Gene Names (primary)", "Length", "Organism"]
+    assert df["Entry"].tolist() == entries
+    assert str(df["Length"].dtype) == "Int64"
+    assert str(df["Organism"].dtype) == "category"
+
+    # one query per chunk, only the requested fields
+    searches = [x[1] for x in mockserver.log if x[1].startswith("/uniprot/uniprotkb/search")]
+    assert len(searches) == 5
+    assert all("fields=accession%2Cgene_primary%2Clength%2Corganism_name" in x for x in searches)
+
+
+def test_get_df_column_labels_deprecated(uniprot, mockserver):
+    entries = [mockserver.accession(i) for i in range(1, 6)]
+    expected = uniprot.get_df(entries, columns="accession,gene_primary,length")
+    with pytest.warns(DeprecationWarning, match="Gene Names \\(primary\\) -> gene_primary"):
+        df = uniprot.get_df(entries, columns="Entry,Gene Names (primary),length")
+    assert df.equals(expected)
+    with pytest.raises(ValueError):
+        uniprot.get_df(entries, columns="accession,Unknown column")
+
+
+def test_get_df_default_columns(uniprot, mockserver):
+    df = uniprot.get_df(mockserver.accession(3))
+    assert len(df) == 1
+    assert len(df.columns) == len(uniprot._valid_columns)
+    assert df["Sequence"][0] == mockserver._uniprot_entry(3)["sequence"]
+
+    assert uniprot.get_df(["UNKNOWN"]).empty
+
+
+def test_get_df_failed_chunk_raises(uniprot, mockserver):
+    from bioservices import BioServicesError
+
+    entries = [mockserver.accession(i) for i in range(1, 51)]
+    uniprot.result_fields  # metadata fetched before the server goes down
+    mockserver.down = True
+    with pytest.raises(BioServicesError, match="chunk of 25 entries starting with"):
+        uniprot.get_df(entries, nChunk=25, columns="accession,length", max_workers=1)
+
+
+def test_get_df_parquet(uniprot, mockserver, tmp_path):
+    pytest.importorskip("pyarrow")
+    entries = [mockserver.accession(i) for i in range(1, 121)]
+    filename = str(tmp_path / "entries.parquet")
+    columns = "accession,length"
+    assert uniprot.get_df(entries, nChunk=25, columns=columns, parquet=filename) == filename
+    df = pd.read_parquet(filename)
+    assert sorted(df["Entry"]) == sorted(entries)
+
+
+FLAT_FILE = """\
+ID   ZAP70_HUMAN             Reviewed;         12 AA.
+AC   P43403; A6NFP4; Q6PIA4;
+DE   RecName: Full=Tyrosine-protein kinase ZAP-70 {ECO:0000305};
+DE   AltName: Full=70 kDa zeta-chain associated protein;
+GN   Name=ZAP70 {ECO:0000312|HGNC:HGNC:12858}; Synonyms=SRK;
+OS   Homo sapiens
+OS   (Human).
+OX   NCBI_TaxID=9606;
+SQ   SEQUENCE   12 AA;  1234 MW;  0123456789ABCDEF CRC64;
+     MPDPAAHLPF FY
+//
+ID   CBL_HUMAN               Unreviewed;        5 AA.
+AC   P22681;
+DE   SubName: Full=E3 ubiquitin-protein ligase CBL;
+OS   Homo sapiens (Human).
+OX   NCBI_TaxID=9606 {ECO:0000313};
+SQ   SEQUENCE   5 AA;  500 MW;  0123456789ABCDEF CRC64;
+     MAGNV
+//
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    from bioservices.uniprotindex import UniProtIndex
+
+    filename = tmp_path / "uniprot_sprot.dat"
+    filename.write_text(FLAT_FILE)
+    index = UniProtIndex(str(tmp_path / "index.sqlite"))
+    assert index.build(str(filename)) == 2
+    yield index
+    index.close()
+
+
+def test_index_flat_file(index):
+    assert len(index) == 6
+    assert "A6NFP4" in index and "ZAP70_HUMAN" in index
+    record = index.get("A6NFP4")
+    assert record == index.get("P43403")
+    assert record.startswith("ID   ZAP70_HUMAN") and record.endswith("//\n")
+    assert index.get("P22681").startswith("ID   CBL_HUMAN")
+    assert index.get("P43403", frmt="fasta") is None
+
+    fields = index.get_fields(["ZAP70_HUMAN", "P22681"])
+    assert fields["ZAP70_HUMAN"] == {
+        "accession": "P43403",
+        "id": "ZAP70_HUMAN",
+        "reviewed": "reviewed",
+        "gene_primary": "ZAP70",
+        "organism_name": "Homo sapiens (Human)",
+        "organism_id": "9606",
+        "length": 12,
+        "sequence": "MPDPAAHLPFFY",
+    }
+    assert fields["P22681"]["reviewed"] == "unreviewed"
+    assert fields["P22681"]["gene_primary"] == ""
+
+
+def test_index_closes_connections(index, tmp_path, mocker):
+    import sqlite3
+
+    connect = sqlite3.connect
+    connections = []
+
+    def tracked(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    mocker.patch("sqlite3.connect", side_effect=tracked)
+    len(index), "P43403" in index, index.files
+    index.get_fields(["P43403", "P22681"])
+    index.build(str(tmp_path / "uniprot_sprot.dat"))
+    assert len(connections) > 5
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+            conn.execute("SELECT 1")
+
+
+def test_index_fasta_matches_api(uniprot, mockserver, index, tmp_path):
+    import gzip
+
+    body, _ = mockserver._uniprot_format(range(1, 121), "fasta", None)
+    source = tmp_path / "uniprot_sprot.fasta.gz"
+    source.write_bytes(gzip.compress(body.encode()))
+    assert index.build(str(source)) == 120
+    assert os.path.exists(tmp_path / "uniprot_sprot.fasta")
+
+    accessions = [mockserver.accession(i) for i in (1, 50, 120)]
+    expected = uniprot.retrieve(accessions, frmt="fasta")
+    uniprot.use_index(index)
+    mockserver.reset()
+    assert uniprot.retrieve(accessions, frmt="fasta") == expected
+    assert uniprot.get_fasta(accessions[0]) == expected[0]
+    assert mockserver.hits["uniprot"] == 0
+
+    fields = index.get_fields([accessions[0]])[accessions[0]]
+    assert fields["gene_primary"] == "GENE1"
+    assert fields["organism_id"] == "9606"
+    assert "protein_name" not in fields
+
+
+def test_index_falls_back_to_api(uniprot, mockserver, index):
+    uniprot.use_index(index)
+    accession = mockserver.accession(7)
+    res = uniprot.retrieve(["P43403", accession, "P22681"], frmt="txt")
+    assert res[0] == index.get("P43403")
+    assert res[2] == index.get("P22681")
+    assert accession in res[1]
+    assert mockserver.hits["uniprot"] == 1
+
+    mockserver.reset()
+    df = uniprot.get_df(["P43403", accession], columns="accession,length,sequence")
+    assert df["Entry"].tolist() == ["P43403", accession]
+    assert df["Length"].tolist() == [12, len(mockserver._uniprot_entry(7)["sequence"])]
+    # only the entry missing from the index is searched
+    searches = [x[1] for x in mockserver.log if x[1].startswith("/uniprot/uniprotkb/search")]
+    assert len(searches) == 1 and "P43403" not in searches[0]
+
+    # protein names are always read from UniProt (the index only has the first name)
+    mockserver.reset()
+    uniprot.get_df(["P43403", accession], columns="accession,protein_name")
+    searches = [x[1] for x in mockserver.log if x[1].startswith("/uniprot/uniprotkb/search")]
+    assert len(searches) == 1 and "P43403" in searches[0]
+
+
+def _configure_requests(server):
+    return [x[1] for x in server.log if x[1].startswith("/uniprot/configure/")]
+
+
+def test_metadata_persisted(uniprot, mockserver):
+    from bioservices import UniProt
+
+    assert uniprot.valid_mapping["UniProtKB_AC-ID"] == ["UniProtKB", "KEGG"]
+    assert uniprot.result_fields["gene_primary"] == "Gene Names (primary)"
+    assert [x["name"] for x in uniprot.databases] == ["PDB", "KEGG"]
+    assert uniprot.metadata_release == "2024_01"
+    assert len(_configure_requests(mockserver)) == 3
+
+    # shared by all instances, then read from the cache directory
+    other = mockserver.bind(UniProt(verbose=False))
+    assert other.valid_mapping == uniprot.valid_mapping
+    UniProt._metadata.clear()
+    other = mockserver.bind(UniProt(verbose=False))
+    assert other.valid_mapping == uniprot.valid_mapping
+    assert other.result_fields == uniprot.result_fields
+    assert len(_configure_requests(mockserver)) == 3
+
+    # too old
+    UniProt._metadata.clear()
+    other = mockserver.bind(UniProt(verbose=False))
+    other.services.settings.METADATA_MAX_AGE = 0
+    try:
+        assert other.valid_mapping == uniprot.valid_mapping
+    finally:
+        other.services.settings.METADATA_MAX_AGE = 7
+    assert len(_configure_requests(mockserver)) == 4
+
+    other.clear_metadata()
+    assert other.metadata_release is None
+
+
+def test_mapping_and_columns_validated(uniprot, mockserver):
+    with pytest.raises(ValueError, match="not a valid source"):
+        uniprot.mapping("DUMMY", "KEGG", "P00001", progress=False)
+    with pytest.raises(ValueError, match="not a valid target"):
+        uniprot.mapping("Gene_Name", "KEGG", "GENE1", progress=False)
+    with pytest.raises(ValueError, match="Invalid columns"):
+        uniprot.get_df(["P00001"], columns="accession,dummy")
+    assert len(mockserver.log) == len(_configure_requests(mockserver)) == 2
+
+
+def test_validation_skipped_without_metadata(uniprot, mockserver):
+    mockserver.register("/uniprot/configure/idmapping/fields", "", status=404)
+    res = uniprot.mapping("UniProtKB_AC-ID", "KEGG", "P00001", progress=False)
+    assert res["results"] == [{"from": "P00001", "to": "hsa:1"}]
@@ -894,6 +894,7 @@ class TestRESTRequestHelpers:
         r._session = MagicMock()
         mock_grequests = MagicMock()
         mock_resp = MagicMock()
+        mock_resp.status_code = 200
         mock_grequests.map.return_value = [mock_resp]
         with patch.dict(sys.modules, {"grequests": mock_grequests}):
             result = r._get_async(["q1"], frmt="json")